@@ -0,0 +1,130 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+DEFAULT_THRESHOLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thresholds.json')
+
+
+def parse_args(argv=None):
+    from benchmarks.seed import SCALES
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Seed a local database and benchmark every endpoint through create_app().'
+    )
+    parser.add_argument('--scale', choices=sorted(SCALES), default='10k', help='Rows per table to seed.')
+    parser.add_argument('--database', help='Database URI (default: a SQLite file per scale in the temp directory).')
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests per route.')
+    parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per route first.')
+    parser.add_argument('--only', action='append', help='Only routes whose name contains this (repeatable).')
+    parser.add_argument('--bcrypt-rounds', type=int, help='Override BCRYPT_LOG_ROUNDS for seeding and login.')
+    parser.add_argument('--provider-latency', type=float, default=0.0, help='Fake provider latency in seconds.')
+    parser.add_argument('--provider-error-rate', type=float, default=0.0, help='Fake provider failure probability.')
+    parser.add_argument('--output', default='benchmark-results.json', help='Where to write the JSON results.')
+    parser.add_argument('--thresholds', default=DEFAULT_THRESHOLDS, help='Threshold file; "none" disables.')
+    parser.add_argument('--baseline', help='Earlier results to compare p95 and queries against.')
+    parser.add_argument('--verbose', action='store_true', help="Keep the app's error logging.")
+    parser.add_argument('--max-regression', type=float, default=0.2, help='Allowed growth over the baseline.')
+    return parser.parse_args(argv)
+
+
+def _load_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    from config import Config
+    from livewell_app import create_app
+    from livewell_app.africas_talking import provider
+    from livewell_app.extensions import db
+    from benchmarks import runner
+    from benchmarks.seed import SCALES, seed, table_counts
+
+    rows = SCALES[args.scale]
+    database = args.database or 'sqlite:///' + os.path.join(tempfile.gettempdir(), f'livewell-bench-{args.scale}.db')
+    overrides = {
+        'SQLALCHEMY_DATABASE_URI': database,
+        # Tokens carry a dict identity; newer PyJWT rejects non-string subjects
+        'JWT_VERIFY_SUB': False,
+        'PROVIDER_BACKEND': 'fake',
+        'PROVIDER_FAKE_LATENCY': args.provider_latency,
+        'PROVIDER_FAKE_ERROR_RATE': args.provider_error_rate,
+        # Queued jobs are drained after each scenario; the class rate limits
+        # would make that wait on the throttle instead of measuring the sends
+        'JOB_CLASSES': {name: dict(spec, rate=None) for name, spec in Config.JOB_CLASSES.items()},
+    }
+    if args.bcrypt_rounds:
+        overrides['BCRYPT_LOG_ROUNDS'] = args.bcrypt_rounds
+    app = create_app(overrides)
+    if not args.verbose:
+        # Failing requests are counted per route; their tracebacks are noise
+        app.logger.setLevel(logging.CRITICAL)
+
+    def progress(step):
+        print(f'  {step}', file=sys.stderr)
+
+    with app.app_context():
+        db.create_all()
+        counts = table_counts()
+        if not counts['users']:
+            print(f'Seeding {rows} rows per table into {database}', file=sys.stderr)
+            started = time.perf_counter()
+            counts = seed(rows, progress=progress)
+            print(f'Seeded in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+        elif counts['users'] < rows:
+            sys.exit(f'{database} holds {counts["users"]} users, fewer than the {args.scale} scale; use an empty database')
+
+    print('Running scenarios', file=sys.stderr)
+    routes = runner.run(app, rows, args.requests, args.warmup, args.only, progress)
+    results = {
+        'meta': {
+            'started_at': datetime.utcnow().isoformat(' ', 'seconds'),
+            'scale': args.scale,
+            'rows': rows,
+            'database': database.split('@')[-1],
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'table_counts': counts,
+        },
+        'routes': routes,
+        'peak_rss_mb': runner.peak_rss_mb(),
+        'provider': provider.stats(),
+        'uncovered': runner.uncovered_routes(app),
+    }
+
+    thresholds = None if args.thresholds == 'none' else _load_json(args.thresholds)
+    baseline = _load_json(args.baseline) if args.baseline else None
+    breaches = runner.check(results, thresholds, baseline, args.max_regression)
+    results['breaches'] = breaches
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(f"{'route':<58} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'q/req':>6} {'err':>5}")
+    for name, result in routes.items():
+        print(f"{name:<58} {result['throughput_rps']:>8} {result['p50_ms']:>8} {result['p95_ms']:>8} "
+              f"{result['p99_ms']:>8} {result['queries_per_request']:>6} {result['errors']:>5}")
+    for name, result in routes.items():
+        jobs = result.get('jobs')
+        if jobs:
+            print(f"{name} jobs: {jobs['jobs']} in {jobs['drain_s']}s, enqueue to finish p50 {jobs['p50_ms']} "
+                  f"p95 {jobs['p95_ms']} p99 {jobs['p99_ms']} ms, {jobs['statuses']}")
+    print(f"peak RSS {results['peak_rss_mb']} MB; results written to {args.output}")
+    if results['uncovered']:
+        print('not measured: ' + ', '.join(results['uncovered']))
+    for breach in breaches:
+        print(f'THRESHOLD BREACHED: {breach}')
+    return 1 if breaches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,369 @@
+import itertools
+import random
+import resource
+import signal
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+
+from benchmarks.seed import DAYS, DOCTOR_RATIO, PASSWORD, phone_number
+from livewell_app.extensions import db
+from livewell_app.jobs import Worker
+from livewell_app.models.appointment import Appointment
+from livewell_app.models.medical_record import MedicalRecord
+from livewell_app.models.outbound_job import OutboundJob
+from livewell_app.models.phone import Phone
+from livewell_app.models.sms_log import SMSLog
+from livewell_app.models.ussd_session import USSDSession
+from livewell_app.models.voice_call_log import VoiceCall
+
+REGRESSION_FLOOR_MS = 1.0
+DELETABLE_MODELS = (Phone, SMSLog, VoiceCall, USSDSession, Appointment, MedicalRecord)
+
+
+# SQL statements executed, per thread, so a request's queries can be counted
+class QueryCounter:
+    def __init__(self):
+        self._local = threading.local()
+        event.listen(Engine, 'before_cursor_execute', self._count)
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self._local.count = getattr(self._local, 'count', 0) + 1
+
+    def reset(self):
+        self._local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self._local, 'count', 0)
+
+    def close(self):
+        event.remove(Engine, 'before_cursor_execute', self._count)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+# What the scenarios know about the database. Reads pick ids below the
+# `reserved` highest seeded ones; DELETEs count down from the current
+# highest id and new appointments go after the latest booked one, so a
+# database can be reused across runs. Job lookups use the ids of jobs the
+# run queued, or of the latest ones already in the database.
+class Context:
+    def __init__(self, rows, reserved, random_seed=1234):
+        self.rows = rows
+        self.doctors = max(rows // DOCTOR_RATIO, 10)
+        self.readable = max(rows - reserved, 1)
+        self.random = random.Random(random_seed)
+        self.counter = itertools.count(1)
+        self.max_ids = {}
+        self.first_free_day = date.today() + timedelta(days=3 * DAYS)
+        self.headers = {}
+        self.job_ids = []
+
+    def load(self):
+        for model in DELETABLE_MODELS:
+            self.max_ids[model.__tablename__] = db.session.query(func.max(model.id)).scalar() or 0
+        latest = db.session.query(func.max(Appointment.appointment_time)).scalar()
+        if latest is not None:
+            self.first_free_day = max(self.first_free_day, latest.date() + timedelta(days=7))
+        self.job_ids = [job_id for (job_id,) in
+                        db.session.query(OutboundJob.id).order_by(OutboundJob.id.desc()).limit(1000)]
+
+    def id(self):
+        return self.random.randrange(self.readable) + 1
+
+    def doctor_id(self):
+        return self.random.randrange(self.doctors) + 1
+
+    def next(self):
+        return next(self.counter)
+
+    def job_id(self):
+        return self.random.choice(self.job_ids) if self.job_ids else 0
+
+    # Ids counting down from the top of the table, one per DELETE
+    def deletable(self, table):
+        self.max_ids[table] -= 1
+        return self.max_ids[table] + 1
+
+    # A future weekday working-hours slot no seeded appointment can occupy
+    def free_slot(self):
+        n = self.next()
+        day = self.first_free_day + timedelta(days=7 * (n // (5 * 18)))
+        day += timedelta(days=-day.weekday() + (n // 18) % 5)
+        return datetime.combine(day, datetime.min.time()) + timedelta(hours=8, minutes=30 * (n % 18))
+
+
+def _day(offset=0):
+    return (date.today() + timedelta(days=offset)).isoformat()
+
+
+# (name, method, path(ctx), json body(ctx) or None, authenticated). Every
+# blueprint route plus the provider routes and /ussd-response. Left out, and
+# listed as uncovered in the results: the phone and medical record creates
+# and updates (their handlers use fields the models don't have), the
+# cascading user and
+# doctor deletes, and the live USSD session update (needs a dialog in
+# progress).
+SCENARIOS = [
+    ('POST /api/v1/users/login', 'POST', lambda c: '/api/v1/users/login',
+     lambda c: {'email': f'patient{c.id()}@bench.livewell', 'password': PASSWORD}, False),
+    ('POST /api/v1/users/register', 'POST', lambda c: '/api/v1/users/register',
+     lambda c: {'name': 'New Patient', 'email': f'new{c.next()}-{time.time_ns()}@bench.livewell', 'password': PASSWORD,
+                'date_of_birth': '1990-01-01', 'contact_number': '+256700000000', 'address': 'Kampala'}, False),
+    ('GET /api/v1/users/', 'GET', lambda c: '/api/v1/users/', None, True),
+    ('GET /api/v1/users/<id>', 'GET', lambda c: f'/api/v1/users/{c.id()}', None, True),
+    ('GET /api/v1/users/<id>/timeline', 'GET', lambda c: f'/api/v1/users/{c.id()}/timeline', None, True),
+    ('PUT /api/v1/users/<id>', 'PUT', lambda c: f'/api/v1/users/{c.id()}', lambda c: {'address': 'Entebbe'}, True),
+
+    ('GET /api/v1/phones/', 'GET', lambda c: '/api/v1/phones/', None, True),
+    ('GET /api/v1/phones/<id>', 'GET', lambda c: f'/api/v1/phones/{c.id()}', None, True),
+    ('DELETE /api/v1/phones/<id>', 'DELETE', lambda c: f"/api/v1/phones/{c.deletable('phones')}", None, True),
+
+    ('POST /api/v1/sms-logs/create', 'POST', lambda c: '/api/v1/sms-logs/create',
+     lambda c: {'phone_number': phone_number(c.id()), 'message': 'Benchmark', 'status': 'Sent'}, False),
+    ('POST /api/v1/sms-logs/bulk', 'POST', lambda c: '/api/v1/sms-logs/bulk',
+     lambda c: [{'phone_number': phone_number(c.id()), 'message': 'Benchmark', 'status': 'Sent'} for _ in range(100)], True),
+    ('POST /api/v1/sms-logs/delivery-reports', 'POST', lambda c: '/api/v1/sms-logs/delivery-reports',
+     lambda c: {'id': f'ATXid_bench{c.id() - 1}', 'status': 'Success'}, False),
+    ('GET /api/v1/sms-logs/', 'GET', lambda c: '/api/v1/sms-logs/', None, True),
+    ('GET /api/v1/sms-logs/?phone_number', 'GET', lambda c: f'/api/v1/sms-logs/?phone_number={phone_number(c.id())}', None, True),
+    ('GET /api/v1/sms-logs/<id>', 'GET', lambda c: f'/api/v1/sms-logs/{c.id()}', None, True),
+    ('GET /api/v1/sms-logs/stats', 'GET', lambda c: '/api/v1/sms-logs/stats?group_by=carrier', None, True),
+    ('GET /api/v1/sms-logs/export', 'GET', lambda c: f'/api/v1/sms-logs/export?start={_day(-1)}&end={_day()}', None, True),
+    ('PUT /api/v1/sms-logs/<id>', 'PUT', lambda c: f'/api/v1/sms-logs/{c.id()}', lambda c: {'status': 'Success'}, True),
+    ('DELETE /api/v1/sms-logs/<id>', 'DELETE', lambda c: f"/api/v1/sms-logs/{c.deletable('sms_logs')}", None, True),
+
+    ('POST /api/v1/voice-call-logs/create', 'POST', lambda c: '/api/v1/voice-call-logs/create',
+     lambda c: {'call_id': f'bench-{c.next()}-{time.time_ns()}', 'caller_number': phone_number(c.id()),
+                'receiver_number': phone_number(c.id())}, True),
+    ('GET /api/v1/voice-call-logs/all', 'GET', lambda c: '/api/v1/voice-call-logs/all', None, True),
+    ('GET /api/v1/voice-call-logs/<id>', 'GET', lambda c: f'/api/v1/voice-call-logs/{c.id()}', None, True),
+    ('GET /api/v1/voice-call-logs/analytics', 'GET', lambda c: f'/api/v1/voice-call-logs/analytics?start={_day(-30)}&end={_day(1)}', None, True),
+    ('GET /api/v1/voice-call-logs/export', 'GET', lambda c: f'/api/v1/voice-call-logs/export?start={_day(-1)}&end={_day()}', None, True),
+    ('PUT /api/v1/voice-call-logs/<id>', 'PUT', lambda c: f'/api/v1/voice-call-logs/{c.id()}', lambda c: {'recording_url': 'https://example.org/r'}, True),
+    ('DELETE /api/v1/voice-call-logs/<id>', 'DELETE', lambda c: f"/api/v1/voice-call-logs/{c.deletable('voice_calls')}", None, True),
+
+    ('POST /api/v1/ussd-sessions/create', 'POST', lambda c: '/api/v1/ussd-sessions/create',
+     lambda c: {'session_id': f'bench-{c.next()}-{time.time_ns()}', 'phone_number': phone_number(c.id())}, True),
+    ('GET /api/v1/ussd-sessions/', 'GET', lambda c: '/api/v1/ussd-sessions/', None, True),
+    ('GET /api/v1/ussd-sessions/<id>', 'GET', lambda c: f'/api/v1/ussd-sessions/{c.id()}', None, True),
+    ('GET /api/v1/ussd-sessions/session/<session_id>', 'GET', lambda c: f'/api/v1/ussd-sessions/session/ATUid_bench{c.id() - 1}', None, True),
+    ('GET /api/v1/ussd-sessions/menu-stats', 'GET', lambda c: '/api/v1/ussd-sessions/menu-stats', None, True),
+    ('PUT /api/v1/ussd-sessions/<id>', 'PUT', lambda c: f'/api/v1/ussd-sessions/{c.id()}', lambda c: {'status': 'completed'}, True),
+    ('DELETE /api/v1/ussd-sessions/<id>', 'DELETE', lambda c: f"/api/v1/ussd-sessions/{c.deletable('ussd_sessions')}", None, True),
+
+    ('POST /api/v1/appointments/create', 'POST', lambda c: '/api/v1/appointments/create',
+     lambda c: {'doctor_id': c.doctor_id(), 'patient_id': c.id(), 'appointment_time': c.free_slot().strftime('%Y-%m-%d %H:%M:%S')}, False),
+    ('GET /api/v1/appointments/', 'GET', lambda c: '/api/v1/appointments/', None, True),
+    ('GET /api/v1/appointments/?doctor_id', 'GET', lambda c: f'/api/v1/appointments/?doctor_id={c.doctor_id()}', None, True),
+    ('GET /api/v1/appointments/<id>', 'GET', lambda c: f'/api/v1/appointments/{c.id()}', None, True),
+    ('GET /api/v1/appointments/availability', 'GET', lambda c: f'/api/v1/appointments/availability?doctor_id={c.doctor_id()}', None, False),
+    ('PUT /api/v1/appointments/<id>', 'PUT', lambda c: f'/api/v1/appointments/{c.id()}', lambda c: {'notes': 'Benchmark'}, True),
+    ('DELETE /api/v1/appointments/<id>', 'DELETE', lambda c: f"/api/v1/appointments/{c.deletable('appointments')}", None, True),
+
+    ('GET /api/v1/medical-records/', 'GET', lambda c: '/api/v1/medical-records/', None, True),
+    ('GET /api/v1/medical-records/<id>', 'GET', lambda c: f'/api/v1/medical-records/{c.id()}', None, True),
+    ('DELETE /api/v1/medical-records/<id>', 'DELETE', lambda c: f"/api/v1/medical-records/{c.deletable('medical_records')}", None, True),
+
+    ('GET /api/v1/doctors/doctors', 'GET', lambda c: '/api/v1/doctors/doctors', None, False),
+    ('GET /api/v1/doctors/doctors/<id>', 'GET', lambda c: f'/api/v1/doctors/doctors/{c.doctor_id()}', None, False),
+    ('GET /api/v1/doctors/search', 'GET', lambda c: '/api/v1/doctors/search?q=cardio', None, False),
+    ('GET /api/v1/doctors/doctors/<id>/working-hours', 'GET', lambda c: f'/api/v1/doctors/doctors/{c.doctor_id()}/working-hours', None, False),
+    ('POST /api/v1/doctors/doctors', 'POST', lambda c: '/api/v1/doctors/doctors',
+     lambda c: {'name': f'Dr Bench {c.next()}', 'email': f'bench{time.time_ns()}@doctors.livewell', 'contact_number': '+256310000000',
+                'specialty': 'Cardiology', 'bio_data': 'Benchmark'}, True),
+    ('PUT /api/v1/doctors/doctors/<id>', 'PUT', lambda c: f'/api/v1/doctors/doctors/{c.doctor_id()}', lambda c: {'bio_data': 'Updated'}, True),
+    ('PUT /api/v1/doctors/doctors/<id>/working-hours', 'PUT', lambda c: f'/api/v1/doctors/doctors/{c.doctor_id()}/working-hours',
+     lambda c: {'working_hours': [{'weekday': day, 'start_time': '08:00', 'end_time': '17:00'} for day in range(5)]}, True),
+
+    ('POST /api/v1/campaigns/sms', 'POST', lambda c: '/api/v1/campaigns/sms',
+     lambda c: {'message': 'Benchmark campaign', 'recipients': [phone_number(c.id()) for _ in range(50)]}, True),
+    ('POST /send-sms', 'POST', lambda c: '/send-sms', lambda c: {'recipient': phone_number(c.id()), 'message': 'Benchmark'}, True),
+    ('POST /make-call', 'POST', lambda c: '/make-call', lambda c: {'caller': '+256310000000', 'recipient': phone_number(c.id())}, True),
+    ('POST /start-ussd', 'POST', lambda c: '/start-ussd', lambda c: {'phone_number': phone_number(c.id()), 'ussd_code': '*384#'}, True),
+    ('GET /jobs/<id>', 'GET', lambda c: f'/jobs/{c.job_id()}', None, True),
+    ('GET /jobs/metrics', 'GET', lambda c: '/jobs/metrics', None, True),
+    ('POST /ussd-response', 'POST', lambda c: '/ussd-response',
+     lambda c: {'session_id': f'bench-ussd-{c.next()}', 'phone_number': phone_number(c.id()), 'ussd_code': '*384#', 'text': '1'}, False),
+]
+
+# Routes that are deliberately not measured
+IGNORED_ENDPOINTS = {'static', 'swagger_ui.show', 'serve_swagger_json', 'home', 'protected'}
+
+
+def _rule_key(method, rule):
+    return f'{method} {rule}'
+
+
+def uncovered_routes(app):
+    covered = {scenario[0].split('?')[0] for scenario in SCENARIOS}
+    missing = []
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint in IGNORED_ENDPOINTS:
+            continue
+        path = rule.rule
+        for argument in rule.arguments:
+            path = path.replace(f'<int:{argument}>', '<id>')
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+            if _rule_key(method, path) not in covered:
+                missing.append(_rule_key(method, path))
+    return sorted(missing)
+
+
+def _last_job_id():
+    return db.session.query(func.max(OutboundJob.id)).scalar() or 0
+
+
+# Run the queue with a Worker until no jobs are due, as `flask run-worker
+# --once` would, and summarise how the jobs in `job_ids` ended and their
+# latency from enqueue to finish (provider calls included). Jobs the
+# provider failed retryably stay queued for their backoff.
+def drain_jobs(app, job_ids):
+    handlers = {signum: signal.getsignal(signum) for signum in (signal.SIGINT, signal.SIGTERM)}
+    started = time.perf_counter()
+    try:
+        with app.app_context():
+            Worker(app, app.config.get('JOB_WORKER_CONCURRENCY', 8), poll_interval=0.01).run(once=True)
+    finally:
+        # The worker takes over SIGINT and SIGTERM on the main thread
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        rows = db.session.query(OutboundJob.status, OutboundJob.created_at, OutboundJob.finished_at) \
+            .filter(OutboundJob.id.in_(job_ids)).all()
+    statuses = {}
+    latencies = []
+    for status, created_at, finished_at in rows:
+        statuses[status] = statuses.get(status, 0) + 1
+        if finished_at is not None:
+            latencies.append((finished_at - created_at).total_seconds() * 1000)
+    latencies.sort()
+    summary = {
+        'jobs': len(rows),
+        'drain_s': round(elapsed, 3),
+        'statuses': dict(sorted(statuses.items())),
+    }
+    for key, q in (('p50_ms', 0.50), ('p95_ms', 0.95), ('p99_ms', 0.99), ('max_ms', 1.0)):
+        value = percentile(latencies, q)
+        summary[key] = round(value, 3) if value is not None else None
+    return summary
+
+
+# Run every scenario `requests` times (after `warmup` unrecorded requests)
+# through the test client and summarise latency, throughput and queries.
+# Jobs a scenario queues (the ids past the highest one before it ran) are
+# then run by drain_jobs and reported under the scenario's 'jobs'.
+def run(app, rows, requests=200, warmup=20, only=None, progress=None):
+    context = Context(rows, reserved=len(SCENARIOS) * (requests + warmup))
+    with app.app_context():
+        context.load()
+        context.headers = {'Authorization': 'Bearer ' + create_access_token(identity={'id': 1, 'role': 'admin'})}
+    # Jobs left queued by an earlier run would be counted against the first
+    # scenario that drains
+    drain_jobs(app, [])
+    client = app.test_client()
+    counter = QueryCounter()
+    results = {}
+    try:
+        for name, method, path, body, authenticated in SCENARIOS:
+            if only and not any(pattern in name for pattern in only):
+                continue
+            if progress:
+                progress(name)
+            latencies = []
+            queries = 0
+            errors = 0
+            statuses = {}
+            with app.app_context():
+                last_job = _last_job_id()
+            started = None
+            for i in range(warmup + requests):
+                if i == warmup:
+                    started = time.perf_counter()
+                url = path(context)
+                payload = body(context) if body else None
+                counter.reset()
+                begin = time.perf_counter()
+                response = client.open(url, method=method, json=payload,
+                                       headers=context.headers if authenticated else None)
+                response.get_data()
+                elapsed = time.perf_counter() - begin
+                if i < warmup:
+                    continue
+                latencies.append(elapsed * 1000)
+                queries += counter.count
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                if response.status_code >= 400:
+                    errors += 1
+            total = time.perf_counter() - started
+            latencies.sort()
+            results[name] = {
+                'requests': requests,
+                'errors': errors,
+                'error_rate': round(errors / requests, 4),
+                'statuses': {str(code): count for code, count in sorted(statuses.items())},
+                'throughput_rps': round(requests / total, 1) if total else None,
+                'p50_ms': round(percentile(latencies, 0.50), 3),
+                'p95_ms': round(percentile(latencies, 0.95), 3),
+                'p99_ms': round(percentile(latencies, 0.99), 3),
+                'max_ms': round(latencies[-1], 3),
+                'queries_per_request': round(queries / requests, 2),
+            }
+            with app.app_context():
+                queued = list(range(last_job + 1, _last_job_id() + 1))
+            if queued:
+                if progress:
+                    progress(f'{name}: running {len(queued)} queued jobs')
+                results[name]['jobs'] = drain_jobs(app, queued)
+                context.job_ids.extend(queued)
+    finally:
+        counter.close()
+    return results
+
+
+# Threshold file: {"default": {...}, "routes": {name: {...}}, "peak_rss_mb": n}
+# where a route's limits are any of p50_ms, p95_ms, p99_ms, error_rate and
+# queries_per_request (upper bounds) and min_throughput_rps. A baseline
+# results file adds a relative check: p95 and queries may grow by at most
+# `max_regression` (0.2 = 20%); p95 changes under REGRESSION_FLOOR_MS are
+# treated as noise.
+def check(results, thresholds=None, baseline=None, max_regression=0.2):
+    breaches = []
+    thresholds = thresholds or {}
+    for name, result in results['routes'].items():
+        limits = dict(thresholds.get('default', {}), **thresholds.get('routes', {}).get(name, {}))
+        for key, limit in limits.items():
+            if key == 'min_throughput_rps':
+                if result['throughput_rps'] is not None and result['throughput_rps'] < limit:
+                    breaches.append(f'{name}: throughput {result["throughput_rps"]} rps < {limit}')
+            elif result.get(key) is not None and result[key] > limit:
+                breaches.append(f'{name}: {key} {result[key]} > {limit}')
+        previous = (baseline or {}).get('routes', {}).get(name)
+        if previous:
+            for key in ('p95_ms', 'queries_per_request'):
+                if key == 'p95_ms' and result[key] - previous.get(key, 0) < REGRESSION_FLOOR_MS:
+                    continue
+                if previous.get(key) and result[key] > previous[key] * (1 + max_regression):
+                    breaches.append(f'{name}: {key} {result[key]} regressed from {previous[key]}')
+    limit = thresholds.get('peak_rss_mb')
+    if limit is not None and results['peak_rss_mb'] > limit:
+        breaches.append(f'peak RSS {results["peak_rss_mb"]} MB > {limit}')
+    return breaches
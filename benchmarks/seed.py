@@ -0,0 +1,146 @@
+import random
+from datetime import date, datetime, time, timedelta
+
+import bcrypt
+from flask import current_app
+from sqlalchemy import func
+
+from livewell_app import call_analytics
+from livewell_app.extensions import db
+from livewell_app.models.appointment import Appointment
+from livewell_app.models.doctors import Doctor
+from livewell_app.models.medical_record import MedicalRecord
+from livewell_app.models.phone import Phone
+from livewell_app.models.sms_log import SMSLog
+from livewell_app.models.user import User
+from livewell_app.models.ussd_session import USSDSession
+from livewell_app.models.voice_call_log import VoiceCall
+from livewell_app.models.working_hours import WorkingHours
+from livewell_app.sms_rollups import sms_rollups
+
+# Rows per table at each scale. Doctors are a reference table and get one
+# row per DOCTOR_RATIO patients.
+SCALES = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+}
+DOCTOR_RATIO = 100
+PASSWORD = 'benchmark-password'
+SPECIALTIES = ('General Practice', 'Paediatrics', 'Cardiology', 'Dermatology', 'Gynaecology',
+               'Orthopaedics', 'Psychiatry', 'Dentistry')
+PREFIXES = ('+25670', '+25674', '+25675', '+25676', '+25677', '+25678', '+25671', '+25639')
+SMS_STATUSES = ('Success', 'Success', 'Success', 'Sent', 'Failed', 'Rejected')
+CALL_STATUSES = ('completed', 'completed', 'completed', 'failed', 'busy', 'no-answer')
+USSD_STATUSES = ('completed', 'completed', 'timeout', 'failed')
+DAYS = 90
+
+
+def phone_number(index):
+    return f'{PREFIXES[index % len(PREFIXES)]}{index:07d}'
+
+
+def _insert(model, rows_for, count, chunk_size):
+    table = model.__table__
+    for start in range(0, count, chunk_size):
+        db.session.execute(table.insert(), [rows_for(i) for i in range(start, min(start + chunk_size, count))])
+        db.session.commit()
+
+
+# Fill an empty database with `rows` rows per table spread over the last
+# DAYS days. Core inserts in chunks keep it linear; the SMS rollups and call
+# stats are then rebuilt from the raw rows. Every user's password is
+# PASSWORD, hashed once at the configured work factor.
+def seed(rows, chunk_size=5000, random_seed=1234, progress=None):
+    rng = random.Random(random_seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    start = now - timedelta(days=DAYS)
+    span = int((now - start).total_seconds())
+    doctors = max(rows // DOCTOR_RATIO, 10)
+    rounds = current_app.config.get('BCRYPT_LOG_ROUNDS', 12)
+    password_hash = bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+    def at(i):
+        return start + timedelta(seconds=rng.randrange(span))
+
+    def step(name):
+        if progress:
+            progress(name)
+
+    step('users')
+    _insert(User, lambda i: {
+        'id': i + 1, 'name': f'Patient {i + 1}', 'email': f'patient{i + 1}@bench.livewell',
+        'password_hash': password_hash, 'role': 'patient', 'date_of_birth': date(1960, 1, 1) + timedelta(days=i % 20000),
+        'contact_number': phone_number(i), 'address': 'Kampala', 'is_doctor': False, 'created_at': at(i)
+    }, rows, chunk_size)
+
+    step('doctors')
+    _insert(Doctor, lambda i: {
+        'id': i + 1, 'name': f'Dr {i + 1}', 'email': f'doctor{i + 1}@bench.livewell', 'contact_number': f'+25631{i:07d}',
+        'specialty': SPECIALTIES[i % len(SPECIALTIES)], 'bio_data': 'Benchmark doctor'
+    }, doctors, chunk_size)
+    _insert(WorkingHours, lambda i: {
+        'doctor_id': i // 5 + 1, 'weekday': i % 5, 'start_time': time(8), 'end_time': time(17), 'slot_minutes': 30
+    }, doctors * 5, chunk_size)
+
+    step('phones')
+    _insert(Phone, lambda i: {
+        'user_id': i + 1, 'phone_number': phone_number(i), 'type': 'mobile', 'is_primary': True, 'created_at': at(i)
+    }, rows, chunk_size)
+
+    step('appointments')
+
+    def appointment(i):
+        doctor_id = rng.randrange(doctors) + 1
+        patient_id = rng.randrange(rows) + 1
+        # Whole half hours from DAYS ago to 2 x DAYS ahead, so booked slots
+        # line up with availability
+        when = start + timedelta(minutes=30 * rng.randrange(3 * DAYS * 48))
+        return {
+            'doctor_id': doctor_id, 'patient_id': patient_id, 'doctor_name': f'Dr {doctor_id}',
+            'patient_name': f'Patient {patient_id}', 'appointment_time': when, 'created_at': at(i),
+            'status': 'scheduled' if when > now else 'completed'
+        }
+    _insert(Appointment, appointment, rows, chunk_size)
+
+    step('medical_records')
+    _insert(MedicalRecord, lambda i: {
+        'patient_id': rng.randrange(rows) + 1, 'doctor_id': rng.randrange(rows) + 1, 'diagnosis': 'Routine check-up',
+        'treatment': 'Rest and fluids', 'recorded_at': at(i)
+    }, rows, chunk_size)
+
+    step('sms_logs')
+    _insert(SMSLog, lambda i: {
+        'phone_number': phone_number(rng.randrange(rows)), 'message': 'Your appointment is tomorrow.',
+        'status': rng.choice(SMS_STATUSES), 'sent_at': at(i), 'message_id': f'ATXid_bench{i}'
+    }, rows, chunk_size)
+
+    step('voice_calls')
+
+    def voice_call(i):
+        initiated = at(i)
+        status = rng.choice(CALL_STATUSES)
+        duration = int(rng.expovariate(1 / 90)) if status == 'completed' else 0
+        return {
+            'call_id': f'ATVId_bench{i}', 'caller_number': phone_number(rng.randrange(rows)),
+            'receiver_number': phone_number(rng.randrange(rows)), 'call_status': status, 'duration': duration,
+            'failure_reason': None if status == 'completed' else status.upper(), 'initiated_at': initiated,
+            'terminated_at': initiated + timedelta(seconds=duration)
+        }
+    _insert(VoiceCall, voice_call, rows, chunk_size)
+
+    step('ussd_sessions')
+    _insert(USSDSession, lambda i: {
+        'session_id': f'ATUid_bench{i}', 'phone_number': phone_number(rng.randrange(rows)), 'session_data': '1',
+        'status': rng.choice(USSD_STATUSES), 'service_code': '*384#', 'created_at': at(i)
+    }, rows, chunk_size)
+
+    step('rollups')
+    sms_rollups.rebuild(start, now + timedelta(hours=1))
+    call_analytics.rebuild(start.date(), now.date() + timedelta(days=1))
+    return table_counts()
+
+
+def table_counts():
+    return {model.__tablename__: db.session.query(func.count(model.id)).scalar()
+            for model in (User, Doctor, Phone, Appointment, MedicalRecord, SMSLog, VoiceCall, USSDSession)}
@@ -0,0 +1,339 @@
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlencode, urlsplit
+
+OPTION_LINE = re.compile(r'^(\w+)\.\s')
+
+# How dialogs end: walk the menu to an END screen, hang up part way
+# (gateway reports 'terminated'), go quiet until the gateway times the
+# session out ('timeout'), or send an invalid choice before carrying on
+OUTCOMES = ('complete', 'abandon', 'timeout', 'invalid')
+DEFAULT_MIX = 'complete=70,abandon=15,timeout=10,invalid=5'
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in OUTCOMES:
+            raise argparse.ArgumentTypeError(f"Unknown outcome '{name}', expected {', '.join(OUTCOMES)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def _distribution(values, deadline_ms):
+    values = sorted(values)
+    late = sum(1 for value in values if value > deadline_ms)
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 0.50), 3) if values else None,
+        'p90_ms': round(percentile(values, 0.90), 3) if values else None,
+        'p99_ms': round(percentile(values, 0.99), 3) if values else None,
+        'max_ms': round(values[-1], 3) if values else None,
+        'over_deadline': round(late / len(values), 4) if values else 0.0,
+    }
+
+
+# Stand-in for the Africa's Talking USSD gateway: it posts the same
+# form-encoded callbacks (sessionId, serviceCode, phoneNumber, networkCode,
+# text with every input so far joined by '*') and, like the gateway, gives
+# up on a dialog whose answer misses the deadline. One keep-alive
+# connection per worker thread.
+class Gateway:
+    def __init__(self, url, deadline_ms, service_code='*384#', timeout=30):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.https = parts.scheme == 'https'
+        self.path = parts.path or '/ussd-response'
+        self.deadline_ms = deadline_ms
+        self.service_code = service_code
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            connection = self._local.connection = cls(self.host, self.port, timeout=self.timeout)
+        return connection
+
+    # (status code or None on a connection error, body, latency ms, render ms)
+    def post(self, fields):
+        body = urlencode(fields)
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        for attempt in (1, 2):
+            connection = self._connection()
+            started = time.perf_counter()
+            try:
+                connection.request('POST', self.path, body, headers)
+                response = connection.getresponse()
+                text = response.read().decode('utf-8', 'replace')
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                self._local.connection = None
+                if attempt == 2:
+                    return None, '', (time.perf_counter() - started) * 1000, None
+                continue
+            latency = (time.perf_counter() - started) * 1000
+            render = response.getheader('X-USSD-Render-Ms')
+            return response.status, text, latency, float(render) if render else None
+
+    def hop(self, session_id, phone_number, inputs):
+        return self.post({
+            'sessionId': session_id,
+            'serviceCode': self.service_code,
+            'phoneNumber': phone_number,
+            'networkCode': '64110',
+            'text': '*'.join(inputs),
+        })
+
+    # The gateway's end-of-session notification for dialogs the user left
+    def end(self, session_id, phone_number, inputs, status):
+        return self.post({
+            'sessionId': session_id,
+            'serviceCode': self.service_code,
+            'phoneNumber': phone_number,
+            'text': '*'.join(inputs),
+            'status': status,
+        })
+
+
+class Recorder:
+    def __init__(self):
+        self.hops = {}
+        self.render = []
+        self.ends = []
+        self.outcomes = {}
+        self.errors = {}
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def hop(self, index, status, latency, render):
+        with self._lock:
+            self.hops.setdefault(index, []).append(latency)
+            if render is not None:
+                self.render.append(render)
+            if status != 200:
+                key = str(status or 'connection error')
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+    def end(self, latency):
+        with self._lock:
+            self.ends.append(latency)
+
+    def outcome(self, name, dropped=False):
+        with self._lock:
+            self.outcomes[name] = self.outcomes.get(name, 0) + 1
+            if dropped:
+                self.dropped += 1
+
+
+def _options(text):
+    return [match.group(1) for match in map(OPTION_LINE.match, text.splitlines()[1:]) if match]
+
+
+# One dialog from dial-in to its outcome. The user "reads" each screen for
+# an exponentially distributed think time before answering.
+def run_dialog(gateway, recorder, outcome, phone_number, rng, think_ms, max_hops):
+    session_id = f'ATUid_load_{uuid.uuid4().hex}'
+    inputs = []
+    stop_after = rng.randint(1, 3) if outcome in ('abandon', 'timeout') else None
+    invalid_sent = False
+    for index in range(1, max_hops + 1):
+        status, text, latency, render = gateway.hop(session_id, phone_number, inputs)
+        recorder.hop(index, status, latency, render)
+        if status != 200:
+            recorder.outcome('error')
+            return
+        if latency > gateway.deadline_ms:
+            # The real gateway has already shown the user an error
+            recorder.outcome(outcome, dropped=True)
+            return
+        if text.startswith('END'):
+            recorder.outcome(outcome)
+            return
+        if stop_after is not None and index >= stop_after:
+            status, _, latency, _ = gateway.end(session_id, phone_number, inputs,
+                                                'terminated' if outcome == 'abandon' else 'timeout')
+            recorder.end(latency)
+            recorder.outcome(outcome)
+            return
+        if think_ms:
+            time.sleep(rng.expovariate(1 / think_ms) / 1000)
+        options = _options(text)
+        if outcome == 'invalid' and not invalid_sent or not options:
+            inputs.append('99')
+            invalid_sent = True
+        else:
+            inputs.append(rng.choice(options))
+    recorder.outcome('max_hops')
+
+
+# ussd_sessions rows (and, where the database reports it, bytes on disk)
+def table_size(engine):
+    from sqlalchemy import text
+    with engine.connect() as connection:
+        rows = connection.execute(text('SELECT COUNT(*) FROM ussd_sessions')).scalar()
+        size = None
+        if engine.dialect.name == 'mysql':
+            size = connection.execute(text(
+                'SELECT data_length + index_length FROM information_schema.tables '
+                'WHERE table_schema = DATABASE() AND table_name = :name'
+            ), {'name': 'ussd_sessions'}).scalar()
+        elif engine.dialect.name == 'sqlite' and engine.url.database:
+            size = os.path.getsize(engine.url.database)
+    return rows, size
+
+
+# Boot the app in this process on a threaded development server, with the
+# fake provider and the same seeded data as the endpoint benchmarks
+def serve(database, scale, host='127.0.0.1', port=0):
+    from werkzeug.serving import make_server
+
+    from benchmarks.seed import SCALES, seed, table_counts
+    from livewell_app import create_app
+    from livewell_app.extensions import db
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database, 'JWT_VERIFY_SUB': False,
+                      'PROVIDER_BACKEND': 'fake'})
+    app.logger.setLevel(logging.CRITICAL)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    with app.app_context():
+        db.create_all()
+        if not table_counts()['users']:
+            print(f'Seeding {SCALES[scale]} rows per table into {database}', file=sys.stderr)
+            seed(SCALES[scale])
+    server = make_server(host, port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_port}/ussd-response'
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.ussd_load',
+        description='Simulate concurrent USSD dialogs against /ussd-response the way the gateway drives it.'
+    )
+    parser.add_argument('--url', help='Callback URL of a running app, e.g. http://127.0.0.1:5000/ussd-response.')
+    parser.add_argument('--serve', action='store_true', help='Start the app in this process instead.')
+    parser.add_argument('--scale', default='10k', help='Seed scale when --serve finds an empty database.')
+    parser.add_argument('--database', help='Database URI to measure row growth (and to serve with --serve).')
+    parser.add_argument('--dialogs', type=int, default=2000, help='Dialogs to run in total.')
+    parser.add_argument('--concurrency', type=int, default=500, help='Dialogs in progress at once.')
+    parser.add_argument('--think-ms', type=float, default=500, help='Mean time a user takes per screen.')
+    parser.add_argument('--deadline-ms', type=float, default=1000, help='Gateway deadline for an answer.')
+    parser.add_argument('--max-late-fraction', type=float, help='Fail the run if more hops than this miss the deadline.')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f'Outcome weights ({DEFAULT_MIX}).')
+    parser.add_argument('--max-hops', type=int, default=10)
+    parser.add_argument('--phones', type=int, default=10000, help='Dial in from this many seeded numbers.')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--output', default='ussd-load-results.json')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    from benchmarks.seed import phone_number
+
+    database = args.database
+    if args.serve:
+        database = database or 'sqlite:///' + os.path.join(tempfile.gettempdir(), f'livewell-bench-{args.scale}.db')
+        server, url = serve(database, args.scale)
+    elif args.url:
+        server, url = None, args.url
+    else:
+        sys.exit('Pass --url of a running app or --serve')
+
+    engine = None
+    if database:
+        from sqlalchemy import create_engine
+        engine = create_engine(database)
+        rows_before, size_before = table_size(engine)
+
+    gateway = Gateway(url, args.deadline_ms)
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    outcomes = rng.choices(list(args.mix), weights=list(args.mix.values()), k=args.dialogs)
+    plans = [(outcome, phone_number(rng.randrange(args.phones)), random.Random(rng.random()))
+             for outcome in outcomes]
+
+    print(f'Running {args.dialogs} dialogs, {args.concurrency} at a time, against {url}', file=sys.stderr)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for outcome, number, dialog_rng in plans:
+            pool.submit(run_dialog, gateway, recorder, outcome, number, dialog_rng, args.think_ms, args.max_hops)
+    elapsed = time.perf_counter() - started
+
+    all_hops = [latency for latencies in recorder.hops.values() for latency in latencies]
+    results = {
+        'meta': {
+            'started_at': datetime.utcnow().isoformat(' ', 'seconds'),
+            'url': url,
+            'dialogs': args.dialogs,
+            'concurrency': args.concurrency,
+            'think_ms': args.think_ms,
+            'deadline_ms': args.deadline_ms,
+            'mix': args.mix,
+        },
+        'elapsed_s': round(elapsed, 2),
+        'hops_per_s': round(len(all_hops) / elapsed, 1) if elapsed else None,
+        'hops': _distribution(all_hops, args.deadline_ms),
+        'hops_by_index': {str(index): _distribution(latencies, args.deadline_ms)
+                          for index, latencies in sorted(recorder.hops.items())},
+        'server_render': _distribution(recorder.render, args.deadline_ms),
+        'end_notifications': _distribution(recorder.ends, args.deadline_ms),
+        'outcomes': recorder.outcomes,
+        'dropped_by_deadline': recorder.dropped,
+        'errors': recorder.errors,
+    }
+    if engine is not None:
+        rows_after, size_after = table_size(engine)
+        results['db_growth'] = {
+            'ussd_sessions_before': rows_before,
+            'ussd_sessions_after': rows_after,
+            'rows_added': rows_after - rows_before,
+            'rows_per_dialog': round((rows_after - rows_before) / args.dialogs, 3),
+            'bytes_added': size_after - size_before if size_after is not None and size_before is not None else None,
+        }
+    if server is not None:
+        server.shutdown()
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    hops = results['hops']
+    print(f"{hops['count']} hops in {results['elapsed_s']}s ({results['hops_per_s']}/s): p50 {hops['p50_ms']} ms, "
+          f"p90 {hops['p90_ms']} ms, p99 {hops['p99_ms']} ms, {hops['over_deadline']:.2%} over {args.deadline_ms:g} ms")
+    for index, stats in results['hops_by_index'].items():
+        print(f"  hop {index:>2}: {stats['count']:>6} p50 {stats['p50_ms']} p99 {stats['p99_ms']} "
+              f"over deadline {stats['over_deadline']:.2%}")
+    print(f"outcomes {recorder.outcomes}; errors {recorder.errors}")
+    if 'db_growth' in results:
+        print(f"ussd_sessions grew by {results['db_growth']['rows_added']} rows")
+    print(f'results written to {args.output}')
+    if args.max_late_fraction is not None and hops['over_deadline'] > args.max_late_fraction:
+        print(f"THRESHOLD BREACHED: {hops['over_deadline']:.2%} of hops over the deadline")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,3 +1,188 @@
+import os
+
+
 class Config:
     SQLALCHEMY_DATABASE_URI='mysql+pymysql://root:@localhost/liveWell_app'
-    
+
+    # Connection pool for the primary and each replica (not applied to
+    # SQLite): connections kept open per process, extra ones allowed under
+    # load, seconds to wait for one, seconds before a connection is recycled
+    # (keep below MySQL's wait_timeout) and a liveness check on checkout.
+    # Size so processes x (DB_POOL_SIZE + DB_MAX_OVERFLOW) < max_connections.
+    DB_POOL_SIZE=10
+    DB_MAX_OVERFLOW=20
+    DB_POOL_TIMEOUT=30
+    DB_POOL_RECYCLE=1800
+    DB_POOL_PRE_PING=True
+
+    # Read replicas (comma-separated URIs in DB_REPLICA_URIS): GET requests
+    # read from them in turn; a client that wrote reads from the primary for
+    # DB_REPLICA_STICKY_SECONDS afterwards
+    DB_REPLICA_URIS=[uri for uri in os.environ.get('DB_REPLICA_URIS', '').split(',') if uri]
+    DB_REPLICA_STICKY_SECONDS=5
+    DB_REPLICA_STICKY_COOKIE='livewell_primary'
+    DB_REPLICA_STICKY_MAX_CLIENTS=10000
+
+    # Africa's Talking credentials come from the environment. AT_ENVIRONMENT
+    # is 'sandbox' or 'production'; AT_USSD_URL is only needed for a gateway
+    # that offers push USSD.
+    AT_USERNAME=os.environ.get('AT_USERNAME', 'sandbox')
+    AT_API_KEY=os.environ.get('AT_API_KEY')
+    AT_ENVIRONMENT=os.environ.get('AT_ENVIRONMENT', 'sandbox')
+    AT_SMS_SENDER_ID=os.environ.get('AT_SMS_SENDER_ID')
+    AT_USSD_URL=os.environ.get('AT_USSD_URL')
+
+    # Provider client: 'africastalking' or 'fake' (in-process, with the
+    # PROVIDER_FAKE_* latency in seconds and failure probability),
+    # (connect, read) timeouts per operation, keep-alive connections, calls in
+    # flight at once and seconds to wait for a slot, retries with jittered
+    # backoff (base and cap in seconds), and the consecutive failures that
+    # open an operation's circuit for PROVIDER_BREAKER_RESET seconds
+    PROVIDER_BACKEND=os.environ.get('PROVIDER_BACKEND', 'africastalking')
+    PROVIDER_FAKE_LATENCY=0.0
+    PROVIDER_FAKE_JITTER=0.0
+    PROVIDER_FAKE_ERROR_RATE=0.0
+    PROVIDER_FAKE_SEED=None
+    PROVIDER_TIMEOUTS={'sms': (3.05, 10), 'voice': (3.05, 10), 'ussd': (3.05, 5)}
+    PROVIDER_POOL_SIZE=20
+    PROVIDER_MAX_CONCURRENCY=16
+    PROVIDER_ACQUIRE_TIMEOUT=5
+    PROVIDER_RETRIES=2
+    PROVIDER_BACKOFF=0.2
+    PROVIDER_BACKOFF_MAX=5
+    PROVIDER_BREAKER_THRESHOLD=5
+    PROVIDER_BREAKER_RESET=30
+
+    # Outbound job queue (/send-sms, /make-call and /start-ussd enqueue;
+    # `flask run-worker` sends): jobs in flight per worker, seconds between
+    # polls of an empty queue, attempts for failures the provider did not act
+    # on with exponential backoff (base and cap in seconds), and seconds
+    # before a job whose worker died is queued again
+    JOB_WORKER_CONCURRENCY=8
+    JOB_POLL_INTERVAL=1.0
+    JOB_MAX_ATTEMPTS=5
+    JOB_RETRY_BACKOFF=10
+    JOB_RETRY_BACKOFF_MAX=600
+    JOB_LOCK_TIMEOUT=300
+    JOB_INSERT_CHUNK_SIZE=1000
+
+    # Message classes, highest priority first. Each has a scheduling weight,
+    # a provider rate in messages per second per worker process (a bulk job
+    # costs one per recipient; None is unlimited) and the most jobs of the
+    # class a worker runs at once (None: all of them). Keep the sum of the
+    # rates x worker processes within the provider account's throughput.
+    # JOB_SCHEDULING is 'weighted' (fair shares by weight) or 'strict' (a
+    # lower class only runs when higher ones have nothing due).
+    # JOB_METRICS_WINDOW is the minutes GET /jobs/metrics reports waits for.
+    JOB_CLASSES={
+        'transactional': {'weight': 8, 'rate': None, 'max_in_flight': None},
+        'reminder': {'weight': 3, 'rate': 20, 'max_in_flight': 4},
+        'bulk': {'weight': 1, 'rate': 50, 'max_in_flight': 4},
+    }
+    JOB_SCHEDULING='weighted'
+    JOB_DEFAULT_CLASS='transactional'
+    JOB_METRICS_WINDOW=15
+
+    # Idempotency-Key support on create endpoints and outbound sends:
+    # 'memory' keeps keys per process (LRU of IDEMPOTENCY_MAX_KEYS; new keys
+    # get a 503 while that many requests are in progress); 'database' also
+    # records them in idempotency_keys so duplicates are caught across
+    # processes. Responses are replayed for IDEMPOTENCY_TTL seconds; a
+    # duplicate waits up to IDEMPOTENCY_WAIT_TIMEOUT seconds for the first
+    # request. A database claim whose process died lapses after
+    # IDEMPOTENCY_LOCK_TIMEOUT.
+    IDEMPOTENCY_BACKEND='memory'
+    IDEMPOTENCY_TTL=86400
+    IDEMPOTENCY_MAX_KEYS=10000
+    IDEMPOTENCY_WAIT_TIMEOUT=30
+    IDEMPOTENCY_LOCK_TIMEOUT=60
+
+    # Keyset pagination for list endpoints
+    PAGINATION_DEFAULT_LIMIT=50
+    PAGINATION_MAX_LIMIT=500
+
+    # Bulk SMS campaigns: recipients per provider call (one 'bulk' job each)
+    SMS_CAMPAIGN_BATCH_SIZE=100
+
+    # Bulk SMS log ingestion
+    SMS_LOG_BULK_MAX_ITEMS=10000
+    SMS_LOG_BULK_CHUNK_SIZE=1000
+
+    # SMS delivery reports are buffered and applied in batches; reports that
+    # arrive before their sms_logs row are retried for DLR_RETRY_TTL seconds
+    DLR_BATCH_SIZE=500
+    DLR_FLUSH_INTERVAL=1.0
+    DLR_UPDATE_CHUNK_SIZE=1000
+    DLR_RETRY_TTL=600
+    DLR_RETRY_MAX_SIZE=10000
+
+    # USSD session store ('memory' is in-process with per-session TTL and
+    # LRU eviction); sessions reach ussd_sessions on completion or timeout,
+    # expired ones within USSD_SESSION_SWEEP_INTERVAL seconds
+    USSD_SESSION_BACKEND='memory'
+    USSD_SESSION_TTL=180
+    USSD_SESSION_MAX=10000
+    USSD_SESSION_SWEEP_INTERVAL=15
+
+    # USSD menu: optional YAML/JSON definition (defaults to the built-in menu)
+    # and the per-hop render time that triggers a warning
+    USSD_MENU_PATH=None
+    USSD_RENDER_BUDGET_MS=500
+
+    # Password hashing: bcrypt work factor (stored hashes are upgraded on the
+    # next successful login when it changes) and the process pool running it.
+    # Workers default to the CPU count and max pending to 4 x workers.
+    BCRYPT_LOG_ROUNDS=12
+    PASSWORD_POOL_WORKERS=None
+    PASSWORD_POOL_MAX_PENDING=None
+    PASSWORD_POOL_TIMEOUT=10
+
+    # Doctor directory cache: seconds a cached page may be served without a
+    # local write, and the number of cached pages
+    DOCTOR_CACHE_TTL=300
+    DOCTOR_CACHE_MAX_ENTRIES=256
+
+    # Doctor search index is rebuilt after this many seconds
+    DOCTOR_INDEX_TTL=300
+
+    # Appointment availability: default slot length when a doctor has no
+    # working-hours template, the longest slot a template may set (bounds
+    # conflict searches) and the longest range one request may cover
+    APPOINTMENT_SLOT_MINUTES=30
+    APPOINTMENT_MAX_SLOT_MINUTES=480
+    AVAILABILITY_MAX_DAYS=31
+
+    # SMS delivery rollups: characters of the phone number kept as the prefix
+    # (country + network code), seconds committed changes are buffered before
+    # one batched upsert, prefix -> carrier for the stats endpoint, the
+    # statuses counted as delivered, and the longest range one request may cover
+    SMS_ROLLUP_PREFIX_LENGTH=6
+    SMS_ROLLUP_FLUSH_INTERVAL=1.0
+    SMS_CARRIER_PREFIXES={
+        '+25670': 'Airtel', '+25674': 'Airtel', '+25675': 'Airtel', '+25620': 'Airtel',
+        '+25676': 'MTN', '+25677': 'MTN', '+25678': 'MTN', '+25639': 'MTN',
+        '+25671': 'UTL'
+    }
+    SMS_SUCCESS_STATUSES=('Success', 'Sent')
+    SMS_STATS_MAX_DAYS=93
+
+    # Voice call analytics: relative error of the stored duration percentiles
+    # (changing it needs a rebuild-call-analytics), rows each (day, number)
+    # is spread over so concurrent call writes do not queue on one row
+    # (`flask compact-call-stats`, run from cron, folds them back into one
+    # row with precomputed percentiles), and the longest range one request
+    # may cover
+    CALL_SKETCH_RELATIVE_ACCURACY=0.01
+    CALL_STATS_SHARDS=16
+    CALL_ANALYTICS_MAX_DAYS=31
+
+    # Log archival (`flask archive-logs`, run from cron): rows older than the
+    # retention in days are moved per table into date-partitioned JSONL files
+    # under ARCHIVE_DIR (defaults to <instance>/archive), BATCH_SIZE rows per
+    # transaction, BLOCK_ROWS rows per compressed block. Compression is
+    # 'gzip' or 'zstd' (needs the zstandard package).
+    ARCHIVE_DIR=None
+    ARCHIVE_RETENTION_DAYS={'sms_logs': 180, 'voice_calls': 180, 'ussd_sessions': 90}
+    ARCHIVE_BATCH_SIZE=1000
+    ARCHIVE_BLOCK_ROWS=256
+    ARCHIVE_COMPRESSION='gzip'
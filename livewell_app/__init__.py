@@ -1,5 +1,5 @@
 
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, jsonify, request, send_from_directory, url_for
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity
@@ -9,6 +9,18 @@ import os
 
 # Import extensions
 from livewell_app.extensions import db, bcrypt, migrate
+from livewell_app.db_routing import replica_router
+from livewell_app.passwords import password_hasher
+from livewell_app.delivery_reports import delivery_reports
+from livewell_app.sms_rollups import sms_rollups
+from livewell_app.doctor_cache import doctor_directory_cache
+from livewell_app.doctor_search import doctor_search_index
+from livewell_app.ussd_store import init_ussd_store, get_session_store, new_session, TERMINAL_STATUSES
+from livewell_app.ussd_menu import init_ussd_menu, get_ussd_menu
+from livewell_app.africas_talking import provider
+from livewell_app.jobs import enqueue, queue_metrics, JobError
+from livewell_app.idempotency import init_idempotency, idempotent
+from livewell_app.models.outbound_job import OutboundJob
 
 # Import blueprints for the updated controllers
 from livewell_app.controllers.user_controller import user_bp
@@ -19,20 +31,32 @@ from livewell_app.controllers.appointment__controller import appointment_bp
 from livewell_app.controllers.medical_record_controller import medical_record_bp
 from livewell_app.controllers.voice_call_log_controller import voice_call_log_bp
 from livewell_app.controllers.doctors_controller import doctor_bp
+from livewell_app.controllers.campaign_controller import campaign_bp
 
 
-
-# Import Africa's Talking functions
-from livewell_app.africas_talking import send_sms, make_voice_call, initiate_ussd_session, handle_ussd_response
-def create_app():
+def create_app(test_config=None):
     app = Flask(__name__)
     CORS(app)
     app.config.from_object('config.Config')
+    # Overrides for tools that boot the app against another database
+    if test_config:
+        app.config.update(test_config)
 
-    # Initialize database and extensions
+    # Initialize database and extensions (the replica router adds the pool
+    # options and replica binds, so it goes before the database)
+    replica_router.init_app(app)
     db.init_app(app)
     migrate.init_app(app, db)
     bcrypt.init_app(app)
+    password_hasher.init_app(app)
+    delivery_reports.init_app(app)
+    sms_rollups.init_app(app)
+    doctor_directory_cache.init_app(app)
+    doctor_search_index.init_app(app)
+    init_ussd_store(app)
+    init_ussd_menu(app)
+    provider.init_app(app)
+    init_idempotency(app)
 
     # Initialize JWTManager with secret key
     app.config['JWT_SECRET_KEY'] = '12345'  
@@ -42,7 +66,7 @@ def create_app():
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = 3600  
 
     # Import models to register them with SQLAlchemy
-    from livewell_app.models import user, phone, sms_log, ussd_session, appointment, medical_record, voice_call_log
+    from livewell_app.models import user, phone, sms_log, ussd_session, appointment, medical_record, voice_call_log, working_hours, sms_rollup, call_stat, outbound_job, idempotency_key
 
     # Register blueprints for each controller
     app.register_blueprint(user_bp, url_prefix='/api/v1/users')
@@ -53,6 +77,11 @@ def create_app():
     app.register_blueprint(medical_record_bp, url_prefix='/api/v1/medical-records')
     app.register_blueprint(voice_call_log_bp, url_prefix='/api/v1/voice-call-logs')
     app.register_blueprint(doctor_bp, url_prefix='/api/v1/doctors')
+    app.register_blueprint(campaign_bp, url_prefix='/api/v1/campaigns')
+
+    # Register flask CLI commands
+    from livewell_app.commands import register_commands
+    register_commands(app)
 
     # Serve Swagger JSON file
     @app.route('/swagger.json')
@@ -76,46 +105,108 @@ def create_app():
     def home():
         return 'Welcome to LiveWell App!'
 
+    # The provider routes queue a job for `flask run-worker` in the body's
+    # message_class (transactional, reminder, bulk; see JOB_CLASSES) and
+    # answer 202 with it; GET /jobs/<id> reports how it went
+    def enqueue_route(kind):
+        try:
+            job = enqueue(kind, request.get_json(silent=True) or {}, created_by=get_jwt_identity().get('id'))
+        except JobError as e:
+            return jsonify({'error': str(e)}), 400
+        db.session.commit()
+        response = jsonify({'message': 'Job queued', 'job': job.to_dict()})
+        response.headers['Location'] = url_for('job_status_route', job_id=job.id)
+        return response, 202
+
     # Route to send SMS
     @app.route('/send-sms', methods=['POST'])
     @jwt_required()
+    @idempotent
     def send_sms_route():
-        data = request.get_json()
-        recipient = data.get('recipient')
-        message = data.get('message')
-        response = send_sms(recipient, message)
-        return jsonify(response), 200 if response else 500
+        return enqueue_route('sms')
 
     # Route to make a voice call
     @app.route('/make-call', methods=['POST'])
     @jwt_required()
+    @idempotent
     def make_call_route():
-        data = request.get_json()
-        caller = data.get('caller')
-        recipient = data.get('recipient')
-        response = make_voice_call(caller, recipient)
-        return jsonify(response), 200 if response else 500
+        return enqueue_route('voice')
 
     # Route to initiate USSD session
     @app.route('/start-ussd', methods=['POST'])
     @jwt_required()
+    @idempotent
     def start_ussd_route():
-        data = request.get_json()
-        phone_number = data.get('phone_number')
-        ussd_code = data.get('ussd_code')
-        response = initiate_ussd_session(phone_number, ussd_code)
-        return jsonify(response), 200 if response else 500
+        return enqueue_route('ussd')
+
+    # Queue depth, wait times and outcomes per message class (Admin only);
+    # ?window=<minutes> overrides JOB_METRICS_WINDOW
+    @app.route('/jobs/metrics', methods=['GET'])
+    @jwt_required()
+    def job_metrics_route():
+        if get_jwt_identity().get('role') != 'admin':
+            return jsonify({'error': 'Admin access required'}), 403
+        window = request.args.get('window', app.config.get('JOB_METRICS_WINDOW', 15), type=int)
+        if not window or not 1 <= window <= 1440:
+            return jsonify({'error': 'window must be between 1 and 1440 minutes'}), 400
+        return jsonify({'window_minutes': window, 'classes': queue_metrics(window)}), 200
+
+    # Status of a queued job (its creator or an admin)
+    @app.route('/jobs/<int:job_id>', methods=['GET'])
+    @jwt_required()
+    def job_status_route(job_id):
+        user_info = get_jwt_identity()
+        job = db.session.get(OutboundJob, job_id)
+        if job is None or (user_info.get('role') != 'admin' and job.created_by != user_info.get('id')):
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify({'job': job.to_dict()}), 200
 
     # Route to handle USSD responses
+    # Accepts the gateway callback (sessionId, phoneNumber, serviceCode, text)
+    # or JSON (session_id, phone_number, ussd_code, user_input) and answers
+    # with the menu engine's CON/END text
     @app.route('/ussd-response', methods=['POST'])
     def ussd_response_route():
-        data = request.get_json()
-        session_id = data.get('session_id')
-        phone_number = data.get('phone_number')
-        ussd_code = data.get('ussd_code')
+        data = request.get_json(silent=True) or request.form
+        session_id = data.get('session_id') or data.get('sessionId')
+        phone_number = data.get('phone_number') or data.get('phoneNumber')
+        ussd_code = data.get('ussd_code') or data.get('serviceCode')
+        path = data.get('text')
         user_input = data.get('user_input')
-        response = handle_ussd_response(session_id, phone_number, ussd_code, user_input)
-        return jsonify(response), 200 if response else 500
+        if user_input is None:
+            user_input = path.split('*')[-1] if path else ''
+        if not session_id or not phone_number:
+            return jsonify({'error': 'session_id and phone_number are required'}), 400
+
+        # Session state lives in the session store; ussd_sessions is only
+        # written once the session completes or times out
+        store = get_session_store()
+        session = store.get(session_id) or new_session(session_id, phone_number, ussd_code)
+        if path is not None:
+            session['session_data'] = path
+        elif user_input:
+            session['session_data'] = f"{session['session_data']}*{user_input}" if session['session_data'] else user_input
+
+        try:
+            text, render_ms = get_ussd_menu().handle(session, user_input, path=session['session_data'])
+        except Exception as e:
+            app.logger.error(f'Error rendering USSD menu: {e}')
+            store.put(session)
+            store.complete(session_id, 'failed')
+            return app.response_class('END Sorry, something went wrong. Please try again.', mimetype='text/plain')
+
+        store.put(session)
+        status = data.get('status')
+        if status in TERMINAL_STATUSES:
+            store.complete(session_id, status)
+        elif text.startswith('END'):
+            store.complete(session_id)
+
+        if render_ms > app.config.get('USSD_RENDER_BUDGET_MS', 500):
+            app.logger.warning(f"USSD hop for {session_id} at '{session['menu_state']}' took {render_ms:.1f} ms")
+        response = app.response_class(text, mimetype='text/plain')
+        response.headers['X-USSD-Render-Ms'] = f'{render_ms:.2f}'
+        return response
 
     # Protected route example
     @app.route('/protected')
@@ -1,49 +1,282 @@
 # africas_talking.py
 
-import africastalking
-
-# Initialize Africa's Talking credentials
-username = "sandbox"  # Your Africa's Talking application username
-api_key = "atsk_71a3e3a9743a9b82a7ecd5e0af30d23efaea820bdddc5a830de96305e0a7ac563c8336ea"  # Y88 our Africa's Talking API key
-
-# Initialize the Africa's Talking client
-africastalking.initialize(username, api_key)
-sms = africastalking.SMS
-voice = africastalking.Voice
-ussd = africastalking.USSD
-
-# Function to send SMS
-def send_sms(recipient, message):
-    try:
-        response = sms.send(message, [recipient])
-        return response
-    except Exception as e:
-        print(f"Error sending SMS: {e}")
-        return None
-
-# Function to initiate a voice call
-def make_voice_call(caller, recipient):
-    try:
-        response = voice.call(caller, recipient)
-        return response
-    except Exception as e:
-        print(f"Error making voice call: {e}")
-        return None
-
-# Function to initiate a USSD session
-def initiate_ussd_session(phone_number, ussd_code):
-    try:
-        response = ussd.initiate(phone_number, ussd_code)
-        return response
-    except Exception as e:
-        print(f"Error initiating USSD session: {e}")
-        return None
-
-# Function to handle USSD responses (e.g., user input during a USSD session)
-def handle_ussd_response(session_id, phone_number, ussd_code, user_input):
-    try:
-        response = ussd.respond(session_id, phone_number, ussd_code, user_input)
-        return response
-    except Exception as e:
-        print(f"Error handling USSD response: {e}")
-        return None
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from livewell_app.fake_provider import FakeProviderAdapter
+
+API_URLS = {
+    'sandbox': {
+        'sms': 'https://api.sandbox.africastalking.com/version1/messaging',
+        'voice': 'https://voice.sandbox.africastalking.com/call',
+    },
+    'production': {
+        'sms': 'https://api.africastalking.com/version1/messaging',
+        'voice': 'https://voice.africastalking.com/call',
+    },
+}
+# Africa's Talking has no push API for USSD; the fake answers on this URL
+# when AT_USSD_URL is not set
+FAKE_USSD_URL = 'https://ussd.fake.africastalking.com/ussd'
+OPERATIONS = ('sms', 'voice', 'ussd')
+RETRY_ALWAYS_STATUSES = (429, 503)
+
+
+# `retryable` is set when the provider cannot have acted on the request, so
+# trying again later will not send anything twice
+class ProviderError(Exception):
+    def __init__(self, message, status=None, retryable=False):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+
+
+# Raised without calling the provider: the circuit is open or every
+# concurrent call slot is taken
+class ProviderUnavailable(ProviderError):
+    def __init__(self, message):
+        super().__init__(message, retryable=True)
+
+
+# Stops calling an operation after `threshold` consecutive failures. Once
+# `reset_timeout` seconds have passed a single trial call is let through;
+# its success closes the circuit, its failure opens it again. A trial is
+# owned by the thread that was let through; if it ends without recording an
+# outcome, release() counts it as failed so the circuit cannot stay stuck
+# half-open.
+class CircuitBreaker:
+    def __init__(self, threshold=5, reset_timeout=30):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self.opened_at >= self.reset_timeout else 'open'
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._trial is not None:
+                return False
+            self._trial = threading.get_ident()
+            return True
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = None
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._trial = None
+
+    def release(self):
+        with self._lock:
+            if self._trial == threading.get_ident():
+                self.failures += 1
+                self.opened_at = time.monotonic()
+                self._trial = None
+
+
+# Client for the Africa's Talking REST API. Calls share one keep-alive
+# connection pool per process, each operation has its own (connect, read)
+# timeout and circuit breaker, and at most PROVIDER_MAX_CONCURRENCY calls
+# run at once. Failures that cannot have reached the provider (connection
+# errors, 429, 503) are retried with jittered exponential backoff; read
+# timeouts, responses broken off midway and other 5xx are only retried for
+# idempotent calls, so an SMS or call is never placed twice.
+class ProviderClient:
+    def __init__(self, app=None):
+        self.username = None
+        self.api_key = None
+        self.sender_id = None
+        self.urls = dict(API_URLS['sandbox'], ussd=None)
+        self.timeouts = {operation: (3.05, 10) for operation in OPERATIONS}
+        self.pool_size = 20
+        self.max_concurrency = 16
+        self.acquire_timeout = 5
+        self.retries = 2
+        self.backoff = 0.2
+        self.backoff_max = 5
+        self.fake = None
+        self._breakers = {operation: CircuitBreaker() for operation in OPERATIONS}
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._session = None
+        self._session_pid = None
+        self._lock = threading.Lock()
+        self._stats = {operation: dict.fromkeys(('calls', 'retries', 'failures', 'rejected'), 0)
+                       for operation in OPERATIONS}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.username = app.config.get('AT_USERNAME', 'sandbox')
+        self.api_key = app.config.get('AT_API_KEY')
+        self.sender_id = app.config.get('AT_SMS_SENDER_ID')
+        self.timeouts.update(app.config.get('PROVIDER_TIMEOUTS', {}))
+        self.pool_size = app.config.get('PROVIDER_POOL_SIZE', 20)
+        self.max_concurrency = app.config.get('PROVIDER_MAX_CONCURRENCY', 16)
+        self.acquire_timeout = app.config.get('PROVIDER_ACQUIRE_TIMEOUT', 5)
+        self.retries = app.config.get('PROVIDER_RETRIES', 2)
+        self.backoff = app.config.get('PROVIDER_BACKOFF', 0.2)
+        self.backoff_max = app.config.get('PROVIDER_BACKOFF_MAX', 5)
+        self._breakers = {operation: CircuitBreaker(app.config.get('PROVIDER_BREAKER_THRESHOLD', 5),
+                                                    app.config.get('PROVIDER_BREAKER_RESET', 30))
+                          for operation in OPERATIONS}
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+
+        self.fake = None
+        if app.config.get('PROVIDER_BACKEND', 'africastalking') == 'fake':
+            self.fake = FakeProviderAdapter(
+                latency=app.config.get('PROVIDER_FAKE_LATENCY', 0.0),
+                jitter=app.config.get('PROVIDER_FAKE_JITTER', 0.0),
+                error_rate=app.config.get('PROVIDER_FAKE_ERROR_RATE', 0.0),
+                seed=app.config.get('PROVIDER_FAKE_SEED')
+            )
+        self.urls = dict(API_URLS[app.config.get('AT_ENVIRONMENT', 'sandbox')])
+        self.urls['ussd'] = app.config.get('AT_USSD_URL') or (FAKE_USSD_URL if self.fake else None)
+        self._session = None
+        app.extensions['provider_client'] = self
+
+    # Created lazily, and again after a fork, so every server worker owns its
+    # connections
+    def _get_session(self):
+        if self._session is None or self._session_pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._session_pid != os.getpid():
+                    session = requests.Session()
+                    adapter = self.fake or HTTPAdapter(pool_connections=len(OPERATIONS),
+                                                       pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    session.headers.update({'Accept': 'application/json'})
+                    self._session = session
+                    self._session_pid = os.getpid()
+        return self._session
+
+    def _sleep(self, attempt, retry_after=None):
+        delay = random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(self.backoff_max, int(retry_after)))
+        time.sleep(delay)
+
+    def _count(self, operation, key):
+        with self._lock:
+            self._stats[operation][key] += 1
+
+    def _post(self, operation, url, data, idempotent=False):
+        if not url:
+            raise ProviderError(f'No provider URL configured for {operation}')
+        if not self.api_key and not self.fake:
+            raise ProviderError('AT_API_KEY is not set')
+        breaker = self._breakers[operation]
+        if breaker.state == 'open':
+            self._count(operation, 'rejected')
+            raise ProviderUnavailable(f'{operation} provider is unavailable (circuit open)')
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            self._count(operation, 'rejected')
+            raise ProviderUnavailable(f'{operation} provider is at capacity')
+
+        headers = {'apiKey': self.api_key or 'fake'}
+        try:
+            if not breaker.allow():
+                self._count(operation, 'rejected')
+                raise ProviderUnavailable(f'{operation} provider is unavailable (circuit open)')
+            self._count(operation, 'calls')
+            attempt = 0
+            while True:
+                error, retry_after = None, None
+                try:
+                    response = self._get_session().post(url, data=data, headers=headers,
+                                                        timeout=self.timeouts[operation])
+                except requests.ConnectionError as e:
+                    # Includes connect timeouts; the request never reached the provider
+                    error, retryable = ProviderError(f'{operation} provider unreachable: {e}'), True
+                except requests.Timeout as e:
+                    error, retryable = ProviderError(f'{operation} provider timed out: {e}'), idempotent
+                except requests.RequestException as e:
+                    # Failed mid-response (e.g. a broken chunked body); it may have been acted on
+                    error, retryable = ProviderError(f'{operation} provider request failed: {e}'), idempotent
+                else:
+                    if response.status_code < 400:
+                        breaker.success()
+                        try:
+                            return response.json()
+                        except ValueError:
+                            raise ProviderError(f'{operation} provider sent an invalid response',
+                                                response.status_code)
+                    message = f'{operation} provider answered {response.status_code}: {response.text[:200]}'
+                    error = ProviderError(message, response.status_code)
+                    if response.status_code < 500 and response.status_code != 429:
+                        # The request itself was rejected; the provider is up
+                        breaker.success()
+                        raise error
+                    retryable = idempotent or response.status_code in RETRY_ALWAYS_STATUSES
+                    retry_after = response.headers.get('Retry-After')
+
+                breaker.failure()
+                error.retryable = retryable
+                if not retryable or attempt >= self.retries or not breaker.allow():
+                    self._count(operation, 'failures')
+                    raise error
+                self._count(operation, 'retries')
+                self._sleep(attempt, retry_after)
+                attempt += 1
+        finally:
+            breaker.release()
+            self._slots.release()
+
+    def send_sms(self, recipient, message):
+        return self.send_bulk_sms([recipient], message)
+
+    # The same SMS to many recipients in a single provider call
+    def send_bulk_sms(self, recipients, message):
+        data = {'username': self.username, 'to': ','.join(recipients), 'message': message}
+        if self.sender_id:
+            data['from'] = self.sender_id
+        return self._post('sms', self.urls['sms'], data)
+
+    def make_voice_call(self, caller, recipient):
+        return self._post('voice', self.urls['voice'],
+                          {'username': self.username, 'from': caller, 'to': recipient})
+
+    def initiate_ussd_session(self, phone_number, ussd_code):
+        return self._post('ussd', self.urls['ussd'],
+                          {'username': self.username, 'phoneNumber': phone_number, 'serviceCode': ussd_code})
+
+    # Forward user input during a USSD session
+    def handle_ussd_response(self, session_id, phone_number, ussd_code, user_input):
+        return self._post('ussd', self.urls['ussd'], {
+            'username': self.username,
+            'sessionId': session_id,
+            'phoneNumber': phone_number,
+            'serviceCode': ussd_code,
+            'text': user_input
+        })
+
+    def stats(self):
+        with self._lock:
+            stats = {operation: dict(counts, circuit=self._breakers[operation].state)
+                     for operation, counts in self._stats.items()}
+        if self.fake:
+            stats['fake'] = self.fake.stats()
+        return stats
+
+
+provider = ProviderClient()
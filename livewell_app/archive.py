@@ -0,0 +1,321 @@
+import bisect
+import json
+import os
+import zlib
+from datetime import date, datetime
+from types import SimpleNamespace
+
+from flask import current_app
+from sqlalchemy import select
+
+from livewell_app.extensions import db
+from livewell_app.models.sms_log import SMSLog
+from livewell_app.models.ussd_session import USSDSession
+from livewell_app.models.voice_call_log import VoiceCall
+
+try:
+    import zstandard
+except ImportError:  # optional; gzip is always available
+    zstandard = None
+
+# Tables that can be archived, with the column that decides a row's age
+ARCHIVABLE_TABLES = {
+    'sms_logs': (SMSLog, SMSLog.sent_at),
+    'voice_calls': (VoiceCall, VoiceCall.initiated_at),
+    'ussd_sessions': (USSDSession, USSDSession.created_at),
+}
+
+COMPRESSIONS = {
+    'gzip': '.gz',
+    'zstd': '.zst',
+}
+
+MANIFEST_NAME = 'manifest.json'
+
+# Loaded per-file indexes by path, with the mtime they were read at
+_index_cache = {}
+# Loaded manifests by table, with the mtime they were read at
+_manifest_cache = {}
+
+
+def archive_root():
+    return current_app.config.get('ARCHIVE_DIR') or os.path.join(current_app.instance_path, 'archive')
+
+
+def check_compression(compression):
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression '{compression}', expected one of {', '.join(COMPRESSIONS)}")
+    if compression == 'zstd' and zstandard is None:
+        raise ValueError("zstd compression needs the 'zstandard' package")
+
+
+def _compress(data, compression):
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor().compress(data)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _decompress(data, compression):
+    if compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Reading .zst archives needs the 'zstandard' package")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data, 31)
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+# column name -> parser for the values that JSON stores as strings
+def _decoders(model):
+    decoders = {}
+    for column in model.__table__.columns:
+        python_type = getattr(column.type, 'python_type', None)
+        if python_type is datetime:
+            decoders[column.name] = datetime.fromisoformat
+        elif python_type is date:
+            decoders[column.name] = date.fromisoformat
+    return decoders
+
+
+def _decode(line, decoders):
+    values = json.loads(line)
+    for name, parse in decoders.items():
+        if values.get(name) is not None:
+            values[name] = parse(values[name])
+    return values
+
+
+# Written to a temporary name and renamed, so readers never see half a file
+def _write_atomic(path, data):
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+# One archive file: rows of one table and day, ordered by id, written as JSONL
+# in blocks of `block_rows` that are each compressed on their own. The
+# `.idx.json` beside it records the id and time range and each block's
+# (first id, last id, offset, length), so a lookup decompresses one block.
+# Files are named after their id range; re-archiving the same rows after an
+# interrupted run overwrites the file instead of duplicating it.
+def write_partition(table_name, day, rows, compression='gzip', block_rows=256):
+    model, time_column = ARCHIVABLE_TABLES[table_name]
+    columns = [column.name for column in model.__table__.columns]
+    directory = os.path.join(archive_root(), table_name, day.isoformat())
+    os.makedirs(directory, exist_ok=True)
+    base = f'{rows[0].id}-{rows[-1].id}.jsonl'
+
+    blocks = []
+    parts = []
+    offset = 0
+    for start in range(0, len(rows), block_rows):
+        block = rows[start:start + block_rows]
+        lines = ''.join(
+            json.dumps({name: _encode_value(value) for name, value in zip(columns, row)}, separators=(',', ':')) + '\n'
+            for row in block
+        )
+        data = _compress(lines.encode('utf-8'), compression)
+        blocks.append([block[0].id, block[-1].id, offset, len(data)])
+        parts.append(data)
+        offset += len(data)
+
+    times = [getattr(row, time_column.name) for row in rows]
+    data_file = base + COMPRESSIONS[compression]
+    _write_atomic(os.path.join(directory, data_file), b''.join(parts))
+    index = {
+        'table': table_name,
+        'day': day.isoformat(),
+        'file': data_file,
+        'compression': compression,
+        'rows': len(rows),
+        'min_id': rows[0].id,
+        'max_id': rows[-1].id,
+        'min_time': _encode_value(min(times)),
+        'max_time': _encode_value(max(times)),
+        'blocks': blocks,
+    }
+    _write_atomic(os.path.join(directory, base + '.idx.json'), json.dumps(index).encode('utf-8'))
+    _add_to_manifest(table_name, [rows[0].id, rows[-1].id, os.path.join(day.isoformat(), base + '.idx.json')])
+    return index
+
+
+# Per-table manifest of archive files: [min_id, max_id, index path relative
+# to the table directory] sorted by min_id, so an id lookup bisects into it
+# instead of listing every day. Updated by write_partition (one archiver
+# runs at a time), and built from the files once if it is missing.
+def _manifest_path(table_name):
+    return os.path.join(archive_root(), table_name, MANIFEST_NAME)
+
+
+def _write_manifest(table_name, entries):
+    entries.sort()
+    _write_atomic(_manifest_path(table_name), json.dumps(entries, separators=(',', ':')).encode('utf-8'))
+
+
+def _add_to_manifest(table_name, entry):
+    if not os.path.exists(_manifest_path(table_name)):
+        _write_manifest(table_name, _scan_manifest(table_name))
+        return
+    entries = [existing for existing in _load_manifest(table_name)[0] if existing[2] != entry[2]]
+    entries.append(entry)
+    _write_manifest(table_name, entries)
+
+
+def _scan_manifest(table_name):
+    entries = []
+    for _, index in _indexes(table_name):
+        base = index['file'][:-len(COMPRESSIONS[index['compression']])]
+        entries.append([index['min_id'], index['max_id'], os.path.join(index['day'], base + '.idx.json')])
+    return entries
+
+
+# (entries, their min_ids, running max of max_id) for bisecting
+def _load_manifest(table_name):
+    path = _manifest_path(table_name)
+    if not os.path.exists(path):
+        if not os.path.isdir(os.path.dirname(path)):
+            return [], [], []
+        _write_manifest(table_name, _scan_manifest(table_name))
+    mtime = os.stat(path).st_mtime_ns
+    cached = _manifest_cache.get(table_name)
+    if cached is None or cached[0] != mtime or cached[1] != path:
+        with open(path, 'rb') as f:
+            entries = json.loads(f.read())
+        reach = []
+        for entry in entries:
+            reach.append(max(entry[1], reach[-1]) if reach else entry[1])
+        cached = _manifest_cache[table_name] = (mtime, path, (entries, [entry[0] for entry in entries], reach))
+    return cached[2]
+
+
+def _load_index(path):
+    mtime = os.stat(path).st_mtime_ns
+    cached = _index_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, 'rb') as f:
+            cached = _index_cache[path] = (mtime, json.loads(f.read()))
+    return cached[1]
+
+
+# (directory, index) for every archive file of a table whose day falls in
+# [first_day, last_day], in day then id order
+def _indexes(table_name, first_day=None, last_day=None):
+    root = os.path.join(archive_root(), table_name)
+    if not os.path.isdir(root):
+        return
+    for day_name in sorted(os.listdir(root)):
+        try:
+            day = date.fromisoformat(day_name)
+        except ValueError:
+            continue
+        if (first_day and day < first_day) or (last_day and day > last_day):
+            continue
+        directory = os.path.join(root, day_name)
+        indexes = [_load_index(os.path.join(directory, name))
+                   for name in os.listdir(directory) if name.endswith('.idx.json')]
+        for index in sorted(indexes, key=lambda index: index['min_id']):
+            yield directory, index
+
+
+def _read_block(directory, index, block):
+    _, _, offset, length = block
+    with open(os.path.join(directory, index['file']), 'rb') as f:
+        f.seek(offset)
+        data = f.read(length)
+    return _decompress(data, index['compression']).decode('utf-8').splitlines()
+
+
+# An archived row by id, with attribute access like a model instance (so the
+# serializers can dump it), or None. Files that may hold the id are found by
+# bisecting the manifest: those starting at or before it, walking back only
+# while an earlier file still reaches it.
+def find_archived(table_name, id):
+    model, _ = ARCHIVABLE_TABLES[table_name]
+    entries, starts, reach = _load_manifest(table_name)
+    root = os.path.join(archive_root(), table_name)
+    i = bisect.bisect_right(starts, id) - 1
+    while i >= 0 and reach[i] >= id:
+        min_id, max_id, index_path = entries[i]
+        i -= 1
+        if not min_id <= id <= max_id:
+            continue
+        path = os.path.join(root, index_path)
+        if not os.path.exists(path):
+            continue
+        directory, index = os.path.dirname(path), _load_index(path)
+        for block in index['blocks']:
+            if block[0] <= id <= block[1]:
+                for line in _read_block(directory, index, block):
+                    values = _decode(line, _decoders(model))
+                    if values['id'] == id:
+                        return SimpleNamespace(**values)
+    return None
+
+
+# Archived rows with start <= time < end as tuples in the table's current
+# column order (columns added since a file was written read as None).
+# Whole days and files outside the range are skipped from the index alone.
+def iter_archived(table_name, start=None, end=None):
+    model, time_column = ARCHIVABLE_TABLES[table_name]
+    columns = [column.name for column in model.__table__.columns]
+    decoders = _decoders(model)
+    for directory, index in _indexes(table_name, start and start.date(), end and end.date()):
+        if start and datetime.fromisoformat(index['max_time']) < start:
+            continue
+        if end and datetime.fromisoformat(index['min_time']) >= end:
+            continue
+        for block in index['blocks']:
+            for line in _read_block(directory, index, block):
+                values = _decode(line, decoders)
+                time_value = values.get(time_column.name)
+                if start and (time_value is None or time_value < start):
+                    continue
+                if end and (time_value is None or time_value >= end):
+                    continue
+                yield tuple(values.get(name) for name in columns)
+
+
+# Move rows of `table_name` older than `cutoff` into the archive, oldest
+# first, `batch_size` rows per transaction: the batch is locked, written to
+# its day files and then deleted. Deletes go through Core, so the SMS hourly
+# rollups and call stats keep counting archived rows (a rebuild over an
+# archived range would drop them). Returns the number of rows moved.
+def archive_table(table_name, cutoff, batch_size=1000, compression='gzip', block_rows=256, max_batches=None):
+    check_compression(compression)
+    model, time_column = ARCHIVABLE_TABLES[table_name]
+    table = model.__table__
+    moved = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        try:
+            rows = db.session.execute(
+                select(table)
+                .where(time_column < cutoff)
+                .order_by(time_column, table.c.id)
+                .limit(batch_size)
+                .with_for_update()
+            ).all()
+            if not rows:
+                db.session.rollback()
+                break
+            by_day = {}
+            for row in rows:
+                by_day.setdefault(getattr(row, time_column.name).date(), []).append(row)
+            for day, day_rows in sorted(by_day.items()):
+                write_partition(table_name, day, sorted(day_rows, key=lambda row: row.id), compression, block_rows)
+            db.session.execute(table.delete().where(table.c.id.in_([row.id for row in rows])))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        moved += len(rows)
+        batches += 1
+    return moved
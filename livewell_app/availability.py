@@ -0,0 +1,124 @@
+import bisect
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from livewell_app.models.appointment import Appointment
+from livewell_app.models.working_hours import WorkingHours
+
+CANCELLED_STATUSES = ('cancelled', 'canceled')
+
+
+class AvailabilityError(ValueError):
+    pass
+
+
+def default_slot_minutes():
+    return current_app.config.get('APPOINTMENT_SLOT_MINUTES', 30)
+
+
+# No stored appointment lasts longer than this, so an appointment that
+# overlaps a time cannot start more than this much before it
+def max_slot_minutes():
+    return current_app.config.get('APPOINTMENT_MAX_SLOT_MINUTES', 480)
+
+
+def parse_datetime(value, field='appointment_time'):
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise AvailabilityError(f'{field} must be a datetime (YYYY-MM-DD HH:MM:SS)')
+
+
+# Working-hours templates for a doctor, grouped by weekday
+def working_hours_by_weekday(doctor_id):
+    templates = {}
+    for hours in WorkingHours.query.filter_by(doctor_id=doctor_id).order_by(WorkingHours.start_time):
+        templates.setdefault(hours.weekday, []).append(hours)
+    return templates
+
+
+# Slot length used for a booking at `when`: the doctor's template for that
+# weekday, or APPOINTMENT_SLOT_MINUTES when no template covers it
+def slot_minutes_at(doctor_id, when):
+    if doctor_id is not None:
+        for hours in WorkingHours.query.filter_by(doctor_id=doctor_id, weekday=when.weekday()):
+            if hours.start_time <= when.time() < hours.end_time:
+                return hours.slot_minutes
+    return default_slot_minutes()
+
+
+def _active(query):
+    return query.filter(Appointment.status.notin_(CANCELLED_STATUSES))
+
+
+# (start, end) of a doctor's live appointments starting in [start, end),
+# sorted by start and read as an index range scan on
+# (doctor_id, appointment_time). Each end uses the appointment's own
+# duration, not the current template's.
+def booked_intervals(doctor_id, start, end):
+    rows = (
+        _active(Appointment.query.with_entities(Appointment.appointment_time, Appointment.duration_minutes))
+        .filter(Appointment.doctor_id == doctor_id,
+                Appointment.appointment_time >= start,
+                Appointment.appointment_time < end)
+        .order_by(Appointment.appointment_time)
+        .all()
+    )
+    return [(appointment_time, appointment_time + timedelta(minutes=duration))
+            for appointment_time, duration in rows]
+
+
+# An existing appointment overlapping [when, when + slot), found by a
+# bounded index seek rather than scanning the doctor's whole history: only
+# appointments starting less than the longest slot before `when` can still
+# be running, and each is compared against its own end
+def find_conflict(doctor_id, when, slot_minutes, exclude_id=None):
+    query = _active(Appointment.query).filter(
+        Appointment.doctor_id == doctor_id,
+        Appointment.appointment_time > when - timedelta(minutes=max_slot_minutes()),
+        Appointment.appointment_time < when + timedelta(minutes=slot_minutes)
+    )
+    if exclude_id is not None:
+        query = query.filter(Appointment.id != exclude_id)
+    for appointment in query.order_by(Appointment.appointment_time):
+        if appointment.appointment_time + timedelta(minutes=appointment.duration_minutes) > when:
+            return appointment
+    return None
+
+
+# Open slots for a doctor between two dates (end exclusive). Booked
+# intervals are loaded once for the whole range; each candidate slot is then
+# checked against the few that start within the longest slot before it,
+# found with a binary search.
+def open_slots(doctor, start_date, end_date, now=None):
+    templates = working_hours_by_weekday(doctor.id)
+    if not templates:
+        return []
+
+    longest = timedelta(minutes=max_slot_minutes())
+    range_start = datetime.combine(start_date, datetime.min.time())
+    range_end = datetime.combine(end_date, datetime.min.time())
+    booked = booked_intervals(doctor.id, range_start - longest, range_end)
+    starts = [booked_start for booked_start, _ in booked]
+    now = now or datetime.utcnow()
+
+    slots = []
+    day = start_date
+    while day < end_date:
+        for hours in templates.get(day.weekday(), []):
+            slot = timedelta(minutes=hours.slot_minutes)
+            current = datetime.combine(day, hours.start_time)
+            window_end = datetime.combine(day, hours.end_time)
+            while current + slot <= window_end:
+                # Bookings that start before this slot ends and after
+                # current - longest; free if none of them is still running
+                i = bisect.bisect_right(starts, current - longest)
+                j = bisect.bisect_left(starts, current + slot, i)
+                if current >= now and all(booked_end <= current for _, booked_end in booked[i:j]):
+                    slots.append({'start': current, 'end': current + slot})
+                current += slot
+        day += timedelta(days=1)
+    return slots
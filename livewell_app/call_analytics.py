@@ -0,0 +1,307 @@
+import json
+import math
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import select
+
+from livewell_app.extensions import db
+from livewell_app.models.call_stat import CallStat
+from livewell_app.models.voice_call_log import VoiceCall
+
+FINISHED_STATUSES = ('completed', 'failed', 'busy', 'no-answer', 'cancelled')
+FAILED_STATUSES = ('failed', 'busy', 'no-answer')
+QUANTILES = (('p50', 0.5), ('p90', 0.9), ('p99', 0.99))
+
+
+# Mergeable quantile sketch with bounded relative error (DDSketch-style).
+# Values are counted in logarithmic buckets: bucket i holds values in
+# (gamma^(i-1), gamma^i], gamma = (1 + a) / (1 - a), so any quantile is
+# returned within a relative error of `a`. Two sketches with the same
+# accuracy merge by adding bucket counts, which is what lets per-day and
+# per-number sketches roll up into any range.
+class DurationSketch:
+    def __init__(self, relative_accuracy=0.01, bins=None, zero_count=0):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError('relative_accuracy must be between 0 and 1')
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = Counter(bins or {})
+        self.zero_count = zero_count
+
+    @property
+    def count(self):
+        return self.zero_count + sum(self.bins.values())
+
+    def add(self, value):
+        if value <= 0:
+            self.zero_count += 1
+        else:
+            self.bins[math.ceil(math.log(value) / self._log_gamma)] += 1
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError('Cannot merge sketches with different accuracies')
+        self.bins.update(other.bins)
+        self.zero_count += other.zero_count
+
+    def quantile(self, q):
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return round(2 * self.gamma ** index / (self.gamma + 1), 3)
+        return None
+
+    def to_json(self):
+        return json.dumps({
+            'accuracy': self.relative_accuracy,
+            'zero': self.zero_count,
+            'bins': {str(index): count for index, count in self.bins.items() if count}
+        }, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, raw, default_accuracy=0.01):
+        data = json.loads(raw) if raw else {}
+        return cls(
+            data.get('accuracy', default_accuracy),
+            {int(index): count for index, count in data.get('bins', {}).items()},
+            data.get('zero', 0)
+        )
+
+
+def _accuracy():
+    return current_app.config.get('CALL_SKETCH_RELATIVE_ACCURACY', 0.01)
+
+
+# Writers use shards 1..CALL_STATS_SHARDS; shard 0 holds the merged summary
+# that compact() and rebuild() write, with its percentiles
+def _shard():
+    return random.randint(1, current_app.config.get('CALL_STATS_SHARDS', 16))
+
+
+def is_finished(call):
+    return call.terminated_at is not None or call.call_status in FINISHED_STATUSES
+
+
+def _numbers(call):
+    return sorted({'', call.caller_number or '', call.receiver_number or ''})
+
+
+def _set_percentiles(stat, sketch):
+    for name, q in QUANTILES:
+        setattr(stat, name, sketch.quantile(q))
+
+
+def _add_outcome(stat, sketch, reasons, call):
+    stat.finished += 1
+    if call.duration is not None:
+        sketch.add(call.duration)
+    if call.call_status in FAILED_STATUSES or call.failure_reason:
+        stat.failed += 1
+        reasons[call.failure_reason or call.call_status] += 1
+
+
+# The (day, number) rows of one shard a call counts towards, locked in a
+# fixed order so concurrent updates cannot deadlock. Missing rows are created
+# first; a concurrent insert of the same row is ignored and then read back.
+def _locked_stats(day, numbers, shard):
+    query = CallStat.query.filter(
+        CallStat.day == day, CallStat.number.in_(numbers), CallStat.shard == shard
+    ).order_by(CallStat.number)
+    stats = query.with_for_update().all()
+    missing = set(numbers) - {stat.number for stat in stats}
+    if missing:
+        connection = db.session.connection()
+        table = CallStat.__table__
+        if connection.dialect.name == 'mysql':
+            stmt = table.insert().prefix_with('IGNORE')
+        elif connection.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+            stmt = insert(table).on_conflict_do_nothing()
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+            stmt = insert(table).on_conflict_do_nothing()
+        connection.execute(stmt, [{
+            'day': day, 'number': number, 'shard': shard, 'calls': 0, 'finished': 0, 'failed': 0,
+            'failure_reasons': '{}', 'duration_sketch': '{}', 'updated_at': datetime.utcnow()
+        } for number in sorted(missing)])
+        stats = query.with_for_update().populate_existing().all()
+    return stats
+
+
+# The day and numbers a call is counted under
+def counted_under(call):
+    return (call.initiated_at or datetime.utcnow()).date(), _numbers(call)
+
+
+# Each update goes to a random write shard, so calls sharing a day (every
+# call, for the totals row) or a number (the clinic's caller id) rarely wait
+# on the same row lock. Percentiles are left to compact(): those of one
+# shard mean nothing.
+def _update(call, key, count_call, count_outcome):
+    day, numbers = key
+    for stat in _locked_stats(day, numbers, _shard()):
+        if count_call:
+            stat.calls += 1
+        if count_outcome:
+            sketch = DurationSketch.from_json(stat.duration_sketch, _accuracy())
+            reasons = Counter(json.loads(stat.failure_reasons or '{}'))
+            _add_outcome(stat, sketch, reasons, call)
+            stat.duration_sketch = sketch.to_json()
+            stat.failure_reasons = json.dumps(reasons, separators=(',', ':'))
+
+
+# Called by the voice call controller in the same transaction as the write.
+# A call counts once when created and its outcome (duration, failure reason)
+# once when it first becomes finished, under the day and numbers it was
+# counted under when created (`key`, from counted_under() before an edit);
+# later edits are left to `rebuild`.
+def record_call_created(call):
+    _update(call, counted_under(call), True, is_finished(call))
+
+
+def record_call_finished(call, key=None):
+    _update(call, key or counted_under(call), False, True)
+
+
+def _report(stats):
+    calls = sum(stat.calls for stat in stats)
+    finished = sum(stat.finished for stat in stats)
+    failed = sum(stat.failed for stat in stats)
+    reasons = Counter()
+    for stat in stats:
+        reasons.update(json.loads(stat.failure_reasons or '{}'))
+    return {
+        'calls': calls,
+        'finished': finished,
+        'failed': failed,
+        'failure_rate': round(failed / finished, 4) if finished else None,
+        'failure_reasons': dict(reasons.most_common())
+    }
+
+
+# Analytics for one number ('' for all calls) over [start, end) days. A
+# compacted day with no writes since is a single shard 0 row with
+# precomputed percentiles; otherwise the sketches of every day and shard in
+# the range are merged.
+def call_analytics(start, end, number=''):
+    stats = CallStat.query.filter(
+        CallStat.number == number, CallStat.day >= start, CallStat.day < end
+    ).all()
+    if len(stats) == 1 and stats[0].shard == 0:
+        stat = stats[0]
+        percentiles = {name: getattr(stat, name) for name, _ in QUANTILES}
+        samples = DurationSketch.from_json(stat.duration_sketch, _accuracy()).count
+    else:
+        merged = DurationSketch(_accuracy())
+        for index, stat in enumerate(stats):
+            sketch = DurationSketch.from_json(stat.duration_sketch, _accuracy())
+            # Sketches written under an older accuracy setting only merge
+            # with each other (ValueError otherwise; rebuild to realign)
+            if index == 0:
+                merged = sketch
+            else:
+                merged.merge(sketch)
+        percentiles = {name: merged.quantile(q) for name, q in QUANTILES}
+        samples = merged.count
+
+    report = _report(stats)
+    report['duration'] = dict(percentiles, samples=samples)
+    return report
+
+
+# Fold the write shards of [start, end) days into each (day, number)'s
+# shard 0 row, one day per transaction, and store the merged percentiles
+# there. Run from cron (`flask compact-call-stats`); calls written meanwhile
+# land in new shard rows and are folded in next time. Rows are locked in
+# (number, shard) order, the order writers lock them in.
+def compact(start, end):
+    day = start
+    compacted = 0
+    while day < end:
+        try:
+            rows = CallStat.query.filter(CallStat.day == day) \
+                .order_by(CallStat.number, CallStat.shard).with_for_update().all()
+            by_number = {}
+            for row in rows:
+                by_number.setdefault(row.number, []).append(row)
+            for number, shards in by_number.items():
+                if len(shards) == 1 and shards[0].shard == 0:
+                    continue
+                summary = shards[0] if shards[0].shard == 0 else None
+                if summary is None:
+                    summary = CallStat(day=day, number=number, shard=0, calls=0, finished=0, failed=0)
+                    db.session.add(summary)
+                sketch = DurationSketch.from_json(summary.duration_sketch, _accuracy())
+                reasons = Counter(json.loads(summary.failure_reasons or '{}'))
+                for row in shards:
+                    if row is summary:
+                        continue
+                    summary.calls += row.calls
+                    summary.finished += row.finished
+                    summary.failed += row.failed
+                    sketch.merge(DurationSketch.from_json(row.duration_sketch, _accuracy()))
+                    reasons.update(json.loads(row.failure_reasons or '{}'))
+                    db.session.delete(row)
+                summary.duration_sketch = sketch.to_json()
+                summary.failure_reasons = json.dumps(reasons, separators=(',', ':'))
+                _set_percentiles(summary, sketch)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        compacted += 1 if rows else 0
+        day += timedelta(days=1)
+    return compacted
+
+
+# Recompute [start, end) days from voice_calls, one day per transaction, by
+# streaming that day's calls off a server-side cursor. Each (day, number)
+# becomes a single compacted shard 0 row.
+def rebuild(start, end, batch_size=1000):
+    table = VoiceCall.__table__
+    day = start
+    rebuilt = 0
+    while day < end:
+        day_start = datetime.combine(day, datetime.min.time())
+        stats = {}
+        try:
+            result = db.session.execute(
+                select(table)
+                .where(table.c.initiated_at >= day_start, table.c.initiated_at < day_start + timedelta(days=1))
+                .execution_options(yield_per=batch_size)
+            )
+            for call in result:
+                for number in _numbers(call):
+                    entry = stats.get(number)
+                    if entry is None:
+                        stat = CallStat(day=day, number=number, calls=0, finished=0, failed=0)
+                        entry = stats[number] = (stat, DurationSketch(_accuracy()), Counter())
+                    stat, sketch, reasons = entry
+                    stat.calls += 1
+                    if is_finished(call):
+                        _add_outcome(stat, sketch, reasons, call)
+
+            CallStat.query.filter_by(day=day).delete()
+            for stat, sketch, reasons in stats.values():
+                stat.duration_sketch = sketch.to_json()
+                stat.failure_reasons = json.dumps(reasons, separators=(',', ':'))
+                _set_percentiles(stat, sketch)
+                db.session.add(stat)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        rebuilt += 1 if stats else 0
+        day += timedelta(days=1)
+    return rebuilt
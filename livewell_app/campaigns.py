@@ -0,0 +1,96 @@
+from datetime import date
+
+from flask import current_app
+from sqlalchemy import select
+
+from livewell_app.extensions import db
+from livewell_app.jobs import enqueue_bulk_sms
+from livewell_app.models.phone import Phone
+from livewell_app.models.user import User
+
+RECIPIENT_SOURCES = ('users', 'phones')
+
+
+class CampaignError(ValueError):
+    pass
+
+
+def _parse_date(value, field):
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise CampaignError(f'{field} must be a date (YYYY-MM-DD)')
+
+
+# Phone numbers for a users/phones selector, streamed off the database
+def _query_numbers(source, role=None, dob_from=None, dob_to=None, batch_size=1000):
+    if source == 'users':
+        stmt = select(User.contact_number)
+    else:
+        stmt = select(Phone.phone_number).join(User, Phone.user_id == User.id)
+    if role:
+        stmt = stmt.where(User.role == role)
+    if dob_from:
+        stmt = stmt.where(User.date_of_birth >= dob_from)
+    if dob_to:
+        stmt = stmt.where(User.date_of_birth <= dob_to)
+    return db.session.execute(stmt.execution_options(yield_per=batch_size)).scalars()
+
+
+# Group recipients by message text so identical messages share provider calls.
+# `recipients` entries are phone numbers or {"phone_number", "message"} objects
+# overriding the campaign message for that recipient.
+def group_recipients(data):
+    message = data.get('message')
+    recipients = data.get('recipients')
+    source = data.get('source')
+
+    if recipients is None and source is None:
+        raise CampaignError('Either recipients or source is required')
+    if source is not None and source not in RECIPIENT_SOURCES:
+        raise CampaignError(f"source must be one of {', '.join(RECIPIENT_SOURCES)}")
+
+    groups = {}
+    seen = set()
+
+    def add(number, text):
+        if not number or number in seen:
+            return
+        if not text:
+            raise CampaignError(f'No message for recipient {number}')
+        seen.add(number)
+        groups.setdefault(text, []).append(number)
+
+    for entry in recipients or []:
+        if isinstance(entry, dict):
+            add(entry.get('phone_number'), entry.get('message') or message)
+        else:
+            add(entry, message)
+
+    if source is not None:
+        numbers = _query_numbers(
+            source,
+            role=data.get('role'),
+            dob_from=_parse_date(data.get('date_of_birth_from'), 'date_of_birth_from'),
+            dob_to=_parse_date(data.get('date_of_birth_to'), 'date_of_birth_to')
+        )
+        for number in numbers:
+            add(number, message)
+
+    return groups
+
+
+def _batches(groups, batch_size):
+    for text, numbers in groups.items():
+        for i in range(0, len(numbers), batch_size):
+            yield text, numbers[i:i + batch_size]
+
+
+# Queue one bulk SMS job per SMS_CAMPAIGN_BATCH_SIZE recipients in the
+# 'bulk' message class, so the worker paces the campaign at the class's rate
+# and keeps transactional messages ahead of it; the caller commits
+def queue_campaign(groups, created_by=None):
+    batch_size = current_app.config.get('SMS_CAMPAIGN_BATCH_SIZE', 100)
+    return enqueue_bulk_sms(_batches(groups, batch_size), created_by, 'bulk')
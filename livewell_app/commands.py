@@ -0,0 +1,203 @@
+import sys
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from livewell_app.archive import ARCHIVABLE_TABLES, COMPRESSIONS, archive_table, check_compression
+from livewell_app.extensions import db
+from livewell_app.export import EXPORT_FORMATS, EXPORTABLE_TABLES, generate_export, parse_time
+from livewell_app.jobs import Worker
+from livewell_app.filters import INDEXED_FILTERS, probe_queries
+from livewell_app.sms_rollups import sms_rollups
+from livewell_app import call_analytics
+
+
+# flask export-logs sms_logs --format csv --gzip --start 2024-10-01 --end 2024-10-02 -o sms.csv.gz
+@click.command('export-logs')
+@click.argument('table', type=click.Choice(sorted(EXPORTABLE_TABLES)))
+@click.option('--format', 'fmt', type=click.Choice(EXPORT_FORMATS), default='ndjson', show_default=True)
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output.')
+@click.option('--start', help='Only rows at or after this time (YYYY-MM-DD[ HH:MM:SS]).')
+@click.option('--end', help='Only rows before this time (YYYY-MM-DD[ HH:MM:SS]).')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows fetched per round trip.')
+@click.option('-o', '--output', type=click.Path(dir_okay=False, writable=True), help='Write to a file instead of stdout.')
+@with_appcontext
+def export_logs_command(table, fmt, compress, start, end, batch_size, output):
+    """Stream a log table as NDJSON or CSV."""
+    try:
+        chunks = generate_export(table, fmt, compress, parse_time(start), parse_time(end), batch_size)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+    stream = open(output, 'wb') if output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            stream.write(chunk)
+    finally:
+        if output:
+            stream.close()
+        else:
+            stream.flush()
+
+
+# Problems in the query plan of a filtered `statement`: full table or index
+# scans, and sorts the index order did not satisfy
+def plan_problems(statement):
+    connection = db.session.connection()
+    compiled = statement.compile(connection)
+    dialect = connection.dialect.name
+    if compiled.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+
+    problems = []
+    if dialect == 'sqlite':
+        for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params):
+            detail = row[-1]
+            if detail.startswith('SCAN') or 'TEMP B-TREE' in detail:
+                problems.append(detail)
+    elif dialect == 'mysql':
+        for row in connection.exec_driver_sql('EXPLAIN ' + str(compiled), params).mappings():
+            if row['type'] in ('ALL', 'index') or row['key'] is None or 'filesort' in (row['Extra'] or ''):
+                problems.append(f"{row['table']}: type={row['type']} key={row['key']} extra={row['Extra']}")
+    else:
+        raise click.ClickException(f'check-indexes does not support {dialect}')
+    return problems
+
+
+# flask check-indexes
+@click.command('check-indexes')
+@with_appcontext
+def check_indexes_command():
+    """EXPLAIN every list-endpoint filter and fail if one scans or sorts.
+
+    Run against a database holding representative data: on near-empty
+    tables the optimizer may prefer a scan.
+    """
+    failed = 0
+    for name in INDEXED_FILTERS:
+        for label, query in probe_queries(name):
+            problems = plan_problems(query.statement)
+            if problems:
+                failed += 1
+                click.echo(f'FAIL {label}: ' + '; '.join(problems))
+            else:
+                click.echo(f'ok   {label}')
+    db.session.rollback()
+    if failed:
+        raise click.ClickException(f'{failed} filter(s) are not served by an index')
+
+
+# flask rebuild-sms-rollups --start 2024-10-01 --end 2024-10-08
+@click.command('rebuild-sms-rollups')
+@click.option('--start', required=True, help='First hour to rebuild (YYYY-MM-DD[ HH:MM:SS]).')
+@click.option('--end', required=True, help='Rebuild up to this time, exclusive (YYYY-MM-DD[ HH:MM:SS]).')
+@with_appcontext
+def rebuild_sms_rollups_command(start, end):
+    """Recompute the hourly SMS rollups for a range from sms_logs."""
+    try:
+        start, end = parse_time(start), parse_time(end)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    if end <= start:
+        raise click.BadParameter('--end must be after --start')
+    hours = sms_rollups.rebuild(start, end)
+    click.echo(f'Rebuilt {hours} hour(s) with messages')
+
+
+# flask rebuild-call-analytics --start 2024-10-01 --end 2024-10-08
+@click.command('rebuild-call-analytics')
+@click.option('--start', required=True, help='First day to rebuild (YYYY-MM-DD).')
+@click.option('--end', required=True, help='Rebuild up to this day, exclusive (YYYY-MM-DD).')
+@with_appcontext
+def rebuild_call_analytics_command(start, end):
+    """Recompute the daily voice call analytics for a range from voice_calls."""
+    try:
+        start, end = parse_time(start).date(), parse_time(end).date()
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    if end <= start:
+        raise click.BadParameter('--end must be after --start')
+    days = call_analytics.rebuild(start, end)
+    click.echo(f'Rebuilt {days} day(s) with calls')
+
+
+# flask compact-call-stats --days 2
+@click.command('compact-call-stats')
+@click.option('--days', type=click.IntRange(min=1), default=2, show_default=True,
+              help='Days to compact, ending with today (UTC).')
+@with_appcontext
+def compact_call_stats_command(days):
+    """Fold the voice call analytics write shards into one row per day and number."""
+    end = datetime.utcnow().date() + timedelta(days=1)
+    compacted = call_analytics.compact(end - timedelta(days=days), end)
+    click.echo(f'Compacted {compacted} day(s) with calls')
+
+
+# flask archive-logs sms_logs voice_calls --older-than 180 --max-batches 50
+@click.command('archive-logs')
+@click.argument('tables', nargs=-1, type=click.Choice(sorted(ARCHIVABLE_TABLES)))
+@click.option('--older-than', type=click.IntRange(min=1), help='Age in days; defaults to ARCHIVE_RETENTION_DAYS per table.')
+@click.option('--batch-size', type=click.IntRange(min=1), help='Rows moved per transaction (ARCHIVE_BATCH_SIZE).')
+@click.option('--max-batches', type=click.IntRange(min=1), help='Stop each table after this many batches.')
+@click.option('--compression', type=click.Choice(sorted(COMPRESSIONS)), help='Archive compression (ARCHIVE_COMPRESSION).')
+@with_appcontext
+def archive_logs_command(tables, older_than, batch_size, max_batches, compression):
+    """Move old log rows into compressed archive files."""
+    config = current_app.config
+    compression = compression or config.get('ARCHIVE_COMPRESSION', 'gzip')
+    try:
+        check_compression(compression)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    retention = config.get('ARCHIVE_RETENTION_DAYS', {})
+    for table in tables or sorted(ARCHIVABLE_TABLES):
+        days = older_than or retention.get(table)
+        if not days:
+            click.echo(f'{table}: no retention configured, skipped')
+            continue
+        moved = archive_table(
+            table,
+            datetime.utcnow() - timedelta(days=days),
+            batch_size or config.get('ARCHIVE_BATCH_SIZE', 1000),
+            compression,
+            config.get('ARCHIVE_BLOCK_ROWS', 256),
+            max_batches
+        )
+        click.echo(f'{table}: archived {moved} row(s) older than {days} day(s)')
+
+
+# flask run-worker --concurrency 16
+@click.command('run-worker')
+@click.option('--concurrency', type=click.IntRange(min=1), help='Jobs in flight at once (JOB_WORKER_CONCURRENCY).')
+@click.option('--poll-interval', type=float, help='Seconds between polls of an empty queue (JOB_POLL_INTERVAL).')
+@click.option('--once', is_flag=True, help='Exit once no due jobs are left.')
+@with_appcontext
+def run_worker_command(concurrency, poll_interval, once):
+    """Send queued SMS, voice call and USSD jobs."""
+    config = current_app.config
+    worker = Worker(
+        current_app._get_current_object(),
+        concurrency or config.get('JOB_WORKER_CONCURRENCY', 8),
+        poll_interval or config.get('JOB_POLL_INTERVAL', 1.0)
+    )
+    click.echo(f'Worker {worker.worker_id} running {worker.concurrency} job(s) at a time '
+               f'({worker.scheduler.mode} scheduling of {", ".join(worker.scheduler.classes)})')
+    processed = worker.run(once)
+    if not processed:
+        click.echo('Processed nothing')
+    for message_class, counts in processed.items():
+        click.echo(f'{message_class}: ' + ', '.join(f'{count} {status}' for status, count in sorted(counts.items())))
+
+
+def register_commands(app):
+    app.cli.add_command(export_logs_command)
+    app.cli.add_command(check_indexes_command)
+    app.cli.add_command(rebuild_sms_rollups_command)
+    app.cli.add_command(rebuild_call_analytics_command)
+    app.cli.add_command(compact_call_stats_command)
+    app.cli.add_command(archive_logs_command)
+    app.cli.add_command(run_worker_command)
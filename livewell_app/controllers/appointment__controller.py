@@ -1,8 +1,17 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from livewell_app import db
 from livewell_app.models.appointment import Appointment
+from livewell_app.models.doctors import Doctor
+from livewell_app.models.user import User
+from livewell_app.pagination import paginate, PaginationError
+from livewell_app.serializers import appointment_serializer, json_response, format_datetime, FieldsError
+from livewell_app.availability import (
+    open_slots, find_conflict, slot_minutes_at, parse_datetime, AvailabilityError, CANCELLED_STATUSES
+)
+from livewell_app.idempotency import idempotent
 from functools import wraps
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from datetime import date, datetime, timedelta
 
 appointment_bp = Blueprint('appointment', __name__, url_prefix='/api/v1/appointments')
 
@@ -17,63 +26,142 @@ def admin_required(fn):
         return fn(*args, **kwargs)
     return wrapper
 
+# The booking's doctor, from doctor_id or a doctor_name that matches exactly
+# one doctor. The row is locked so concurrent bookings for the same doctor
+# queue up behind each other before the conflict check.
+def _resolve_doctor(doctor_id=None, doctor_name=None):
+    if doctor_id is None and doctor_name:
+        ids = [row.id for row in Doctor.query.with_entities(Doctor.id).filter_by(name=doctor_name).limit(2)]
+        if len(ids) != 1:
+            raise AvailabilityError('doctor_name must match exactly one doctor; pass doctor_id instead')
+        doctor_id = ids[0]
+    if doctor_id is None:
+        raise AvailabilityError('doctor_id or doctor_name is required')
+    doctor = Doctor.query.filter_by(id=doctor_id).with_for_update().first()
+    if doctor is None:
+        raise AvailabilityError('Doctor not found')
+    return doctor
+
+# (patient_id, patient_name) from patient_id, or from patient_name alone; the
+# id is left empty when the name does not match exactly one user
+def _resolve_patient(patient_id=None, patient_name=None):
+    if patient_id is not None:
+        patient = db.session.get(User, patient_id)
+        if patient is None:
+            raise AvailabilityError('Patient not found')
+        return patient.id, patient.name
+    if not patient_name:
+        raise AvailabilityError('patient_id or patient_name is required')
+    ids = [row.id for row in User.query.with_entities(User.id).filter_by(name=patient_name).limit(2)]
+    return (ids[0] if len(ids) == 1 else None), patient_name
+
+# 409 response when the doctor already has an appointment overlapping this slot
+def _check_conflict(doctor, appointment_time, slot_minutes, exclude_id=None):
+    conflict = find_conflict(doctor.id, appointment_time, slot_minutes, exclude_id=exclude_id)
+    if conflict is None:
+        return None
+    return jsonify({
+        'error': 'The doctor already has an appointment at this time',
+        'conflicting_appointment_id': conflict.id,
+        'conflicting_appointment_time': conflict.appointment_time.strftime('%Y-%m-%d %H:%M:%S')
+    }), 409
+
 # Create a new appointment
 @appointment_bp.route('/create', methods=['POST'])
+@idempotent
 def create_appointment():
     try:
         data = request.get_json()
+        appointment_time = parse_datetime(data.get('appointment_time'))
+        status = data.get('status', 'scheduled')
+        doctor = _resolve_doctor(data.get('doctor_id'), data.get('doctor_name'))
+        patient_id, patient_name = _resolve_patient(data.get('patient_id'), data.get('patient_name'))
+        slot_minutes = slot_minutes_at(doctor.id, appointment_time)
+
+        # Reject bookings that overlap an existing slot for this doctor
+        if status not in CANCELLED_STATUSES:
+            conflict_response = _check_conflict(doctor, appointment_time, slot_minutes)
+            if conflict_response:
+                db.session.rollback()
+                return conflict_response
+
         new_appointment = Appointment(
-            patient_name=data.get('patient_name'),  # Use patient_name instead of patient_id
-            doctor_name=data.get('doctor_name'),
-            appointment_time=data.get('appointment_time'),
-            status=data.get('status', 'scheduled'),
-            notes=data.get('notes')
+            patient_name=patient_name,
+            doctor_name=doctor.name,
+            appointment_time=appointment_time,
+            status=status,
+            notes=data.get('notes'),
+            doctor_id=doctor.id,
+            patient_id=patient_id,
+            duration_minutes=slot_minutes
         )
         db.session.add(new_appointment)
         db.session.commit()
-        return jsonify({'message': 'Appointment created successfully', 'appointment': {
-            'id': new_appointment.id,
-            'patient_name': new_appointment.patient_name,
-            'doctor_name': new_appointment.doctor_name,
-            'appointment_time': new_appointment.appointment_time.strftime('%Y-%m-%d %H:%M:%S'),
-            'status': new_appointment.status,
-            'notes': new_appointment.notes
-        }}), 201
+        return jsonify({'message': 'Appointment created successfully', 'appointment': appointment_serializer.dump(new_appointment)}), 201
+    except AvailabilityError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 # Get all appointments
+# Optional filters: doctor_id, patient_id (served by the (key, appointment_time)
+# indexes) and specialty, which joins doctors on doctor_id
 @appointment_bp.route('/', methods=['GET'])
 @admin_required
 def get_all_appointments():
-    appointments = Appointment.query.all()
-    output = []
-    for appointment in appointments:
-        appointment_data = {
-            'id': appointment.id,
-            'patient_name': appointment.patient_name,
-            'doctor_name': appointment.doctor_name,
-            'appointment_time': appointment.appointment_time.strftime('%Y-%m-%d %H:%M:%S'),
-            'status': appointment.status,
-            'notes': appointment.notes
-        }
-        output.append(appointment_data)
-    return jsonify({'appointments': output})
+    query = Appointment.query
+    doctor_id = request.args.get('doctor_id', type=int)
+    patient_id = request.args.get('patient_id', type=int)
+    specialty = request.args.get('specialty')
+    if doctor_id is not None:
+        query = query.filter(Appointment.doctor_id == doctor_id)
+    if patient_id is not None:
+        query = query.filter(Appointment.patient_id == patient_id)
+    if specialty:
+        query = query.join(Doctor, Appointment.doctor_id == Doctor.id).filter(Doctor.specialty == specialty)
+    try:
+        fields = appointment_serializer.requested_fields()
+        page = paginate(appointment_serializer.project(query, fields), Appointment.id, Appointment.appointment_time)
+    except (PaginationError, FieldsError) as e:
+        return jsonify({'error': str(e)}), 400
+    return json_response({'appointments': appointment_serializer.dump_rows(page.items, fields), 'next_cursor': page.next_cursor})
+
+# Get open appointment slots for a doctor over a date range (open access)
+# start defaults to today (UTC, as slot times are) and end (exclusive) to a week later
+@appointment_bp.route('/availability', methods=['GET'])
+def get_availability():
+    doctor_id = request.args.get('doctor_id', type=int)
+    if not doctor_id:
+        return jsonify({'error': 'doctor_id is required'}), 400
+    try:
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else datetime.utcnow().date()
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else start + timedelta(days=7)
+    except ValueError:
+        return jsonify({'error': 'start and end must be dates (YYYY-MM-DD)'}), 400
+
+    max_days = current_app.config.get('AVAILABILITY_MAX_DAYS', 31)
+    if end <= start or (end - start).days > max_days:
+        return jsonify({'error': f'end must be after start and at most {max_days} days later'}), 400
+
+    doctor = Doctor.query.get_or_404(doctor_id)
+    slots = open_slots(doctor, start, end)
+    return jsonify({
+        'doctor_id': doctor.id,
+        'doctor_name': doctor.name,
+        'slots': [{
+            'start': format_datetime(slot['start']),
+            'end': format_datetime(slot['end'])
+        } for slot in slots]
+    })
 
 # Get a specific appointment
 @appointment_bp.route('/<int:id>', methods=['GET'])
 @admin_required
 def get_appointment(id):
     appointment = Appointment.query.get_or_404(id)
-    appointment_data = {
-        'id': appointment.id,
-        'patient_name': appointment.patient_name,
-        'doctor_name': appointment.doctor_name,
-        'appointment_time': appointment.appointment_time.strftime('%Y-%m-%d %H:%M:%S'),
-        'status': appointment.status,
-        'notes': appointment.notes
-    }
+    appointment_data = appointment_serializer.dump(appointment)
     return jsonify(appointment_data)
 
 # Update an appointment
@@ -84,21 +172,47 @@ def update_appointment(id):
     data = request.get_json()
 
     try:
-        appointment.patient_name = data.get('patient_name', appointment.patient_name)  # Update patient_name
-        appointment.doctor_name = data.get('doctor_name', appointment.doctor_name)
-        appointment.appointment_time = data.get('appointment_time', appointment.appointment_time)
-        appointment.status = data.get('status', appointment.status)
+        # The doctor is only resolved when the body changes it, so rows the
+        # backfill left without a doctor_id can still be cancelled or edited
+        doctor_changed = data.get('doctor_id') is not None or \
+            data.get('doctor_name', appointment.doctor_name) != appointment.doctor_name
+        doctor = _resolve_doctor(data.get('doctor_id'), data.get('doctor_name')) if doctor_changed else None
+        doctor_id = doctor.id if doctor else appointment.doctor_id
+        if data.get('patient_id') is not None or data.get('patient_name', appointment.patient_name) != appointment.patient_name:
+            patient_id, patient_name = _resolve_patient(data.get('patient_id'), data.get('patient_name'))
+        else:
+            patient_id, patient_name = appointment.patient_id, appointment.patient_name
+
+        appointment_time = parse_datetime(data.get('appointment_time', appointment.appointment_time))
+        status = data.get('status', appointment.status)
+        moved = doctor_id != appointment.doctor_id or appointment_time != appointment.appointment_time
+        reactivated = appointment.status in CANCELLED_STATUSES and status not in CANCELLED_STATUSES
+        # A moved appointment takes the slot length at its new time
+        slot_minutes = slot_minutes_at(doctor_id, appointment_time) if moved else appointment.duration_minutes
+        # Without a doctor_id there is no schedule to check against
+        if (moved or reactivated) and status not in CANCELLED_STATUSES and doctor_id is not None:
+            if doctor is None:
+                doctor = _resolve_doctor(doctor_id)
+            conflict_response = _check_conflict(doctor, appointment_time, slot_minutes, exclude_id=appointment.id)
+            if conflict_response:
+                db.session.rollback()
+                return conflict_response
+
+        appointment.patient_id = patient_id
+        appointment.patient_name = patient_name
+        if doctor is not None:
+            appointment.doctor_id = doctor.id
+            appointment.doctor_name = doctor.name
+        appointment.appointment_time = appointment_time
+        appointment.duration_minutes = slot_minutes
+        appointment.status = status
         appointment.notes = data.get('notes', appointment.notes)
 
         db.session.commit()
-        return jsonify({'message': 'Appointment updated successfully', 'appointment': {
-            'id': appointment.id,
-            'patient_name': appointment.patient_name,
-            'doctor_name': appointment.doctor_name,
-            'appointment_time': appointment.appointment_time.strftime('%Y-%m-%d %H:%M:%S'),
-            'status': appointment.status,
-            'notes': appointment.notes
-        }})
+        return jsonify({'message': 'Appointment updated successfully', 'appointment': appointment_serializer.dump(appointment)})
+    except AvailabilityError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
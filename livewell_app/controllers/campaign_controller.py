@@ -0,0 +1,43 @@
+from flask import Blueprint, request, jsonify
+from livewell_app import db
+from livewell_app.campaigns import group_recipients, queue_campaign, CampaignError
+from livewell_app.idempotency import idempotent
+from functools import wraps
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+campaign_bp = Blueprint('campaign', __name__, url_prefix='/api/v1/campaigns')
+
+# Admin required decorator
+def admin_required(fn):
+    @wraps(fn)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        user_info = get_jwt_identity()
+        if user_info['role'] != 'admin':
+            return jsonify({'error': 'Admin access required'}), 403
+        return fn(*args, **kwargs)
+    return wrapper
+
+# Broadcast an SMS campaign (Admin only); queued as bulk jobs
+# Body: message plus either an explicit recipients list or a source
+# ('users' or 'phones') filtered by role and date_of_birth_from/date_of_birth_to
+@campaign_bp.route('/sms', methods=['POST'])
+@admin_required
+@idempotent
+def send_sms_campaign():
+    data = request.get_json()
+    if not data:
+        return jsonify({'error': 'Request body is required'}), 400
+
+    try:
+        groups = group_recipients(data)
+    except CampaignError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        summary = queue_campaign(groups, created_by=get_jwt_identity().get('id'))
+        db.session.commit()
+        return jsonify({'message': 'SMS campaign queued', 'campaign': summary}), 202
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to queue SMS campaign', 'details': str(e)}), 500
@@ -1,47 +1,90 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from livewell_app import db
 from livewell_app.models.doctors import Doctor
+from livewell_app.models.working_hours import WorkingHours
+from livewell_app.models.appointment import Appointment
+from livewell_app.pagination import paginate, get_limit, encode_cursor, decode_cursor, PaginationError
+from livewell_app.doctor_cache import doctor_directory_cache
+from livewell_app.db_routing import replica_router
+from livewell_app.serializers import doctor_serializer, encode_json, FieldsError
+from livewell_app.doctor_search import doctor_search_index
+from livewell_app.idempotency import idempotent
+import bisect
+from datetime import time
 from flask_jwt_extended import jwt_required
 
 doctor_bp = Blueprint('doctor_bp', __name__, url_prefix='/api/v1/doctors')
 
 # Get all doctors (open access)
+# Pages are served from the directory cache with an ETag for conditional GETs
 @doctor_bp.route('/doctors', methods=['GET'])
 def get_all_doctors():
     try:
-        doctors = Doctor.query.all()
-        output = []
-
-        for doctor in doctors:
-            doctor_data = {
-                'id': doctor.id,
-                'name': doctor.name,
-                'email': doctor.email,
-                'contact_number': doctor.contact_number,
-                'specialty': doctor.specialty,
-                'bio_data': doctor.bio_data
-            }
-            output.append(doctor_data)
-
-        return jsonify({'doctors': output}), 200
-
+        cache_key = (request.args.get('after'), request.args.get('limit'), request.args.get('fields'))
+        entry = doctor_directory_cache.get(cache_key)
+        if entry is not None:
+            return doctor_directory_cache.respond(entry)
+
+        version = doctor_directory_cache.version
+        if doctor_directory_cache.needs_primary():
+            replica_router.use_primary()
+        fields = doctor_serializer.requested_fields()
+        page = paginate(doctor_serializer.project(Doctor.query, fields), Doctor.id)
+        body = encode_json({'doctors': doctor_serializer.dump_rows(page.items, fields), 'next_cursor': page.next_cursor})
+        entry = doctor_directory_cache.put(cache_key, body, version)
+        return doctor_directory_cache.respond(entry)
+
+    except (PaginationError, FieldsError) as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print("Error fetching doctors:", str(e))
         return jsonify({'error': 'An error occurred while fetching doctors', 'details': str(e)}), 500
 
+# Search doctors by specialty, name prefix and bio keywords (open access)
+# Results are ranked by score and paginated with a (score, id) cursor
+@doctor_bp.route('/search', methods=['GET'])
+def search_doctors():
+    specialty = request.args.get('specialty')
+    name = request.args.get('name')
+    q = request.args.get('q')
+    if not (specialty or name or q):
+        return jsonify({'error': 'Provide at least one of specialty, name or q'}), 400
+
+    try:
+        limit = get_limit()
+        ranked = doctor_search_index.search(specialty=specialty, name=name, q=q)
+
+        start = 0
+        after = request.args.get('after')
+        if after:
+            try:
+                score, last_id = decode_cursor(after)
+                position = (-int(score), int(last_id))
+            except (TypeError, ValueError):
+                raise PaginationError('Invalid cursor')
+            start = bisect.bisect_right(ranked, position, key=lambda item: (-item[0], item[1]))
+
+        page = ranked[start:start + limit]
+        output = []
+        for score, doctor_id in page:
+            document = doctor_search_index.document(doctor_id)
+            if document is not None:
+                output.append(dict(document, score=score))
+        next_cursor = encode_cursor(*page[-1]) if page and start + limit < len(ranked) else None
+        return jsonify({'doctors': output, 'next_cursor': next_cursor}), 200
+
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f'Error searching doctors: {e}')
+        return jsonify({'error': 'An error occurred while searching doctors', 'details': str(e)}), 500
+
 # Get a single doctor by ID (open access)
 @doctor_bp.route('/doctors/<int:doctor_id>', methods=['GET'])
 def get_doctor(doctor_id):
     try:
         doctor = Doctor.query.get_or_404(doctor_id)
-        doctor_data = {
-            'id': doctor.id,
-            'name': doctor.name,
-            'email': doctor.email,
-            'contact_number': doctor.contact_number,
-            'specialty': doctor.specialty,
-            'bio_data': doctor.bio_data
-        }
+        doctor_data = doctor_serializer.dump(doctor)
         return jsonify(doctor_data), 200
 
     except Exception as e:
@@ -50,6 +93,7 @@ def get_doctor(doctor_id):
 
 # Create a new doctor (open access)
 @doctor_bp.route('/doctors', methods=['POST'])
+@idempotent
 def create_doctor():
     data = request.get_json()
     if not data or not data.get('name') or not data.get('email'):
@@ -65,17 +109,12 @@ def create_doctor():
         )
         db.session.add(new_doctor)
         db.session.commit()
+        doctor_directory_cache.bump()
+        doctor_search_index.update(new_doctor)
 
         return jsonify({
             'message': 'Doctor created successfully',
-            'doctor': {
-                'id': new_doctor.id,
-                'name': new_doctor.name,
-                'email': new_doctor.email,
-                'contact_number': new_doctor.contact_number,
-                'specialty': new_doctor.specialty,
-                'bio_data': new_doctor.bio_data
-            }
+            'doctor': doctor_serializer.dump(new_doctor)
         }), 201
 
     except Exception as e:
@@ -89,8 +128,12 @@ def update_doctor(doctor_id):
     doctor = Doctor.query.get_or_404(doctor_id)
     data = request.get_json()
 
-    if data.get('name'):
+    if data.get('name') and data['name'] != doctor.name:
         doctor.name = data['name']
+        # Keep the display name on the doctor's appointments in step
+        Appointment.query.filter_by(doctor_id=doctor_id).update(
+            {'doctor_name': data['name']}, synchronize_session=False
+        )
     if data.get('email'):
         doctor.email = data['email']
     if data.get('contact_number'):
@@ -102,6 +145,8 @@ def update_doctor(doctor_id):
 
     try:
         db.session.commit()
+        doctor_directory_cache.bump()
+        doctor_search_index.update(doctor)
         return jsonify({'message': 'Doctor updated successfully'}), 200
     except Exception as e:
         db.session.rollback()  # Rollback the session in case of error
@@ -114,10 +159,66 @@ def delete_doctor(doctor_id):
     doctor = Doctor.query.get_or_404(doctor_id)
 
     try:
+        # Past appointments keep the doctor's name but lose the key
+        Appointment.query.filter_by(doctor_id=doctor_id).update({'doctor_id': None}, synchronize_session=False)
+        WorkingHours.query.filter_by(doctor_id=doctor_id).delete()
         db.session.delete(doctor)
         db.session.commit()
+        doctor_directory_cache.bump()
+        doctor_search_index.remove(doctor_id)
         return jsonify({'message': 'Doctor deleted successfully'}), 200
     except Exception as e:
         db.session.rollback()  # Rollback the session in case of error
         print("Error deleting doctor:", str(e))
         return jsonify({'error': 'An error occurred while deleting the doctor', 'details': str(e)}), 500
+
+
+def _working_hours_data(hours):
+    return {
+        'id': hours.id,
+        'weekday': hours.weekday,
+        'start_time': hours.start_time.strftime('%H:%M'),
+        'end_time': hours.end_time.strftime('%H:%M'),
+        'slot_minutes': hours.slot_minutes
+    }
+
+# Get a doctor's weekly working hours (open access)
+@doctor_bp.route('/doctors/<int:doctor_id>/working-hours', methods=['GET'])
+def get_working_hours(doctor_id):
+    Doctor.query.get_or_404(doctor_id)
+    hours = WorkingHours.query.filter_by(doctor_id=doctor_id).order_by(WorkingHours.weekday, WorkingHours.start_time)
+    return jsonify({'doctor_id': doctor_id, 'working_hours': [_working_hours_data(h) for h in hours]}), 200
+
+# Replace a doctor's weekly working hours (open access)
+# Body: {"working_hours": [{"weekday": 0, "start_time": "09:00", "end_time": "17:00", "slot_minutes": 30}]}
+@doctor_bp.route('/doctors/<int:doctor_id>/working-hours', methods=['PUT'])
+def set_working_hours(doctor_id):
+    Doctor.query.get_or_404(doctor_id)
+    data = request.get_json()
+    if not data or not isinstance(data.get('working_hours'), list):
+        return jsonify({'error': 'working_hours must be a list'}), 400
+
+    templates = []
+    for entry in data['working_hours']:
+        try:
+            weekday = int(entry['weekday'])
+            start_time = time.fromisoformat(entry['start_time'])
+            end_time = time.fromisoformat(entry['end_time'])
+            slot_minutes = int(entry.get('slot_minutes', current_app.config.get('APPOINTMENT_SLOT_MINUTES', 30)))
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'Each entry needs weekday (0-6), start_time and end_time (HH:MM)'}), 400
+        max_slot = current_app.config.get('APPOINTMENT_MAX_SLOT_MINUTES', 480)
+        if not 0 <= weekday <= 6 or start_time >= end_time or not 1 <= slot_minutes <= max_slot:
+            return jsonify({'error': 'Invalid working hours entry', 'entry': entry}), 400
+        templates.append(WorkingHours(doctor_id, weekday, start_time, end_time, slot_minutes))
+
+    try:
+        WorkingHours.query.filter_by(doctor_id=doctor_id).delete()
+        db.session.add_all(templates)
+        db.session.commit()
+        return jsonify({'message': 'Working hours updated successfully',
+                        'working_hours': [_working_hours_data(h) for h in templates]}), 200
+    except Exception as e:
+        db.session.rollback()  # Rollback the session in case of error
+        current_app.logger.error(f'Error updating working hours: {e}')
+        return jsonify({'error': 'An error occurred while updating working hours', 'details': str(e)}), 500
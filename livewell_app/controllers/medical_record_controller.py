@@ -1,6 +1,10 @@
 from flask import Blueprint, request, jsonify
 from livewell_app import db
 from livewell_app.models.medical_record import MedicalRecord
+from livewell_app.pagination import paginate, PaginationError
+from livewell_app.serializers import medical_record_serializer, json_response, FieldsError
+from livewell_app.filters import apply_filters, FilterError
+from livewell_app.idempotency import idempotent
 from functools import wraps
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
@@ -19,6 +23,7 @@ def admin_required(fn):
 
 # Create a new medical record (public access)
 @medical_record_bp.route('/create', methods=['POST'])
+@idempotent
 def create_medical_record():
     try:
         data = request.get_json()
@@ -31,49 +36,29 @@ def create_medical_record():
         )
         db.session.add(new_record)
         db.session.commit()
-        return jsonify({'message': 'Medical record created successfully', 'record': {
-            'id': new_record.id,
-            'patient_name': new_record.patient_name,
-            'doctor_name': new_record.doctor_name,
-            'diagnosis': new_record.diagnosis,
-            'treatment': new_record.treatment,
-            'record_date': new_record.record_date.strftime('%Y-%m-%d %H:%M:%S')
-        }}), 201
+        return jsonify({'message': 'Medical record created successfully', 'record': medical_record_serializer.dump(new_record)}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 # Get all medical records 
+# Filters: patient_id, plus since/until (see livewell_app.filters)
 @medical_record_bp.route('/', methods=['GET'])
 @admin_required
 def get_all_medical_records():
-    records = MedicalRecord.query.all()
-    output = []
-    for record in records:
-        record_data = {
-            'id': record.id,
-            'patient_name': record.patient_name,
-            'doctor_name': record.doctor_name,
-            'diagnosis': record.diagnosis,
-            'treatment': record.treatment,
-            'record_date': record.record_date.strftime('%Y-%m-%d %H:%M:%S')
-        }
-        output.append(record_data)
-    return jsonify({'records': output})
+    try:
+        fields = medical_record_serializer.requested_fields()
+        page = paginate(medical_record_serializer.project(apply_filters(MedicalRecord.query, 'medical_records'), fields), MedicalRecord.id, MedicalRecord.recorded_at)
+    except (PaginationError, FilterError, FieldsError) as e:
+        return jsonify({'error': str(e)}), 400
+    return json_response({'records': medical_record_serializer.dump_rows(page.items, fields), 'next_cursor': page.next_cursor})
 
 # Get a specific medical record 
 @medical_record_bp.route('/<int:id>', methods=['GET'])
 @admin_required
 def get_medical_record(id):
     record = MedicalRecord.query.get_or_404(id)
-    record_data = {
-        'id': record.id,
-        'patient_name': record.patient_name,
-        'doctor_name': record.doctor_name,
-        'diagnosis': record.diagnosis,
-        'treatment': record.treatment,
-        'record_date': record.record_date.strftime('%Y-%m-%d %H:%M:%S')
-    }
+    record_data = medical_record_serializer.dump(record)
     return jsonify(record_data)
 
 # Update a medical record 
@@ -91,14 +76,7 @@ def update_medical_record(id):
         record.record_date = data.get('record_date', record.record_date)
 
         db.session.commit()
-        return jsonify({'message': 'Medical record updated successfully', 'record': {
-            'id': record.id,
-            'patient_name': record.patient_name,
-            'doctor_name': record.doctor_name,
-            'diagnosis': record.diagnosis,
-            'treatment': record.treatment,
-            'record_date': record.record_date.strftime('%Y-%m-%d %H:%M:%S')
-        }})
+        return jsonify({'message': 'Medical record updated successfully', 'record': medical_record_serializer.dump(record)})
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
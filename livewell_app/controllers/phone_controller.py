@@ -1,6 +1,10 @@
 from flask import Blueprint, request, jsonify
 from livewell_app import db
 from livewell_app.models.phone import Phone
+from livewell_app.pagination import paginate, PaginationError
+from livewell_app.serializers import phone_serializer, json_response, FieldsError
+from livewell_app.filters import apply_filters, FilterError
+from livewell_app.idempotency import idempotent
 from functools import wraps
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
@@ -19,6 +23,7 @@ def admin_required(fn):
 
 # Create a new phone entry (public access)
 @phone_bp.route('/create', methods=['POST'])
+@idempotent
 def create_phone():
     try:
         data = request.get_json()
@@ -28,40 +33,29 @@ def create_phone():
         )
         db.session.add(new_phone)
         db.session.commit()
-        return jsonify({'message': 'Phone entry created successfully', 'phone': {
-            'id': new_phone.id,
-            'patient_name': new_phone.patient_name,
-            'phone_number': new_phone.phone_number
-        }}), 201
+        return jsonify({'message': 'Phone entry created successfully', 'phone': phone_serializer.dump(new_phone)}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 # Get all phone entries 
+# Filters: user_id, plus since/until (see livewell_app.filters)
 @phone_bp.route('/', methods=['GET'])
 @admin_required
 def get_all_phones():
-    phones = Phone.query.all()
-    output = []
-    for phone in phones:
-        phone_data = {
-            'id': phone.id,
-            'patient_name': phone.patient_name,
-            'phone_number': phone.phone_number
-        }
-        output.append(phone_data)
-    return jsonify({'phones': output})
+    try:
+        fields = phone_serializer.requested_fields()
+        page = paginate(phone_serializer.project(apply_filters(Phone.query, 'phones'), fields), Phone.id, Phone.created_at)
+    except (PaginationError, FilterError, FieldsError) as e:
+        return jsonify({'error': str(e)}), 400
+    return json_response({'phones': phone_serializer.dump_rows(page.items, fields), 'next_cursor': page.next_cursor})
 
 # Get a specific phone entry 
 @phone_bp.route('/<int:id>', methods=['GET'])
 @admin_required
 def get_phone(id):
     phone = Phone.query.get_or_404(id)
-    phone_data = {
-        'id': phone.id,
-        'patient_name': phone.patient_name,
-        'phone_number': phone.phone_number
-    }
+    phone_data = phone_serializer.dump(phone)
     return jsonify(phone_data)
 
 # Update a phone entry 
@@ -76,11 +70,7 @@ def update_phone(id):
         phone.phone_number = data.get('phone_number', phone.phone_number)
 
         db.session.commit()
-        return jsonify({'message': 'Phone entry updated successfully', 'phone': {
-            'id': phone.id,
-            'patient_name': phone.patient_name,
-            'phone_number': phone.phone_number
-        }})
+        return jsonify({'message': 'Phone entry updated successfully', 'phone': phone_serializer.dump(phone)})
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
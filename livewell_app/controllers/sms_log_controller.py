@@ -1,8 +1,18 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, abort, current_app, request, jsonify
 from livewell_app import db
 from livewell_app.models.sms_log import SMSLog
+from livewell_app.pagination import paginate, PaginationError
+from livewell_app.serializers import sms_log_serializer, json_response, FieldsError
+from livewell_app.filters import apply_filters, time_filtered, FilterError
+from livewell_app.archive import find_archived
+from livewell_app.export import export_response
+from livewell_app.delivery_reports import delivery_reports
+from livewell_app.sms_rollups import rollup_stats, GROUPINGS
+from livewell_app.idempotency import idempotent
 from functools import wraps
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from datetime import datetime, timedelta
+import json
 
 sms_log_bp = Blueprint('sms_log', __name__, url_prefix='/api/v1/sms-logs')
 
@@ -19,6 +29,7 @@ def admin_required(fn):
 
 # Create a new SMS log entry (public access)
 @sms_log_bp.route('/create', methods=['POST'])
+@idempotent
 def create_sms_log():
     try:
         data = request.get_json()
@@ -26,50 +37,191 @@ def create_sms_log():
             phone_number=data.get('phone_number'),
             message=data.get('message'),
             status=data.get('status'),
-            sent_at=data.get('sent_at')
+            sent_at=data.get('sent_at'),
+            message_id=data.get('message_id')
         )
         db.session.add(new_sms_log)
         db.session.commit()
-        return jsonify({'message': 'SMS log created successfully', 'sms_log': {
-            'id': new_sms_log.id,
-            'phone_number': new_sms_log.phone_number,
-            'message': new_sms_log.message,
-            'status': new_sms_log.status,
-            'sent_at': new_sms_log.sent_at.strftime('%Y-%m-%d %H:%M:%S')
-        }}), 201
+        return jsonify({'message': 'SMS log created successfully', 'sms_log': sms_log_serializer.dump(new_sms_log)}), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+# Validate one bulk entry, returning (row, None) or (None, error)
+def _validate_sms_log(entry, now):
+    if not isinstance(entry, dict):
+        return None, 'Entry must be an object'
+
+    columns = SMSLog.__table__.c
+    row = {}
+    for field in ('phone_number', 'message', 'status'):
+        value = entry.get(field)
+        if not isinstance(value, str) or not value:
+            return None, f'{field} is required'
+        max_length = getattr(columns[field].type, 'length', None)
+        if max_length and len(value) > max_length:
+            return None, f'{field} must be at most {max_length} characters'
+        row[field] = value
+
+    message_id = entry.get('message_id')
+    if message_id is not None and not isinstance(message_id, str):
+        return None, 'message_id must be a string'
+    row['message_id'] = message_id
+
+    sent_at = entry.get('sent_at')
+    if sent_at is None:
+        row['sent_at'] = now
+    else:
+        try:
+            row['sent_at'] = datetime.fromisoformat(sent_at)
+        except (TypeError, ValueError):
+            return None, 'sent_at must be a datetime (YYYY-MM-DD HH:MM:SS)'
+    return row, None
+
+# Read a JSON array or an NDJSON body; undecodable NDJSON lines become errors
+def _read_bulk_entries():
+    if request.mimetype == 'application/x-ndjson':
+        entries = []
+        for line in request.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                entries.append(None)
+        return entries
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        raise ValueError('Body must be a JSON array or NDJSON')
+    return data
+
+# Bulk-create SMS log entries (public access)
+# Valid entries are written with one executemany per chunk; invalid entries
+# and failed chunks are reported per item without failing the whole batch
+@sms_log_bp.route('/bulk', methods=['POST'])
+@idempotent
+def bulk_create_sms_logs():
+    try:
+        entries = _read_bulk_entries()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    max_items = current_app.config.get('SMS_LOG_BULK_MAX_ITEMS', 10000)
+    if len(entries) > max_items:
+        return jsonify({'error': f'At most {max_items} entries are accepted per request'}), 413
+
+    now = datetime.utcnow()
+    errors = []
+    valid = []
+    for index, entry in enumerate(entries):
+        row, error = _validate_sms_log(entry, now)
+        if error:
+            errors.append({'index': index, 'error': error if entry is not None else 'Invalid JSON'})
+        else:
+            valid.append((index, row))
+
+    chunk_size = current_app.config.get('SMS_LOG_BULK_CHUNK_SIZE', 1000)
+    inserted = 0
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start:start + chunk_size]
+        try:
+            SMSLog.bulk_insert([row for _, row in chunk])
+            db.session.commit()
+            inserted += len(chunk)
+        except Exception as e:
+            db.session.rollback()
+            errors.extend({'index': index, 'error': str(e)} for index, _ in chunk)
+
+    errors.sort(key=lambda error: error['index'])
+    if not errors:
+        status = 201
+    elif inserted:
+        status = 207
+    else:
+        status = 400
+    return jsonify({'inserted': inserted, 'failed': len(errors), 'errors': errors}), status
+
 # Get all SMS logs 
+# Filters: phone_number, since, until (see livewell_app.filters)
 @sms_log_bp.route('/', methods=['GET'])
 @admin_required
 def get_all_sms_logs():
-    logs = SMSLog.query.all()
-    output = []
-    for log in logs:
-        log_data = {
-            'id': log.id,
-            'phone_number': log.phone_number,
-            'message': log.message,
-            'status': log.status,
-            'sent_at': log.sent_at.strftime('%Y-%m-%d %H:%M:%S')
-        }
-        output.append(log_data)
-    return jsonify({'sms_logs': output})
-
-# Get a specific SMS log entry 
+    try:
+        fields = sms_log_serializer.requested_fields()
+        page = paginate(sms_log_serializer.project(apply_filters(SMSLog.query, 'sms_logs'), fields), SMSLog.id, SMSLog.sent_at,
+                        nulls=not time_filtered())
+    except (PaginationError, FilterError, FieldsError) as e:
+        return jsonify({'error': str(e)}), 400
+    return json_response({'sms_logs': sms_log_serializer.dump_rows(page.items, fields), 'next_cursor': page.next_cursor})
+
+# Export SMS logs as NDJSON or CSV, optionally gzipped (Admin access only)
+@sms_log_bp.route('/export', methods=['GET'])
+@admin_required
+def export_sms_logs():
+    try:
+        return export_response('sms_logs')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+# Delivery report callback from the SMS provider (public access)
+# Reports are buffered and applied in batches keyed by provider message id
+@sms_log_bp.route('/delivery-reports', methods=['POST'])
+def receive_delivery_report():
+    data = request.get_json(silent=True) or request.form
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Delivery report must be an object'}), 400
+    message_id = data.get('id') or data.get('message_id')
+    status = data.get('status')
+    if not isinstance(message_id, str) or not isinstance(status, str) or not message_id or not status:
+        return jsonify({'error': 'id and status are required strings'}), 400
+
+    status = status[:SMSLog.__table__.c.status.type.length]
+    try:
+        delivery_reports.add(message_id, status)
+    except Exception as e:
+        # The reports stay buffered and are retried on the next flush
+        current_app.logger.error(f'Error applying delivery reports: {e}')
+    return jsonify({'message': 'Delivery report received'}), 200
+
+# SMS delivery stats from the hourly rollups (Admin access only)
+# start/end default to the last 24 hours; group_by is hour, day, prefix,
+# carrier or status. sms_logs itself is never scanned.
+@sms_log_bp.route('/stats', methods=['GET'])
+@admin_required
+def get_sms_stats():
+    group_by = request.args.get('group_by', 'hour')
+    if group_by not in GROUPINGS:
+        return jsonify({'error': f"group_by must be one of {', '.join(GROUPINGS)}"}), 400
+    try:
+        end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else datetime.utcnow()
+        start = datetime.fromisoformat(request.args['start']) if request.args.get('start') else end - timedelta(days=1)
+    except ValueError:
+        return jsonify({'error': 'start and end must be datetimes (YYYY-MM-DD[ HH:MM:SS])'}), 400
+
+    max_days = current_app.config.get('SMS_STATS_MAX_DAYS', 93)
+    if end <= start or end - start > timedelta(days=max_days):
+        return jsonify({'error': f'end must be after start and at most {max_days} days later'}), 400
+
+    stats = rollup_stats(
+        start, end, group_by,
+        current_app.config.get('SMS_CARRIER_PREFIXES', {}),
+        current_app.config.get('SMS_SUCCESS_STATUSES', ('Success', 'Sent'))
+    )
+    stats.update({
+        'start': start.strftime('%Y-%m-%d %H:%M:%S'),
+        'end': end.strftime('%Y-%m-%d %H:%M:%S'),
+        'group_by': group_by
+    })
+    return jsonify(stats)
+
+# Get a specific SMS log entry, from the archive once it has been moved there
 @sms_log_bp.route('/<int:id>', methods=['GET'])
 @admin_required
 def get_sms_log(id):
-    log = SMSLog.query.get_or_404(id)
-    log_data = {
-        'id': log.id,
-        'phone_number': log.phone_number,
-        'message': log.message,
-        'status': log.status,
-        'sent_at': log.sent_at.strftime('%Y-%m-%d %H:%M:%S')
-    }
+    log = db.session.get(SMSLog, id) or find_archived('sms_logs', id)
+    if log is None:
+        abort(404)
+    log_data = sms_log_serializer.dump(log)
     return jsonify(log_data)
 
 # Update an SMS log entry 
@@ -86,13 +238,7 @@ def update_sms_log(id):
         log.sent_at = data.get('sent_at', log.sent_at)
 
         db.session.commit()
-        return jsonify({'message': 'SMS log updated successfully', 'sms_log': {
-            'id': log.id,
-            'phone_number': log.phone_number,
-            'message': log.message,
-            'status': log.status,
-            'sent_at': log.sent_at.strftime('%Y-%m-%d %H:%M:%S')
-        }})
+        return jsonify({'message': 'SMS log updated successfully', 'sms_log': sms_log_serializer.dump(log)})
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -153,8 +153,14 @@
 
 
 from flask import Blueprint, request, jsonify
-from livewell_app import db,bcrypt
+from livewell_app import db
 from livewell_app.models.user import User
+from livewell_app.models.appointment import Appointment
+from livewell_app.passwords import password_hasher, PasswordPoolSaturated
+from livewell_app.pagination import paginate, get_limit, PaginationError
+from livewell_app.serializers import user_serializer, phone_serializer, json_response, FieldsError, USER_SUMMARY_FIELDS
+from livewell_app.timeline import load_patient, timeline_page
+from livewell_app.idempotency import idempotent
 from functools import wraps
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 
@@ -171,8 +177,15 @@ def admin_required(fn):
         return fn(*args, **kwargs)
     return wrapper
 
+# Password hashing is at capacity; ask the client to retry shortly
+def _server_busy():
+    response = jsonify({'error': 'Server is busy, please try again shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 # User Registration (Public access)
 @user_bp.route('/register', methods=['POST'])
+@idempotent
 def register():
     data = request.get_json()
     if not data or not data.get('email') or not data.get('password'):
@@ -192,6 +205,8 @@ def register():
         )
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
+    except PasswordPoolSaturated:
+        return _server_busy()
 
     return jsonify({'message': 'User registered successfully', }), 201
 
@@ -205,31 +220,22 @@ def login():
     try:
         user = User.login(data.get('email'), data.get('password'))
         access_token = create_access_token(identity={'id': user.id, 'role': user.role})
-        return jsonify({'token': access_token, 'user': {
-            'id': user.id,
-            'name': user.name,
-            'email': user.email,
-            'role': user.role
-        }}), 200
+        return jsonify({'token': access_token, 'user': user_serializer.dump(user, USER_SUMMARY_FIELDS)}), 200
     except ValueError:
         return jsonify({'error': 'Invalid email or password'}), 401
+    except PasswordPoolSaturated:
+        return _server_busy()
 
 # Get All Users (Admin only)
 @user_bp.route('/', methods=['GET'])
 
 def get_all_users():
-    users = User.query.all()
-    output = []
-    for user in users:
-        user_data = {
-            'id': user.id,
-            'name': user.name,
-            'email': user.email,
-            'role': user.role,
-            'created_at': user.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        }
-        output.append(user_data)
-    return jsonify({'users': output})
+    try:
+        fields = user_serializer.requested_fields()
+        page = paginate(user_serializer.project(User.query, fields), User.id, User.created_at)
+    except (PaginationError, FieldsError) as e:
+        return jsonify({'error': str(e)}), 400
+    return json_response({'users': user_serializer.dump_rows(page.items, fields), 'next_cursor': page.next_cursor})
 
 # Get Single User (Admin or user’s own access)
 @user_bp.route('/<int:id>', methods=['GET'])
@@ -241,21 +247,33 @@ def get_user(id):
     if current_user['role'] != 'admin' and current_user['id'] != user.id:
         return jsonify({'error': 'Unauthorized access'}), 403
 
-    user_data = {
-        'id': user.id,
-        'name': user.name,
-        'email': user.email,
-        'role': user.role,
-        'date_of_birth': user.date_of_birth.strftime('%Y-%m-%d') if user.date_of_birth else None,
-        'contact_number': user.contact_number,
-        'address': user.address,
-        'is_doctor': user.is_doctor,
-        'specialty': user.specialty,
-        'medical_history': user.medical_history,
-        'created_at': user.created_at.strftime('%Y-%m-%d %H:%M:%S')
-    }
+    user_data = user_serializer.dump(user)
     return jsonify(user_data)
 
+# Get a patient's profile, phones and a page of their appointments and
+# medical records merged newest first (Admin or user’s own access)
+# A page always costs four queries; paginate with the returned next_cursor
+@user_bp.route('/<int:id>/timeline', methods=['GET'])
+@jwt_required()
+def get_user_timeline(id):
+    current_user = get_jwt_identity()
+    if current_user['role'] != 'admin' and current_user['id'] != id:
+        return jsonify({'error': 'Unauthorized access'}), 403
+
+    user = load_patient(id)
+    if user is None:
+        return jsonify({'error': 'User not found'}), 404
+    try:
+        events, next_cursor = timeline_page(id, get_limit(), request.args.get('after'))
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    return json_response({
+        'user': user_serializer.dump(user),
+        'phones': [phone_serializer.dump(phone) for phone in user.phones],
+        'events': events,
+        'next_cursor': next_cursor
+    })
+
 # Update User (Admin or user’s own access)
 @user_bp.route('/<int:id>', methods=['PUT'])
 @jwt_required()
@@ -272,7 +290,10 @@ def update_user(id):
     user.email = data.get('email', user.email)
 
     if data.get('password'):
-        user.password_hash = bcrypt.generate_password_hash(data.get('password')).decode('utf-8')
+        try:
+            user.password_hash = password_hasher.hash(data.get('password'))
+        except PasswordPoolSaturated:
+            return _server_busy()
     user.date_of_birth = data.get('date_of_birth', user.date_of_birth)
     user.contact_number = data.get('contact_number', user.contact_number)
     user.address = data.get('address', user.address)
@@ -282,18 +303,14 @@ def update_user(id):
 
     db.session.commit()
 
-    return jsonify({'message': 'User updated successfully', 'user': {
-        'id': user.id,
-        'name': user.name,
-        'email': user.email,
-        'role': user.role
-    }})
+    return jsonify({'message': 'User updated successfully', 'user': user_serializer.dump(user, USER_SUMMARY_FIELDS)})
 
 # Delete User (Admin only)
 @user_bp.route('/<int:id>', methods=['DELETE'])
 @admin_required
 def delete_user(id):
     user = User.query.get_or_404(id)
+    Appointment.query.filter_by(patient_id=id).update({'patient_id': None}, synchronize_session=False)
     db.session.delete(user)
     db.session.commit()
     return jsonify({'message': 'User deleted successfully'}),200
\ No newline at end of file
@@ -1,6 +1,13 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, abort, current_app, request, jsonify
 from livewell_app import db
 from livewell_app.models.ussd_session import USSDSession
+from livewell_app.pagination import paginate, PaginationError
+from livewell_app.serializers import ussd_session_serializer, json_response, FieldsError
+from livewell_app.filters import apply_filters, FilterError
+from livewell_app.archive import find_archived
+from livewell_app.ussd_store import get_session_store, new_session, TERMINAL_STATUSES
+from livewell_app.ussd_menu import get_ussd_menu
+from livewell_app.idempotency import idempotent
 from functools import wraps
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
@@ -17,65 +24,108 @@ def admin_required(fn):
         return fn(*args, **kwargs)
     return wrapper
 
+# Serialize a live session from the session store
+def _live_session_data(session):
+    return {
+        'id': None,
+        'session_id': session['session_id'],
+        'phone_number': session['phone_number'],
+        'session_data': session['session_data'],
+        'status': session['status'],
+        'created_at': session['created_at'].strftime('%Y-%m-%d %H:%M:%S')
+    }
+
 # Create a new USSD session entry (public access)
+# The session is kept in the session store and persisted on completion or timeout
 @ussd_session_bp.route('/create', methods=['POST'])
+@idempotent
 def create_ussd_session():
     try:
         data = request.get_json()
-        new_ussd_session = USSDSession(
-            session_id=data.get('session_id'),  # Assuming session_id is provided in the request
+        if not data.get('session_id') or not data.get('phone_number'):
+            return jsonify({'error': 'session_id and phone_number are required'}), 400
+        store = get_session_store()
+        session = store.put(new_session(
+            session_id=data.get('session_id'),
             phone_number=data.get('phone_number'),
+            service_code=data.get('service_code'),
             session_data=data.get('session_data'),
             status=data.get('status', 'active')  # Default to 'active' if not provided
-        )
-        db.session.add(new_ussd_session)
-        db.session.commit()
+        ))
+        if session['status'] in TERMINAL_STATUSES:
+            store.complete(session['session_id'], session['status'])
         return jsonify({
             'message': 'USSD session created successfully',
-            'ussd_session': {
-                'id': new_ussd_session.id,
-                'session_id': new_ussd_session.session_id,
-                'phone_number': new_ussd_session.phone_number,
-                'session_data': new_ussd_session.session_data,
-                'status': new_ussd_session.status,
-                'created_at': new_ussd_session.created_at.strftime('%Y-%m-%d %H:%M:%S')
-            }
+            'ussd_session': _live_session_data(session)
         }), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+# Get a USSD session by its session_id, live or persisted (admin only)
+@ussd_session_bp.route('/session/<session_id>', methods=['GET'])
+@admin_required
+def get_ussd_session_by_session_id(session_id):
+    session = get_session_store().get(session_id)
+    if session is not None:
+        return jsonify(_live_session_data(session))
+    session = USSDSession.query.filter_by(session_id=session_id).first_or_404()
+    return jsonify(ussd_session_serializer.dump(session))
+
+# Update a live USSD session (admin only)
+# Setting a terminal status ends the session and persists it
+@ussd_session_bp.route('/session/<session_id>', methods=['PUT'])
+@admin_required
+def update_live_ussd_session(session_id):
+    store = get_session_store()
+    session = store.get(session_id)
+    if session is None:
+        return jsonify({'error': 'USSD session is not active'}), 404
+    data = request.get_json()
+
+    try:
+        session['session_data'] = data.get('session_data', session['session_data'])
+        session['status'] = data.get('status', session['status'])
+        store.put(session)
+        if session['status'] in TERMINAL_STATUSES:
+            store.complete(session_id, session['status'])
+        return jsonify({
+            'message': 'USSD session updated successfully',
+            'ussd_session': _live_session_data(session)
+        })
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 # Get all USSD sessions (admin only)
+# Filters: phone_number or status, plus since/until (see livewell_app.filters)
 @ussd_session_bp.route('/', methods=['GET'])
 @admin_required
 def get_all_ussd_sessions():
-    sessions = USSDSession.query.all()
-    output = []
-    for session in sessions:
-        session_data = {
-            'id': session.id,
-            'session_id': session.session_id,
-            'phone_number': session.phone_number,
-            'session_data': session.session_data,
-            'status': session.status,
-            'created_at': session.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        }
-        output.append(session_data)
-    return jsonify({'ussd_sessions': output})
+    try:
+        fields = ussd_session_serializer.requested_fields()
+        page = paginate(ussd_session_serializer.project(apply_filters(USSDSession.query, 'ussd_sessions'), fields), USSDSession.id, USSDSession.created_at)
+    except (PaginationError, FilterError, FieldsError) as e:
+        return jsonify({'error': str(e)}), 400
+    return json_response({'ussd_sessions': ussd_session_serializer.dump_rows(page.items, fields), 'next_cursor': page.next_cursor})
+
+# Per-node USSD menu render times (admin only)
+@ussd_session_bp.route('/menu-stats', methods=['GET'])
+@admin_required
+def get_ussd_menu_stats():
+    return jsonify({
+        'budget_ms': current_app.config.get('USSD_RENDER_BUDGET_MS', 500),
+        'nodes': get_ussd_menu().stats()
+    })
 
-# Get a specific USSD session entry (admin only)
+# Get a specific USSD session entry, archived or not (admin only)
 @ussd_session_bp.route('/<int:id>', methods=['GET'])
 @admin_required
 def get_ussd_session(id):
-    session = USSDSession.query.get_or_404(id)
-    session_data = {
-        'id': session.id,
-        'session_id': session.session_id,
-        'phone_number': session.phone_number,
-        'session_data': session.session_data,
-        'status': session.status,
-        'created_at': session.created_at.strftime('%Y-%m-%d %H:%M:%S')
-    }
+    session = db.session.get(USSDSession, id) or find_archived('ussd_sessions', id)
+    if session is None:
+        abort(404)
+    session_data = ussd_session_serializer.dump(session)
     return jsonify(session_data)
 
 # Update a USSD session entry (admin only)
@@ -93,14 +143,7 @@ def update_ussd_session(id):
         db.session.commit()
         return jsonify({
             'message': 'USSD session updated successfully',
-            'ussd_session': {
-                'id': session.id,
-                'session_id': session.session_id,
-                'phone_number': session.phone_number,
-                'session_data': session.session_data,
-                'status': session.status,
-                'created_at': session.created_at.strftime('%Y-%m-%d %H:%M:%S')
-            }
+            'ussd_session': ussd_session_serializer.dump(session)
         })
     except Exception as e:
         db.session.rollback()
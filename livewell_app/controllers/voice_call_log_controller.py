@@ -1,9 +1,16 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, abort, request, jsonify, current_app
 from livewell_app import db
 from livewell_app.models.voice_call_log import VoiceCall
+from livewell_app.pagination import paginate, PaginationError
+from livewell_app.serializers import voice_call_serializer, json_response, FieldsError
+from livewell_app.filters import apply_filters, FilterError
+from livewell_app.archive import find_archived
+from livewell_app.export import export_response
+from livewell_app.call_analytics import call_analytics, counted_under, is_finished, record_call_created, record_call_finished
+from livewell_app.idempotency import idempotent
 from functools import wraps
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from datetime import datetime
+from datetime import datetime, timedelta
 
 
 
@@ -25,6 +32,7 @@ def admin_required(fn):
 # Create a new voice call log (Admin access only)
 @voice_call_log_bp.route('/create', methods=['POST'])
 @admin_required
+@idempotent
 def create_voice_call_log():
     data = request.get_json()
     try:
@@ -38,21 +46,12 @@ def create_voice_call_log():
             failure_reason=data.get('failure_reason')  # Optional field
         )
         db.session.add(new_call_log)
+        db.session.flush()
+        record_call_created(new_call_log)
         db.session.commit()
         return jsonify({
             'message': 'Voice call log created successfully',
-            'call_log': {
-                'id': new_call_log.id,
-                'call_id': new_call_log.call_id,
-                'caller_number': new_call_log.caller_number,
-                'receiver_number': new_call_log.receiver_number,
-                'call_status': new_call_log.call_status,
-                'duration': new_call_log.duration,
-                'recording_url': new_call_log.recording_url,
-                'failure_reason': new_call_log.failure_reason,
-                'initiated_at': new_call_log.initiated_at.strftime('%Y-%m-%d %H:%M:%S'),
-                'terminated_at': new_call_log.terminated_at.strftime('%Y-%m-%d %H:%M:%S') if new_call_log.terminated_at else None
-            }
+            'call_log': voice_call_serializer.dump(new_call_log)
         }), 201
     except Exception as e:
         db.session.rollback()
@@ -60,45 +59,62 @@ def create_voice_call_log():
 
 
 # Get all voice call logs (Admin access only)
+# Filters: caller_number, receiver_number, since, until (see livewell_app.filters)
 @voice_call_log_bp.route('/all', methods=['GET'])
 @admin_required
 def get_all_voice_call_logs():
-    logs = VoiceCall.query.all()
-    output = []
-    for log in logs:
-        log_data = {
-            'id': log.id,
-            'call_id': log.call_id,
-            'caller_number': log.caller_number,
-            'receiver_number': log.receiver_number,
-            'call_status': log.call_status,
-            'duration': log.duration,
-            'recording_url': log.recording_url,
-            'failure_reason': log.failure_reason,
-            'initiated_at': log.initiated_at.strftime('%Y-%m-%d %H:%M:%S'),
-            'terminated_at': log.terminated_at.strftime('%Y-%m-%d %H:%M:%S') if log.terminated_at else None
-        }
-        output.append(log_data)
-    return jsonify({'voice_call_logs': output})
-
-
-# Get a specific voice call log by ID (Admin access only)
+    try:
+        fields = voice_call_serializer.requested_fields()
+        page = paginate(voice_call_serializer.project(apply_filters(VoiceCall.query, 'voice_calls'), fields), VoiceCall.id, VoiceCall.initiated_at)
+    except (PaginationError, FilterError, FieldsError) as e:
+        return jsonify({'error': str(e)}), 400
+    return json_response({'voice_call_logs': voice_call_serializer.dump_rows(page.items, fields), 'next_cursor': page.next_cursor})
+
+
+# Export voice call logs as NDJSON or CSV, optionally gzipped (Admin access only)
+@voice_call_log_bp.route('/export', methods=['GET'])
+@admin_required
+def export_voice_call_logs():
+    try:
+        return export_response('voice_calls')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+# Call volume, failure rate, failure reasons and duration percentiles for
+# [start, end) days, all calls or one caller/receiver number (Admin access only)
+# start defaults to today and end to the day after start. Reads the daily
+# call_stats rows only: a compacted day is one row with stored percentiles,
+# otherwise the duration sketches of its shards are merged.
+@voice_call_log_bp.route('/analytics', methods=['GET'])
+@admin_required
+def get_voice_call_analytics():
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else datetime.utcnow().date()
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else start + timedelta(days=1)
+    except ValueError:
+        return jsonify({'error': 'start and end must be dates (YYYY-MM-DD)'}), 400
+
+    max_days = current_app.config.get('CALL_ANALYTICS_MAX_DAYS', 31)
+    if end <= start or end - start > timedelta(days=max_days):
+        return jsonify({'error': f'end must be after start and at most {max_days} days later'}), 400
+
+    number = request.args.get('number', '')
+    try:
+        result = call_analytics(start, end, number)
+    except ValueError:
+        return jsonify({'error': 'Stored sketches use different accuracies; run flask rebuild-call-analytics for this range'}), 409
+    return jsonify(dict(result, start=start.isoformat(), end=end.isoformat(), number=number or None))
+
+
+# Get a specific voice call log by ID, archived or not (Admin access only)
 @voice_call_log_bp.route('/<int:id>', methods=['GET'])
 @admin_required
 def get_voice_call_log(id):
-    log = VoiceCall.query.get_or_404(id)
-    log_data = {
-        'id': log.id,
-        'call_id': log.call_id,
-        'caller_number': log.caller_number,
-        'receiver_number': log.receiver_number,
-        'call_status': log.call_status,
-        'duration': log.duration,
-        'recording_url': log.recording_url,
-        'failure_reason': log.failure_reason,
-        'initiated_at': log.initiated_at.strftime('%Y-%m-%d %H:%M:%S'),
-        'terminated_at': log.terminated_at.strftime('%Y-%m-%d %H:%M:%S') if log.terminated_at else None
-    }
+    log = db.session.get(VoiceCall, id) or find_archived('voice_calls', id)
+    if log is None:
+        abort(404)
+    log_data = voice_call_serializer.dump(log)
     return jsonify(log_data)
 
 
@@ -110,6 +126,10 @@ def update_voice_call_log(id):
     data = request.get_json()
 
     try:
+        was_finished = is_finished(log)
+        # The finish is booked where the call was counted, even if this
+        # edit changes its numbers
+        key = counted_under(log)
         log.call_id = data.get('call_id', log.call_id)
         log.caller_number = data.get('caller_number', log.caller_number)
         log.receiver_number = data.get('receiver_number', log.receiver_number)
@@ -118,22 +138,13 @@ def update_voice_call_log(id):
         log.recording_url = data.get('recording_url', log.recording_url)
         log.failure_reason = data.get('failure_reason', log.failure_reason)
         log.terminated_at = datetime.utcnow() if data.get('terminated') else log.terminated_at  # Set terminated_at if needed
-        
+        if not was_finished and is_finished(log):
+            record_call_finished(log, key)
+
         db.session.commit()
         return jsonify({
             'message': 'Voice call log updated successfully',
-            'call_log': {
-                'id': log.id,
-                'call_id': log.call_id,
-                'caller_number': log.caller_number,
-                'receiver_number': log.receiver_number,
-                'call_status': log.call_status,
-                'duration': log.duration,
-                'recording_url': log.recording_url,
-                'failure_reason': log.failure_reason,
-                'initiated_at': log.initiated_at.strftime('%Y-%m-%d %H:%M:%S'),
-                'terminated_at': log.terminated_at.strftime('%Y-%m-%d %H:%M:%S') if log.terminated_at else None
-            }
+            'call_log': voice_call_serializer.dump(log)
         })
     except Exception as e:
         db.session.rollback()
@@ -0,0 +1,142 @@
+import hashlib
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy.engine import make_url
+
+READ_METHODS = ('GET', 'HEAD')
+REPLICA_BIND_PREFIX = 'replica'
+
+
+# Pool settings for a database URI. SQLite gets none: its pools don't take
+# them and Flask-SQLAlchemy picks the right one itself.
+def pool_options(config, uri):
+    if make_url(uri).get_backend_name() == 'sqlite':
+        return {}
+    return {
+        'pool_size': config.get('DB_POOL_SIZE', 10),
+        'max_overflow': config.get('DB_MAX_OVERFLOW', 20),
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': config.get('DB_POOL_PRE_PING', True),
+    }
+
+
+# Sends the reads of GET/HEAD blueprint handlers to a read replica and
+# everything else to the primary. A replica is picked per request
+# (round-robin) so one response never mixes replicas.
+#
+# Read-your-writes: once a client writes (a successful non-GET request, or
+# a flush during a GET) its reads stay on the primary for
+# DB_REPLICA_STICKY_SECONDS, so replica lag never hides its own change. The
+# client is recognised by a cookie and, for API clients that don't keep
+# cookies, by its bearer token (remembered per process only).
+class ReplicaRouter:
+    def __init__(self):
+        self.bind_keys = []
+        self.sticky_seconds = 5
+        self.cookie_name = 'livewell_primary'
+        self.max_clients = 10000
+        self._cycle = None
+        self._recent_writers = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Must run before db.init_app: it fills in SQLALCHEMY_ENGINE_OPTIONS and
+    # adds one SQLALCHEMY_BINDS entry per replica
+    def init_app(self, app):
+        config = app.config
+        options = pool_options(config, config['SQLALCHEMY_DATABASE_URI'])
+        options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+        binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+        self.bind_keys = []
+        for index, uri in enumerate(config.get('DB_REPLICA_URIS') or []):
+            key = f'{REPLICA_BIND_PREFIX}{index}'
+            binds[key] = dict(pool_options(config, uri), url=uri)
+            self.bind_keys.append(key)
+        config['SQLALCHEMY_BINDS'] = binds
+        self._cycle = itertools.cycle(self.bind_keys) if self.bind_keys else None
+
+        self.sticky_seconds = config.get('DB_REPLICA_STICKY_SECONDS', 5)
+        self.cookie_name = config.get('DB_REPLICA_STICKY_COOKIE', 'livewell_primary')
+        self.max_clients = config.get('DB_REPLICA_STICKY_MAX_CLIENTS', 10000)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.extensions['replica_router'] = self
+
+    def _client_key(self):
+        token = request.headers.get('Authorization')
+        return hashlib.sha1(token.encode('utf-8')).hexdigest() if token else None
+
+    def _is_sticky(self):
+        now = time.time()
+        try:
+            if float(request.cookies.get(self.cookie_name, 0)) > now:
+                return True
+        except ValueError:
+            pass
+        key = self._client_key()
+        if key is None:
+            return False
+        with self._lock:
+            return self._recent_writers.get(key, 0) > now
+
+    def _remember_write(self, response):
+        until = time.time() + self.sticky_seconds
+        response.set_cookie(self.cookie_name, str(int(until) + 1), max_age=self.sticky_seconds, httponly=True)
+        key = self._client_key()
+        if key is None:
+            return
+        with self._lock:
+            self._recent_writers[key] = until
+            self._recent_writers.move_to_end(key)
+            while len(self._recent_writers) > self.max_clients:
+                self._recent_writers.popitem(last=False)
+
+    # Send the rest of this request's reads to the primary
+    def use_primary(self):
+        if has_request_context():
+            g.db_replica = None
+
+    def _before_request(self):
+        g.db_replica = None
+        g.db_wrote = False
+        if (self._cycle is not None and request.method in READ_METHODS
+                and request.blueprint and not self._is_sticky()):
+            with self._lock:
+                g.db_replica = next(self._cycle)
+
+    def _after_request(self, response):
+        if not self.bind_keys:
+            return response
+        wrote = request.method not in READ_METHODS + ('OPTIONS',) and response.status_code < 400
+        if wrote or g.get('db_wrote'):
+            self._remember_write(response)
+        return response
+
+
+replica_router = ReplicaRouter()
+
+
+# Session whose default-bind reads go to the request's replica. Writes,
+# flushes, SELECT ... FOR UPDATE and bare connection() calls stay on the
+# primary, and after the first of those the rest of the request does too.
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or not has_request_context() or not g.get('db_replica'):
+            return engine
+        if engine is not self._db.engines.get(None):
+            return engine
+        if (self._flushing or clause is None or not getattr(clause, 'is_select', False)
+                or getattr(clause, '_for_update_arg', None) is not None):
+            if self._flushing or getattr(clause, 'is_dml', False):
+                g.db_wrote = True
+            g.db_replica = None
+            return engine
+        return self._db.engines[g.db_replica]
@@ -0,0 +1,167 @@
+import atexit
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import select
+
+from livewell_app.extensions import db
+from livewell_app.models.sms_log import SMSLog
+from livewell_app.sms_rollups import sms_rollups
+
+
+# Buffers provider delivery reports (DLRs) and applies them as batched
+# UPDATEs keyed by message id. Reports are coalesced per message (the latest
+# status wins) and flushed when the buffer reaches DLR_BATCH_SIZE entries or
+# every DLR_FLUSH_INTERVAL seconds, whichever comes first, so a burst of
+# reports costs a handful of statements instead of one transaction each.
+# A report can beat its sms_logs row (the worker writes the row once the
+# provider call returns), so reports matching no row are kept for up to
+# DLR_RETRY_TTL seconds, oldest dropped beyond DLR_RETRY_MAX_SIZE, and
+# tried again on every flush.
+class DeliveryReportBuffer:
+    def __init__(self, app=None):
+        self.app = None
+        self._pending = {}
+        self._unmatched = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.batch_size = app.config.get('DLR_BATCH_SIZE', 500)
+        self.flush_interval = app.config.get('DLR_FLUSH_INTERVAL', 1.0)
+        self.update_chunk_size = app.config.get('DLR_UPDATE_CHUNK_SIZE', 1000)
+        self.retry_ttl = app.config.get('DLR_RETRY_TTL', 600)
+        self.retry_max_size = app.config.get('DLR_RETRY_MAX_SIZE', 10000)
+        app.extensions['delivery_reports'] = self
+        atexit.register(self._flush_at_exit)
+
+    def add(self, message_id, status):
+        with self._lock:
+            self._pending[message_id] = status
+            full = len(self._pending) >= self.batch_size
+        self._ensure_flusher()
+        if full:
+            self.flush()
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def unmatched(self):
+        with self._lock:
+            return len(self._unmatched)
+
+    # Reports still waiting for their row, minus the expired ones; newer
+    # reports in `reports` win
+    def _take_unmatched(self, reports, now):
+        retries = {}
+        for message_id, (status, expires_at) in self._unmatched.items():
+            if expires_at > now and message_id not in reports:
+                retries[message_id] = (status, expires_at)
+        self._unmatched = OrderedDict()
+        return retries
+
+    def _keep_unmatched(self, message_id, status, expires_at):
+        self._unmatched[message_id] = (status, expires_at)
+        self._unmatched.move_to_end(message_id)
+        while len(self._unmatched) > self.retry_max_size:
+            self._unmatched.popitem(last=False)
+
+    # Apply everything buffered so far; must run inside an app context
+    def flush(self):
+        with self._flush_lock:
+            now = time.monotonic()
+            with self._lock:
+                reports, self._pending = self._pending, {}
+                retries = self._take_unmatched(reports, now)
+            if not reports and not retries:
+                return 0
+
+            by_status = {}
+            for message_id, status in reports.items():
+                by_status.setdefault(status, []).append(message_id)
+            for message_id, (status, _) in retries.items():
+                by_status.setdefault(status, []).append(message_id)
+
+            try:
+                updated = 0
+                missing = set()
+                table = SMSLog.__table__
+                for status, message_ids in by_status.items():
+                    for i in range(0, len(message_ids), self.update_chunk_size):
+                        chunk = message_ids[i:i + self.update_chunk_size]
+                        # Lock and read the matching rows: ids with no row are
+                        # retried later, and the hourly rollups move the
+                        # changing rows' counts to the new status
+                        rows = db.session.execute(
+                            select(table.c.message_id, table.c.sent_at, table.c.phone_number, table.c.status)
+                            .where(table.c.message_id.in_(chunk))
+                            .with_for_update()
+                        ).all()
+                        missing.update(set(chunk) - {row.message_id for row in rows})
+                        previous = [row[1:] for row in rows if row.status != status]
+                        if not previous:
+                            continue
+                        changing = table.c.message_id.in_(chunk) & (table.c.status != status)
+                        result = db.session.execute(table.update().where(changing).values(status=status))
+                        sms_rollups.record_status_change(previous, status)
+                        updated += result.rowcount
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                # Put the reports back without overwriting newer ones
+                with self._lock:
+                    for message_id, status in reports.items():
+                        self._pending.setdefault(message_id, status)
+                    for message_id, (status, expires_at) in retries.items():
+                        if message_id not in self._pending:
+                            self._keep_unmatched(message_id, status, expires_at)
+                raise
+
+            with self._lock:
+                for message_id in missing:
+                    if message_id in self._pending:
+                        continue
+                    if message_id in retries:
+                        status, expires_at = retries[message_id]
+                    else:
+                        status, expires_at = reports[message_id], now + self.retry_ttl
+                    self._keep_unmatched(message_id, status, expires_at)
+            return updated
+
+    def _ensure_flusher(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='dlr-flusher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            if not self.pending() and not self.unmatched():
+                continue
+            with self.app.app_context():
+                try:
+                    self.flush()
+                except Exception:
+                    self.app.logger.exception('Failed to apply delivery reports')
+                finally:
+                    db.session.remove()
+
+    def _flush_at_exit(self):
+        if self.app is not None and self.pending():
+            with self.app.app_context():
+                try:
+                    self.flush()
+                except Exception:
+                    self.app.logger.exception('Failed to apply delivery reports at exit')
+
+
+delivery_reports = DeliveryReportBuffer()
@@ -0,0 +1,99 @@
+import gzip
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import current_app, request
+
+CacheEntry = namedtuple('CacheEntry', ['version', 'body', 'gzip_body', 'etag', 'gzip_etag', 'created'])
+
+
+# In-process cache of serialized doctor directory pages. Every write to the
+# doctors table bumps `version`, which drops all cached pages. Bodies are
+# stored pre-encoded and pre-gzipped with strong ETags derived from the
+# content, so ETags agree across server processes. DOCTOR_CACHE_TTL bounds
+# how long another process's write can go unnoticed. For
+# DB_REPLICA_STICKY_SECONDS after a bump, pages are refilled from the
+# primary, so a lagging replica cannot put the old directory back in the
+# cache for every client.
+class DoctorDirectoryCache:
+    def __init__(self, ttl=300, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.primary_seconds = 5
+        self.version = 0
+        self.bumped_at = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('DOCTOR_CACHE_TTL', 300)
+        self.max_entries = app.config.get('DOCTOR_CACHE_MAX_ENTRIES', 256)
+        self.primary_seconds = app.config.get('DB_REPLICA_STICKY_SECONDS', 5)
+        app.extensions['doctor_cache'] = self
+
+    def bump(self):
+        with self._lock:
+            self.version += 1
+            self.bumped_at = time.monotonic()
+            self._entries.clear()
+
+    # Whether a refill should read from the primary
+    def needs_primary(self):
+        bumped_at = self.bumped_at
+        return bumped_at is not None and time.monotonic() - bumped_at < self.primary_seconds
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.version != self.version or time.monotonic() - entry.created > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    # Store a serialized body; `version` is the version read before the
+    # query ran, so a write that raced the query is not cached
+    def put(self, key, body, version):
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        entry = CacheEntry(
+            version=version,
+            body=body,
+            gzip_body=gzip.compress(body, 6),
+            etag=digest,
+            gzip_etag=digest + '-gzip',
+            created=time.monotonic()
+        )
+        with self._lock:
+            if version == self.version:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    # 304 when the client already has this version, otherwise the cached
+    # body, gzipped when the client accepts it
+    def respond(self, entry):
+        use_gzip = 'gzip' in request.accept_encodings
+        etag = entry.gzip_etag if use_gzip else entry.etag
+
+        if entry.etag in request.if_none_match or entry.gzip_etag in request.if_none_match:
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.response_class(
+                entry.gzip_body if use_gzip else entry.body,
+                mimetype='application/json'
+            )
+            if use_gzip:
+                response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(etag)
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = 'public, no-cache'
+        return response
+
+
+doctor_directory_cache = DoctorDirectoryCache()
@@ -0,0 +1,172 @@
+import bisect
+import re
+import threading
+import time
+
+from sqlalchemy import select
+
+from livewell_app.extensions import db
+from livewell_app.models.doctors import Doctor
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Score weights: a query matching the start of the full name ranks above one
+# matching the start of a later name word, and each bio keyword adds one
+FULL_NAME_PREFIX_SCORE = 3
+NAME_WORD_PREFIX_SCORE = 2
+KEYWORD_SCORE = 1
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+def doctor_document(doctor):
+    return {
+        'id': doctor.id,
+        'name': doctor.name,
+        'email': doctor.email,
+        'contact_number': doctor.contact_number,
+        'specialty': doctor.specialty,
+        'bio_data': doctor.bio_data
+    }
+
+
+# In-memory search index over the doctors table:
+#   - specialty (lower-cased) -> doctor ids
+#   - a sorted list of (name key, id) for prefix lookups with bisect, keyed
+#     by the full name and by each word of it
+#   - an inverted index of bio_data tokens -> doctor ids
+# Built from the database on first use, then updated incrementally by the
+# doctors controller. DOCTOR_INDEX_TTL forces a rebuild to pick up writes
+# made by other server processes.
+class DoctorSearchIndex:
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._reset()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('DOCTOR_INDEX_TTL', 300)
+        app.extensions['doctor_search'] = self
+
+    def _reset(self):
+        self.documents = {}
+        self.by_specialty = {}
+        self.name_keys = []
+        self.tokens = {}
+        self.built_at = None
+
+    def ensure_built(self):
+        with self._lock:
+            if self.built_at is None or time.monotonic() - self.built_at > self.ttl:
+                self.rebuild()
+
+    def rebuild(self):
+        rows = db.session.execute(select(*Doctor.__table__.columns)).all()
+        with self._lock:
+            self._reset()
+            for row in rows:
+                self._add(dict(row._mapping))
+            self.built_at = time.monotonic()
+
+    # Incremental updates from the doctors controller; ignored until the
+    # index has been built, since the first build reads the table anyway
+    def update(self, doctor):
+        with self._lock:
+            if self.built_at is None:
+                return
+            self._remove(doctor.id)
+            self._add(doctor_document(doctor))
+
+    def remove(self, doctor_id):
+        with self._lock:
+            if self.built_at is not None:
+                self._remove(doctor_id)
+
+    def _name_keys(self, document):
+        name = (document['name'] or '').lower()
+        keys = {name}
+        keys.update(tokenize(name))
+        return keys
+
+    def _add(self, document):
+        doctor_id = document['id']
+        self.documents[doctor_id] = document
+        if document['specialty']:
+            self.by_specialty.setdefault(document['specialty'].lower(), set()).add(doctor_id)
+        for key in self._name_keys(document):
+            bisect.insort(self.name_keys, (key, doctor_id))
+        for token in set(tokenize(document['bio_data'])):
+            self.tokens.setdefault(token, set()).add(doctor_id)
+
+    def _remove(self, doctor_id):
+        document = self.documents.pop(doctor_id, None)
+        if document is None:
+            return
+        if document['specialty']:
+            ids = self.by_specialty.get(document['specialty'].lower())
+            if ids is not None:
+                ids.discard(doctor_id)
+                if not ids:
+                    del self.by_specialty[document['specialty'].lower()]
+        for key in self._name_keys(document):
+            i = bisect.bisect_left(self.name_keys, (key, doctor_id))
+            if i < len(self.name_keys) and self.name_keys[i] == (key, doctor_id):
+                del self.name_keys[i]
+        for token in set(tokenize(document['bio_data'])):
+            ids = self.tokens.get(token)
+            if ids is not None:
+                ids.discard(doctor_id)
+                if not ids:
+                    del self.tokens[token]
+
+    # Name-prefix matches: {id: score}
+    def _match_name(self, prefix):
+        prefix = prefix.lower()
+        scores = {}
+        i = bisect.bisect_left(self.name_keys, (prefix,))
+        while i < len(self.name_keys) and self.name_keys[i][0].startswith(prefix):
+            key, doctor_id = self.name_keys[i]
+            name = (self.documents[doctor_id]['name'] or '').lower()
+            score = FULL_NAME_PREFIX_SCORE if name.startswith(prefix) else NAME_WORD_PREFIX_SCORE
+            scores[doctor_id] = max(scores.get(doctor_id, 0), score)
+            i += 1
+        return scores
+
+    # Ranked (score, id) pairs, best first, ties broken by id
+    def search(self, specialty=None, name=None, q=None):
+        self.ensure_built()
+        with self._lock:
+            candidates = None
+            scores = {}
+
+            if specialty:
+                candidates = set(self.by_specialty.get(specialty.lower(), ()))
+
+            if name:
+                name_scores = self._match_name(name)
+                candidates = set(name_scores) if candidates is None else candidates & set(name_scores)
+                for doctor_id, score in name_scores.items():
+                    scores[doctor_id] = scores.get(doctor_id, 0) + score
+
+            if q:
+                keyword_ids = set()
+                for token in set(tokenize(q)):
+                    for doctor_id in self.tokens.get(token, ()):
+                        keyword_ids.add(doctor_id)
+                        scores[doctor_id] = scores.get(doctor_id, 0) + KEYWORD_SCORE
+                candidates = keyword_ids if candidates is None else candidates & keyword_ids
+
+            if candidates is None:
+                candidates = set(self.documents)
+            ranked = sorted(((scores.get(doctor_id, 0), doctor_id) for doctor_id in candidates),
+                            key=lambda item: (-item[0], item[1]))
+            return ranked
+
+    def document(self, doctor_id):
+        with self._lock:
+            return self.documents.get(doctor_id)
+
+
+doctor_search_index = DoctorSearchIndex()
@@ -0,0 +1,139 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+
+from flask import Response, request, stream_with_context
+from sqlalchemy import select
+
+from livewell_app.archive import iter_archived
+from livewell_app.extensions import db
+from livewell_app.models.sms_log import SMSLog
+from livewell_app.models.voice_call_log import VoiceCall
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Tables that can be exported, with the column used for time-range filters
+EXPORTABLE_TABLES = {
+    'sms_logs': (SMSLog, SMSLog.sent_at),
+    'voice_calls': (VoiceCall, VoiceCall.initiated_at),
+}
+
+MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+# Parse a start/end filter; accepts ISO dates and the API's own datetime format
+def parse_time(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid datetime '{value}', expected YYYY-MM-DD[ HH:MM:SS]")
+
+
+# Stream rows straight off a server-side cursor as plain Core rows, so no ORM
+# objects are built and only `batch_size` rows are held in memory at a time.
+# Archived rows in the range come first, one compressed block at a time.
+def iter_rows(table_name, start=None, end=None, batch_size=1000):
+    model, time_column = EXPORTABLE_TABLES[table_name]
+    yield from iter_archived(table_name, start, end)
+    stmt = select(model.__table__).order_by(model.id)
+    if start:
+        stmt = stmt.where(time_column >= start)
+    if end:
+        stmt = stmt.where(time_column < end)
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+    try:
+        for row in result:
+            yield row
+    finally:
+        result.close()
+
+
+def _format_value(value):
+    if isinstance(value, datetime):
+        return value.strftime(DATETIME_FORMAT)
+    return value
+
+
+def _ndjson_lines(rows, columns):
+    for row in rows:
+        yield json.dumps({name: _format_value(value) for name, value in zip(columns, row)}) + '\n'
+
+
+def _csv_lines(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(['' if value is None else _format_value(value) for value in row])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    # The header is still buffered when there are no rows
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+# Coalesce many small lines into chunks of roughly `size` bytes
+def _chunked(lines, size=64 * 1024):
+    parts = []
+    length = 0
+    for line in lines:
+        data = line.encode('utf-8')
+        parts.append(data)
+        length += len(data)
+        if length >= size:
+            yield b''.join(parts)
+            parts = []
+            length = 0
+    if parts:
+        yield b''.join(parts)
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# Generator of encoded byte chunks for an export; memory stays constant
+# regardless of how many rows match
+def generate_export(table_name, fmt='ndjson', compress=False, start=None, end=None, batch_size=1000):
+    if table_name not in EXPORTABLE_TABLES:
+        raise ValueError(f"Unknown table '{table_name}'")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported format '{fmt}', expected one of {', '.join(EXPORT_FORMATS)}")
+
+    model, _ = EXPORTABLE_TABLES[table_name]
+    columns = [column.name for column in model.__table__.columns]
+    rows = iter_rows(table_name, start, end, batch_size)
+    lines = _ndjson_lines(rows, columns) if fmt == 'ndjson' else _csv_lines(rows, columns)
+    chunks = _chunked(lines)
+    return _gzipped(chunks) if compress else chunks
+
+
+def export_filename(table_name, fmt, compress=False):
+    return f"{table_name}.{fmt}" + ('.gz' if compress else '')
+
+
+# Build a streaming download from the request's format/gzip/start/end arguments
+def export_response(table_name):
+    fmt = request.args.get('format', 'ndjson')
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    start = parse_time(request.args.get('start'))
+    end = parse_time(request.args.get('end'))
+    body = generate_export(table_name, fmt, compress, start, end)
+
+    response = Response(stream_with_context(body), mimetype='application/gzip' if compress else MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename={export_filename(table_name, fmt, compress)}'
+    return response
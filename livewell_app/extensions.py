@@ -7,8 +7,10 @@ from flask_bcrypt import Bcrypt
 
 from flask_jwt_extended import JWTManager
 
+from livewell_app.db_routing import RoutingSession
 
-db = SQLAlchemy()
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 bcrypt = Bcrypt()
 jwt = JWTManager()
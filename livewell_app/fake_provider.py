@@ -0,0 +1,103 @@
+import json
+import random
+import threading
+import time
+import uuid
+from urllib.parse import parse_qs, urlsplit
+
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.exceptions import ConnectionError, ReadTimeout
+from requests.structures import CaseInsensitiveDict
+
+
+# In-process stand-in for the Africa's Talking API, mounted on the provider
+# client's session in place of the HTTP adapter (PROVIDER_BACKEND='fake').
+# Every request waits `latency` seconds plus up to `jitter`, times out like
+# a real socket when that exceeds the read timeout, and fails with
+# `error_rate` probability (half as 503s, half as refused connections), so
+# timeouts, retries and the circuit breaker can be exercised offline.
+# Responses have the same shape as the real API's.
+class FakeProviderAdapter(BaseAdapter):
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        super().__init__()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def configure(self, latency=0.0, jitter=0.0, error_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        return self
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            roll = self._random.random()
+        read_timeout = timeout[1] if isinstance(timeout, tuple) else timeout
+
+        if roll < self.error_rate / 2:
+            with self._lock:
+                self.errors += 1
+            raise ConnectionError('Fake provider refused the connection', request=request)
+        if read_timeout is not None and delay > read_timeout:
+            time.sleep(read_timeout)
+            with self._lock:
+                self.timeouts += 1
+            raise ReadTimeout('Fake provider timed out', request=request)
+        if delay:
+            time.sleep(delay)
+        if roll < self.error_rate:
+            with self._lock:
+                self.errors += 1
+            return self._response(request, 503, {'error': 'Service Unavailable'})
+
+        fields = {key: values[0] for key, values in parse_qs(request.body or '').items()}
+        path = urlsplit(request.url).path
+        if path.endswith('/messaging'):
+            recipients = [number for number in fields.get('to', '').split(',') if number]
+            return self._response(request, 201, {'SMSMessageData': {
+                'Message': f'Sent to {len(recipients)}/{len(recipients)} Total Cost: UGX 0.0000',
+                'Recipients': [{
+                    'number': number,
+                    'status': 'Success',
+                    'statusCode': 101,
+                    'cost': 'UGX 0.0000',
+                    'messageId': f'ATXid_{uuid.uuid4().hex}'
+                } for number in recipients]
+            }})
+        if path.endswith('/call'):
+            return self._response(request, 200, {'entries': [{
+                'phoneNumber': fields.get('to'),
+                'status': 'Queued',
+                'sessionId': f'ATVId_{uuid.uuid4().hex}'
+            }], 'errorMessage': 'None'})
+        return self._response(request, 200, {
+            'status': 'Success',
+            'sessionId': fields.get('sessionId') or f'ATUid_{uuid.uuid4().hex}',
+            'phoneNumber': fields.get('phoneNumber')
+        })
+
+    def _response(self, request, status, body):
+        response = Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict({'Content-Type': 'application/json'})
+        response._content = json.dumps(body).encode('utf-8')
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+    def stats(self):
+        with self._lock:
+            return {'requests': self.requests, 'errors': self.errors, 'timeouts': self.timeouts}
@@ -0,0 +1,118 @@
+from collections import namedtuple
+from datetime import datetime
+from itertools import combinations, product
+
+from flask import request
+
+from livewell_app.models.medical_record import MedicalRecord
+from livewell_app.models.phone import Phone
+from livewell_app.models.sms_log import SMSLog
+from livewell_app.models.ussd_session import USSDSession
+from livewell_app.models.voice_call_log import VoiceCall
+from livewell_app.pagination import keyset_after
+
+# Filterable list endpoints. Every equality column leads a composite
+# (column, time_column) index, and `since`/`until` on their own are only
+# accepted where time_column has an index of its own, so each combination an
+# endpoint accepts is an index range scan already in the pagination order.
+FilterSpec = namedtuple('FilterSpec', ['model', 'time_column', 'columns', 'time_indexed'])
+
+INDEXED_FILTERS = {
+    'sms_logs': FilterSpec(SMSLog, SMSLog.sent_at, (SMSLog.phone_number,), True),
+    'voice_calls': FilterSpec(VoiceCall, VoiceCall.initiated_at,
+                              (VoiceCall.caller_number, VoiceCall.receiver_number), True),
+    'ussd_sessions': FilterSpec(USSDSession, USSDSession.created_at,
+                                (USSDSession.phone_number, USSDSession.status), False),
+    'medical_records': FilterSpec(MedicalRecord, MedicalRecord.recorded_at, (MedicalRecord.patient_id,), False),
+    'phones': FilterSpec(Phone, Phone.created_at, (Phone.user_id,), False),
+}
+
+
+class FilterError(ValueError):
+    pass
+
+
+def _parse_time(name, value):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise FilterError(f'{name} must be a date or datetime (YYYY-MM-DD[ HH:MM:SS])')
+
+
+def _parse_value(column, value):
+    if column.type.python_type is int:
+        try:
+            return int(value)
+        except ValueError:
+            raise FilterError(f'{column.key} must be an integer')
+    return value
+
+
+def filter_query(query, spec, values, since=None, until=None):
+    for column in spec.columns:
+        if values.get(column.key) is not None:
+            query = query.filter(column == values[column.key])
+    if since is not None:
+        query = query.filter(spec.time_column >= since)
+    if until is not None:
+        query = query.filter(spec.time_column < until)
+    return query
+
+
+# Apply the equality filters and the since/until range (until exclusive)
+# from the query string for one of INDEXED_FILTERS
+def apply_filters(query, name):
+    spec = INDEXED_FILTERS[name]
+    values = {}
+    for column in spec.columns:
+        if request.args.get(column.key):
+            values[column.key] = _parse_value(column, request.args[column.key])
+
+    since = _parse_time('since', request.args['since']) if request.args.get('since') else None
+    until = _parse_time('until', request.args['until']) if request.args.get('until') else None
+    if (since or until) and not values and not spec.time_indexed:
+        allowed = ', '.join(column.key for column in spec.columns)
+        raise FilterError(f'since/until need one of: {allowed}')
+    return filter_query(query, spec, values, since, until)
+
+
+# Whether the request limits the time column, which also rules out NULLs
+def time_filtered():
+    return bool(request.args.get('since') or request.args.get('until'))
+
+
+# Every filter combination the endpoint accepts, as (values, since, until)
+# with placeholder values: each set of equality filters, alone and with a
+# time range, and the time range alone where it is indexed
+def filter_combinations(spec):
+    probe = datetime(2000, 1, 1)
+    samples = {column.key: 1 if column.type.python_type is int else '0' for column in spec.columns}
+    for size in range(1, len(spec.columns) + 1):
+        for columns, ranged in product(combinations(spec.columns, size), (False, True)):
+            yield {column.key: samples[column.key] for column in columns}, probe if ranged else None, None
+    if spec.time_indexed:
+        yield {}, probe, None
+
+
+# Position used to probe the keyset cursor predicate of later pages
+PROBE_CURSOR = (datetime(2000, 1, 2), 1000)
+
+
+# The list query an endpoint runs for one filter combination, optionally
+# for the page after `after` (sort value, id)
+def probe_query(spec, values, since=None, until=None, after=None, limit=51):
+    query = filter_query(spec.model.query, spec, values, since, until)
+    if after is not None:
+        nulls = spec.time_column.nullable and since is None and until is None
+        query = query.filter(keyset_after(spec.time_column, spec.model.id, *after, nulls=nulls))
+    return query.order_by(spec.time_column.desc(), spec.model.id.desc()).limit(limit)
+
+
+# (label, query) for the first and a later page of every filter combination
+# of one endpoint; used by `flask check-indexes`
+def probe_queries(name):
+    spec = INDEXED_FILTERS[name]
+    for values, since, until in filter_combinations(spec):
+        label = ' '.join([name] + sorted(values) + (['since'] if since else []))
+        yield f'{label} (first page)', probe_query(spec, values, since, until)
+        yield f'{label} (after cursor)', probe_query(spec, values, since, until, PROBE_CURSOR)
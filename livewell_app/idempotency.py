@@ -0,0 +1,332 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from livewell_app.extensions import db
+from livewell_app.models.idempotency_key import IdempotencyKey
+
+MAX_KEY_LENGTH = 255
+# Response headers kept with a stored response and sent again on replay
+REPLAYED_HEADERS = ('Content-Type', 'Location')
+
+# Outcomes of IdempotencyStore.begin()
+NEW = 'new'
+REPLAY = 'replay'
+MISMATCH = 'mismatch'
+IN_PROGRESS = 'in_progress'
+FULL = 'full'
+
+
+class _Entry:
+    __slots__ = ('fingerprint', 'response', 'expires_at', 'done')
+
+    def __init__(self, fingerprint, expires_at):
+        self.fingerprint = fingerprint
+        self.response = None
+        self.expires_at = expires_at
+        self.done = threading.Event()
+
+
+# In-process idempotency store: an LRU-ordered dict of keys. The first
+# request for a key owns it until it completes; duplicates arriving meanwhile
+# wait on it for up to wait_timeout seconds and then replay its response,
+# which is kept for ttl seconds. A released key (the first request failed
+# with a 5xx or raised) wakes the waiters and the next one runs the request
+# itself. Keys still in progress never expire and are never evicted, so a
+# slow request cannot run twice; when all max_keys of them are in progress
+# new keys are refused.
+class MemoryIdempotencyStore:
+    def __init__(self, ttl=86400, max_keys=10000, wait_timeout=30, lock_timeout=60):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.wait_timeout = wait_timeout
+        self.lock_timeout = lock_timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Drop the least recently used completed key; False when every key is
+    # still in progress. Call with the lock held.
+    def _evict(self):
+        for scope, entry in self._entries.items():
+            if entry.done.is_set():
+                del self._entries[scope]
+                return True
+        return False
+
+    # (NEW, None) when this request owns the key, (REPLAY, response) for a
+    # completed duplicate, (MISMATCH, None) when the key was used with another
+    # body, (IN_PROGRESS, None) when the first request is still running and
+    # (FULL, None) when the store is full of requests in progress
+    def begin(self, scope, fingerprint):
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            with self._lock:
+                entry = self._entries.get(scope)
+                if entry is not None and entry.done.is_set() and entry.expires_at <= time.monotonic():
+                    del self._entries[scope]
+                    entry = None
+                if entry is None:
+                    if len(self._entries) >= self.max_keys and not self._evict():
+                        return FULL, None
+                    self._entries[scope] = _Entry(fingerprint, None)
+                    return NEW, None
+                self._entries.move_to_end(scope)
+            if entry.fingerprint != fingerprint:
+                return MISMATCH, None
+            if entry.response is not None:
+                return REPLAY, entry.response
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not entry.done.wait(remaining):
+                return IN_PROGRESS, None
+            if entry.response is not None:
+                return REPLAY, entry.response
+
+    # Keep `response` (status, headers, body) for replays
+    def complete(self, scope, fingerprint, response):
+        with self._lock:
+            entry = self._entries.get(scope)
+            if entry is None or entry.fingerprint != fingerprint:
+                entry = self._entries[scope] = _Entry(fingerprint, 0)
+            entry.response = response
+            entry.expires_at = time.monotonic() + self.ttl
+            self._entries.move_to_end(scope)
+        entry.done.set()
+
+    def release(self, scope):
+        with self._lock:
+            entry = self._entries.pop(scope, None)
+        if entry is not None:
+            entry.done.set()
+
+
+# Adds the idempotency_keys table so duplicates are caught across server
+# processes. The memory store still coalesces duplicates within a process
+# and caches completed responses; the first request per process then
+# claims the key with an INSERT on the primary (outside the request's own
+# transaction). A duplicate in another process polls the row until the
+# owner stores its response or releases the key. While the owner runs, a
+# background thread pushes its claims' expiry forward every third of
+# lock_timeout, so a claim only lapses once its process has died.
+class DatabaseIdempotencyStore(MemoryIdempotencyStore):
+    POLL_INTERVAL = 0.1
+    PURGE_EVERY = 1000
+
+    def __init__(self, *args, app=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.app = app
+        self._claims = 0
+        self._owned = set()
+        self._thread = None
+
+    def _claim(self, scope, fingerprint):
+        table = IdempotencyKey.__table__
+        now = datetime.utcnow()
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(delete(table).where((table.c.key == scope) & (table.c.expires_at <= now)))
+                connection.execute(insert(table).values(
+                    key=scope, fingerprint=fingerprint, status='in_progress', created_at=now,
+                    expires_at=now + timedelta(seconds=self.lock_timeout)
+                ))
+            return True, None
+        except IntegrityError:
+            with db.engine.connect() as connection:
+                return False, connection.execute(select(table).where(table.c.key == scope)).first()
+
+    def _purge(self):
+        table = IdempotencyKey.__table__
+        with db.engine.begin() as connection:
+            connection.execute(delete(table).where(table.c.expires_at <= datetime.utcnow()))
+
+    def begin(self, scope, fingerprint):
+        state, response = super().begin(scope, fingerprint)
+        if state != NEW:
+            return state, response
+        # The memory entry is in progress now and never expires; a database
+        # error must release it, or every retry of the key waits and fails
+        try:
+            self._claims += 1
+            if self._claims % self.PURGE_EVERY == 0:
+                self._purge()
+
+            deadline = time.monotonic() + self.wait_timeout
+            while True:
+                claimed, row = self._claim(scope, fingerprint)
+                if claimed:
+                    with self._lock:
+                        self._owned.add(scope)
+                    self._ensure_heartbeat()
+                    return NEW, None
+                if row is not None:
+                    if row.fingerprint != fingerprint:
+                        super().release(scope)
+                        return MISMATCH, None
+                    if row.status == 'completed':
+                        response = (row.response_status, json.loads(row.response_headers or '[]'), row.response_body or b'')
+                        super().complete(scope, fingerprint, response)
+                        return REPLAY, response
+                if time.monotonic() >= deadline:
+                    super().release(scope)
+                    return IN_PROGRESS, None
+                time.sleep(self.POLL_INTERVAL)
+        except Exception:
+            with self._lock:
+                self._owned.discard(scope)
+            super().release(scope)
+            raise
+
+    def complete(self, scope, fingerprint, response):
+        table = IdempotencyKey.__table__
+        status, headers, body = response
+        with self._lock:
+            self._owned.discard(scope)
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(update(table).where(table.c.key == scope).values(
+                    status='completed', response_status=status, response_headers=json.dumps(headers),
+                    response_body=body, expires_at=datetime.utcnow() + timedelta(seconds=self.ttl)
+                ))
+        except Exception:
+            # The row lapses once its claim is no longer extended
+            super().release(scope)
+            raise
+        super().complete(scope, fingerprint, response)
+
+    def release(self, scope):
+        table = IdempotencyKey.__table__
+        with self._lock:
+            self._owned.discard(scope)
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(delete(table).where(table.c.key == scope))
+        finally:
+            super().release(scope)
+
+    def _ensure_heartbeat(self):
+        if self.app is None or (self._thread is not None and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='idempotency-heartbeat', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        table = IdempotencyKey.__table__
+        while True:
+            time.sleep(self.lock_timeout / 3)
+            with self._lock:
+                owned = list(self._owned)
+            if not owned:
+                continue
+            with self.app.app_context():
+                try:
+                    with db.engine.begin() as connection:
+                        connection.execute(
+                            update(table)
+                            .where(table.c.key.in_(owned) & (table.c.status == 'in_progress'))
+                            .values(expires_at=datetime.utcnow() + timedelta(seconds=self.lock_timeout))
+                        )
+                except Exception:
+                    self.app.logger.exception('Failed to extend idempotency key claims')
+
+
+IDEMPOTENCY_BACKENDS = {
+    'memory': MemoryIdempotencyStore,
+    'database': DatabaseIdempotencyStore,
+}
+
+
+def init_idempotency(app):
+    backend = app.config.get('IDEMPOTENCY_BACKEND', 'memory')
+    if backend not in IDEMPOTENCY_BACKENDS:
+        raise ValueError(f"Unknown IDEMPOTENCY_BACKEND '{backend}'")
+    store_class = IDEMPOTENCY_BACKENDS[backend]
+    options = {'app': app} if store_class is DatabaseIdempotencyStore else {}
+    store = store_class(
+        ttl=app.config.get('IDEMPOTENCY_TTL', 86400),
+        max_keys=app.config.get('IDEMPOTENCY_MAX_KEYS', 10000),
+        wait_timeout=app.config.get('IDEMPOTENCY_WAIT_TIMEOUT', 30),
+        lock_timeout=app.config.get('IDEMPOTENCY_LOCK_TIMEOUT', 60),
+        **options
+    )
+    app.extensions['idempotency'] = store
+    return store
+
+
+# Keys are per caller and endpoint. Anonymous callers share one scope per
+# endpoint (not their address, which proxies and NAT share): their key is a
+# random value the client made up, and the fingerprint rejects its reuse
+# with another body.
+def _scope(key):
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except Exception:
+        identity = None
+    caller = identity.get('id') if isinstance(identity, dict) else identity
+    caller = 'anonymous' if caller is None else f'user:{caller}'
+    raw = f'{caller}|{request.method}|{request.path}|{key}'
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _replay(response):
+    status, headers, body = response
+    replayed = current_app.response_class(body, status=status, headers=headers)
+    replayed.headers['Idempotent-Replayed'] = 'true'
+    return replayed
+
+
+# Honour an Idempotency-Key header: the first request with a key runs and
+# its response (anything but a 5xx) is stored; retries with the same key and
+# body get that response again, concurrent ones after waiting for it, and
+# the same key with a different body is rejected with 422.
+def idempotent(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if key is None:
+            return fn(*args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters'}), 400
+
+        store = current_app.extensions['idempotency']
+        scope = _scope(key)
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+        state, stored = store.begin(scope, fingerprint)
+        if state == REPLAY:
+            return _replay(stored)
+        if state == MISMATCH:
+            return jsonify({'error': 'Idempotency-Key was already used with a different request body'}), 422
+        if state == IN_PROGRESS:
+            return jsonify({'error': 'A request with this Idempotency-Key is still in progress'}), 409, {'Retry-After': '1'}
+        if state == FULL:
+            return jsonify({'error': 'Too many requests with an Idempotency-Key are in progress'}), 503, {'Retry-After': '1'}
+
+        try:
+            response = current_app.make_response(fn(*args, **kwargs))
+        except Exception:
+            store.release(scope)
+            raise
+        if response.status_code >= 500 or response.is_streamed:
+            store.release(scope)
+        else:
+            headers = [(name, value) for name, value in response.headers if name in REPLAYED_HEADERS]
+            try:
+                store.complete(scope, fingerprint, (response.status_code, headers, response.get_data()))
+            except Exception:
+                # The request itself succeeded; only its replay is lost
+                current_app.logger.exception('Failed to store an idempotent response')
+        return response
+    return wrapper
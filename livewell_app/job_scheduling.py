@@ -0,0 +1,92 @@
+import threading
+import time
+
+SCHEDULING_MODES = ('weighted', 'strict')
+
+
+# Refills at `rate` units per second up to `burst`. Taking more than is
+# available leaves the bucket in debt, so an expensive job (a bulk SMS to a
+# hundred recipients) still runs but holds the class back until it is paid
+# for. A rate of None never limits.
+class TokenBucket:
+    def __init__(self, rate=None, burst=None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self):
+        if self.rate is None:
+            return float('inf')
+        self._refill()
+        return self.tokens
+
+    def take(self, units):
+        if self.rate is not None:
+            self._refill()
+            self.tokens -= units
+
+
+# Splits a worker's free slots between message classes. 'strict' offers
+# every slot to the highest class that can use one; 'weighted' hands slots
+# out by smooth weighted round robin, so each class gets its weight's share
+# while it has work and idle classes' shares go to the rest. A class is
+# only offered slots while its token bucket is positive and it runs fewer
+# than its max_in_flight jobs.
+class ClassScheduler:
+    def __init__(self, classes, mode='weighted'):
+        if mode not in SCHEDULING_MODES:
+            raise ValueError(f"Unknown scheduling mode '{mode}', expected one of {', '.join(SCHEDULING_MODES)}")
+        self.classes = list(classes)
+        self.mode = mode
+        self.weights = {name: settings.get('weight', 1) for name, settings in classes.items()}
+        self.max_in_flight = {name: settings.get('max_in_flight') for name, settings in classes.items()}
+        self.buckets = {name: TokenBucket(settings.get('rate'), settings.get('burst'))
+                        for name, settings in classes.items()}
+        self.in_flight = dict.fromkeys(self.classes, 0)
+        self._current = dict.fromkeys(self.classes, 0)
+        self._lock = threading.Lock()
+
+    def _room(self, name):
+        limit = self.max_in_flight[name]
+        return float('inf') if limit is None else limit - self.in_flight[name]
+
+    # {class: slots} for up to `free` slots, skipping the `exhausted` classes
+    def allot(self, free, exhausted=()):
+        with self._lock:
+            ready = [name for name in self.classes
+                     if name not in exhausted and self._room(name) > 0 and self.buckets[name].available() > 0]
+            allotment = {}
+            if self.mode == 'strict':
+                for name in ready:
+                    slots = int(min(free, self._room(name)))
+                    if slots:
+                        return {name: slots}
+                return allotment
+            room = {name: self._room(name) for name in ready}
+            for _ in range(free):
+                candidates = [name for name in ready if room[name] > 0]
+                if not candidates:
+                    break
+                total = sum(self.weights[name] for name in candidates)
+                for name in candidates:
+                    self._current[name] += self.weights[name]
+                chosen = max(candidates, key=lambda name: self._current[name])
+                self._current[chosen] -= total
+                room[chosen] -= 1
+                allotment[chosen] = allotment.get(chosen, 0) + 1
+            return allotment
+
+    def started(self, name, units):
+        with self._lock:
+            self.in_flight[name] += 1
+            self.buckets[name].take(units)
+
+    def finished(self, name):
+        with self._lock:
+            self.in_flight[name] -= 1
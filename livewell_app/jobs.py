@@ -0,0 +1,373 @@
+import json
+import os
+import random
+import signal
+import socket
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import case, func, insert, select
+
+from livewell_app.africas_talking import provider, ProviderError
+from livewell_app.call_analytics import record_call_created
+from livewell_app.extensions import db
+from livewell_app.job_scheduling import ClassScheduler
+from livewell_app.models.outbound_job import OutboundJob
+from livewell_app.models.sms_log import SMSLog
+from livewell_app.models.voice_call_log import VoiceCall
+
+# Request fields each kind of job needs, in provider call order
+JOB_FIELDS = {
+    'sms': ('recipient', 'message'),
+    'bulk_sms': ('recipients', 'message'),
+    'voice': ('caller', 'recipient'),
+    'ussd': ('phone_number', 'ussd_code'),
+}
+
+
+class JobError(ValueError):
+    pass
+
+
+def message_classes():
+    return current_app.config.get('JOB_CLASSES') or {'transactional': {}}
+
+
+def _message_class(message_class):
+    message_class = message_class or current_app.config.get('JOB_DEFAULT_CLASS', 'transactional')
+    if message_class not in message_classes():
+        raise JobError(f"message_class must be one of {', '.join(message_classes())}")
+    return message_class
+
+
+# Add a queued job for `data` in its message_class (JOB_DEFAULT_CLASS if
+# none is given); the caller commits
+def enqueue(kind, data, created_by=None):
+    missing = [field for field in JOB_FIELDS[kind] if not data.get(field)]
+    if missing:
+        raise JobError(f"{' and '.join(missing)} {'is' if len(missing) == 1 else 'are'} required")
+    now = datetime.utcnow()
+    job = OutboundJob(
+        kind=kind,
+        message_class=_message_class(data.get('message_class')),
+        units=1,
+        payload=json.dumps({field: data[field] for field in JOB_FIELDS[kind]}),
+        status='queued',
+        attempts=0,
+        run_at=now,
+        created_by=created_by,
+        created_at=now
+    )
+    db.session.add(job)
+    return job
+
+
+# Queue one bulk SMS job per (message, recipients) batch with multi-row
+# inserts of JOB_INSERT_CHUNK_SIZE jobs; each job costs one rate-limit unit
+# per recipient. The caller commits.
+def enqueue_bulk_sms(batches, created_by=None, message_class=None):
+    message_class = _message_class(message_class)
+    chunk_size = current_app.config.get('JOB_INSERT_CHUNK_SIZE', 1000)
+    summary = {'recipients': 0, 'batches': 0, 'message_class': message_class}
+    rows = []
+    for message, recipients in batches:
+        now = datetime.utcnow()
+        rows.append({
+            'kind': 'bulk_sms',
+            'message_class': message_class,
+            'units': len(recipients),
+            'payload': json.dumps({'recipients': list(recipients), 'message': message}),
+            'status': 'queued',
+            'attempts': 0,
+            'run_at': now,
+            'created_by': created_by,
+            'created_at': now
+        })
+        summary['batches'] += 1
+        summary['recipients'] += len(recipients)
+        if len(rows) >= chunk_size:
+            db.session.execute(insert(OutboundJob.__table__), rows)
+            rows = []
+    if rows:
+        db.session.execute(insert(OutboundJob.__table__), rows)
+    return summary
+
+
+# Claim up to `limit` due jobs of a message class for `worker_id`, as
+# (id, units) pairs. Rows are picked with FOR UPDATE SKIP LOCKED so
+# concurrent workers never wait on, or take, each other's jobs; the status
+# guard on the UPDATE covers databases without it.
+def claim(worker_id, limit, message_class):
+    table = OutboundJob.__table__
+    now = datetime.utcnow()
+    due = (table.c.status == 'queued') & (table.c.message_class == message_class) & (table.c.run_at <= now)
+    ids = db.session.execute(
+        select(table.c.id).where(due).order_by(table.c.run_at, table.c.id).limit(limit)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+    if ids:
+        db.session.execute(
+            table.update().where(table.c.id.in_(ids) & due)
+            .values(status='running', locked_by=worker_id, locked_at=now, attempts=table.c.attempts + 1,
+                    started_at=func.coalesce(table.c.started_at, now))
+        )
+    db.session.commit()
+    if not ids:
+        return []
+    return db.session.execute(
+        select(table.c.id, table.c.units)
+        .where(table.c.id.in_(ids) & (table.c.status == 'running') & (table.c.locked_by == worker_id))
+    ).all()
+
+
+# Jobs whose worker died mid-run go back to the queue after JOB_LOCK_TIMEOUT
+# seconds. Delivery is at-least-once: such a job may already have been sent.
+def requeue_stale():
+    table = OutboundJob.__table__
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config.get('JOB_LOCK_TIMEOUT', 300))
+    result = db.session.execute(
+        table.update().where((table.c.status == 'running') & (table.c.locked_at < cutoff))
+        .values(status='queued', locked_by=None, locked_at=None)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def _send(kind, payload):
+    if kind == 'sms':
+        return provider.send_sms(payload['recipient'], payload['message'])
+    if kind == 'bulk_sms':
+        return provider.send_bulk_sms(payload['recipients'], payload['message'])
+    if kind == 'voice':
+        return provider.make_voice_call(payload['caller'], payload['recipient'])
+    return provider.initiate_ussd_session(payload['phone_number'], payload['ussd_code'])
+
+
+# Turn a provider response for one SMS send into SMSLog rows; recipients
+# missing from it (or all of them, when `response` is None) are 'Failed'
+def sms_log_rows(text, numbers, response, sent_at):
+    results = {}
+    if response:
+        for recipient in response.get('SMSMessageData', {}).get('Recipients', []):
+            results[recipient.get('number')] = recipient
+    rows = []
+    for number in numbers:
+        result = results.get(number, {})
+        rows.append({
+            'phone_number': number,
+            'message': text,
+            'status': result.get('status', 'Failed'),
+            'sent_at': sent_at,
+            'message_id': result.get('messageId')
+        })
+    return rows
+
+
+# SMSLog / VoiceCall rows for a finished job; `response` is None when it failed
+def _record(job, payload, response, error=None):
+    now = datetime.utcnow()
+    if job.kind == 'sms':
+        SMSLog.bulk_insert(sms_log_rows(payload['message'], [payload['recipient']], response, now))
+    elif job.kind == 'bulk_sms':
+        SMSLog.bulk_insert(sms_log_rows(payload['message'], payload['recipients'], response, now))
+    elif job.kind == 'voice':
+        entry = ((response or {}).get('entries') or [{}])[0]
+        queued = entry.get('status') == 'Queued'
+        call = VoiceCall(
+            call_id=entry.get('sessionId') or f'job-{job.id}',
+            caller_number=payload['caller'],
+            receiver_number=payload['recipient'],
+            call_status='initiated' if queued else 'failed',
+            failure_reason=None if queued else (error or entry.get('status') or (response or {}).get('errorMessage') or 'Failed')[:255]
+        )
+        db.session.add(call)
+        db.session.flush()
+        record_call_created(call)
+
+
+def _backoff(attempts):
+    config = current_app.config
+    delay = min(config.get('JOB_RETRY_BACKOFF_MAX', 600), config.get('JOB_RETRY_BACKOFF', 10) * 2 ** (attempts - 1))
+    return timedelta(seconds=random.uniform(delay / 2, delay))
+
+
+# Run one claimed job. The provider call happens outside any transaction so
+# a slow provider holds no database connection; failures the provider cannot
+# have acted on are retried with backoff up to JOB_MAX_ATTEMPTS.
+def run_job(job_id):
+    job = db.session.get(OutboundJob, job_id)
+    kind, payload = job.kind, json.loads(job.payload)
+    db.session.rollback()
+
+    try:
+        response, error = _send(kind, payload), None
+    except ProviderError as e:
+        response, error = None, e
+
+    job = db.session.get(OutboundJob, job_id)
+    now = datetime.utcnow()
+    job.locked_by = None
+    job.locked_at = None
+    if error is None:
+        job.status = 'succeeded'
+        job.result = json.dumps(response)
+        job.error = None
+        job.finished_at = now
+        _record(job, payload, response)
+    elif error.retryable and job.attempts < current_app.config.get('JOB_MAX_ATTEMPTS', 5):
+        job.status = 'queued'
+        job.error = str(error)[:255]
+        job.run_at = now + _backoff(job.attempts)
+    else:
+        job.status = 'failed'
+        job.error = str(error)[:255]
+        job.finished_at = now
+        _record(job, payload, None, str(error))
+    db.session.commit()
+    return job.status
+
+
+def fail_job(job_id, message):
+    db.session.rollback()
+    job = db.session.get(OutboundJob, job_id)
+    job.status = 'failed'
+    job.error = message[:255]
+    job.finished_at = datetime.utcnow()
+    job.locked_by = None
+    job.locked_at = None
+    db.session.commit()
+
+
+def _percentile(values, q):
+    return round(values[min(len(values) - 1, int(q * len(values)))], 3) if values else None
+
+
+def _empty_metrics():
+    return {
+        'queued': 0, 'due': 0, 'running': 0, 'oldest_wait_s': None,
+        'window': {'started': 0, 'succeeded': 0, 'failed': 0, 'retrying': 0,
+                   'wait_p50_s': None, 'wait_p95_s': None, 'wait_p99_s': None, 'wait_max_s': None}
+    }
+
+
+# Per message class: jobs queued now (and how many are due), running, and
+# the longest current wait; and for jobs first started in the last
+# `window_minutes`, how they ended and percentiles of their wait from
+# enqueue to start
+def queue_metrics(window_minutes):
+    table = OutboundJob.__table__
+    now = datetime.utcnow()
+    metrics = {name: _empty_metrics() for name in message_classes()}
+
+    depth = db.session.execute(
+        select(table.c.message_class, table.c.status, func.count(),
+               func.sum(case((table.c.run_at <= now, 1), else_=0)), func.min(table.c.created_at))
+        .where(table.c.status.in_(('queued', 'running')))
+        .group_by(table.c.message_class, table.c.status)
+    ).all()
+    for message_class, status, count, due, oldest in depth:
+        entry = metrics.setdefault(message_class, _empty_metrics())
+        entry[status] = count
+        if status == 'queued':
+            entry['due'] = int(due or 0)
+            entry['oldest_wait_s'] = round((now - oldest).total_seconds(), 3)
+
+    waits = {}
+    started = db.session.execute(
+        select(table.c.message_class, table.c.status, table.c.created_at, table.c.started_at)
+        .where(table.c.started_at >= now - timedelta(minutes=window_minutes))
+    )
+    for message_class, status, created_at, started_at in started:
+        window = metrics.setdefault(message_class, _empty_metrics())['window']
+        window['started'] += 1
+        if status in ('succeeded', 'failed'):
+            window[status] += 1
+        elif status == 'queued':
+            window['retrying'] += 1
+        waits.setdefault(message_class, []).append((started_at - created_at).total_seconds())
+    for message_class, values in waits.items():
+        values.sort()
+        metrics[message_class]['window'].update({
+            'wait_p50_s': _percentile(values, 0.50),
+            'wait_p95_s': _percentile(values, 0.95),
+            'wait_p99_s': _percentile(values, 0.99),
+            'wait_max_s': round(values[-1], 3)
+        })
+    db.session.rollback()
+    return metrics
+
+
+# Drains the queue with up to `concurrency` jobs in flight, each on its own
+# thread and app context. Free slots go to message classes as the
+# ClassScheduler decides (JOB_SCHEDULING, JOB_CLASSES weights, rates and
+# max_in_flight), so a capped bulk class always leaves room for
+# transactional jobs. Rates are enforced per worker process. SIGINT/SIGTERM
+# stop claiming and let running jobs finish.
+class Worker:
+    def __init__(self, app, concurrency=8, poll_interval=1.0):
+        self.app = app
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        with app.app_context():
+            self.scheduler = ClassScheduler(message_classes(), app.config.get('JOB_SCHEDULING', 'weighted'))
+        self.processed = {}
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def stop(self, *args):
+        self._stopping.set()
+
+    def _run(self, job_id, message_class):
+        with self.app.app_context():
+            try:
+                status = run_job(job_id)
+            except Exception as e:
+                self.app.logger.error(f'Job {job_id} failed: {e}')
+                fail_job(job_id, f'Worker error: {e}')
+                status = 'failed'
+        self.scheduler.finished(message_class)
+        with self._lock:
+            counts = self.processed.setdefault(message_class, {})
+            counts[status] = counts.get(status, 0) + 1
+
+    # Fill up to `free` slots; returns (jobs claimed, classes with no due jobs)
+    def _claim_round(self, pool, in_flight, free):
+        claimed, exhausted = 0, set()
+        while free:
+            allotment = self.scheduler.allot(free, exhausted)
+            if not allotment:
+                break
+            for message_class, slots in allotment.items():
+                jobs = claim(self.worker_id, slots, message_class)
+                for job_id, units in jobs:
+                    self.scheduler.started(message_class, units)
+                    in_flight.add(pool.submit(self._run, job_id, message_class))
+                if len(jobs) < slots:
+                    exhausted.add(message_class)
+                claimed += len(jobs)
+                free -= len(jobs)
+        return claimed, exhausted
+
+    # With `once`, return when the queue has no due jobs left
+    def run(self, once=False):
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, self.stop)
+            signal.signal(signal.SIGTERM, self.stop)
+        in_flight = set()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while not self._stopping.is_set():
+                in_flight = {future for future in in_flight if not future.done()}
+                free = self.concurrency - len(in_flight)
+                if not free:
+                    wait(in_flight, return_when=FIRST_COMPLETED)
+                    continue
+                claimed, exhausted = self._claim_round(pool, in_flight, free)
+                if claimed < free:
+                    if once and not claimed and not in_flight and len(exhausted) == len(self.scheduler.classes):
+                        break
+                    requeue_stale()
+                    self._stopping.wait(self.poll_interval)
+        return self.processed
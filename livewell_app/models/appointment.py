@@ -3,18 +3,32 @@ from datetime import datetime
 
 class Appointment(db.Model):
     __tablename__ = 'appointments'
+    __table_args__ = (
+        db.Index('ix_appointments_doctor_id_appointment_time', 'doctor_id', 'appointment_time'),
+        db.Index('ix_appointments_patient_id_appointment_time', 'patient_id', 'appointment_time'),
+    )
     id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), nullable=True)
+    patient_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     patient_name = db.Column(db.String(125),nullable=False)  
-    doctor_name = db.Column(db.String(125), nullable=False)  # Stores doctor's name instead of ID
+    doctor_name = db.Column(db.String(125), nullable=False)  # Doctor's name at booking time, kept in sync on rename
     appointment_time = db.Column(db.DateTime, nullable=False)  # Scheduled time for the appointment
+    duration_minutes = db.Column(db.Integer, nullable=False, default=30, server_default='30')  # Slot length at booking time
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Date when the appointment was made
     status = db.Column(db.String(20), nullable=False, default='scheduled')  # Appointment status
     notes = db.Column(db.Text, nullable=True)  # Optional notes for the appointment
 
-    def __init__(self, patient_name, doctor_name, appointment_time, status='scheduled', notes=None):
+    doctor = db.relationship('Doctor')
+    patient = db.relationship('User')
+
+    def __init__(self, patient_name, doctor_name, appointment_time, status='scheduled', notes=None,
+                 doctor_id=None, patient_id=None, duration_minutes=30):
         self.patient_name = patient_name
         self.doctor_name = doctor_name
+        self.doctor_id = doctor_id
+        self.patient_id = patient_id
         self.appointment_time = appointment_time
+        self.duration_minutes = duration_minutes
         self.status = status
         self.notes = notes
 
@@ -0,0 +1,25 @@
+from datetime import datetime
+from livewell_app.extensions import db
+
+class CallStat(db.Model):
+    __tablename__ = 'call_stats'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'number', 'shard', name='uq_call_stats_day_number_shard'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)  # Day the calls were initiated
+    number = db.Column(db.String(20), nullable=False, default='')  # Caller or receiver number; '' holds the day's totals
+    shard = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # 0: compacted summary, 1..CALL_STATS_SHARDS: write shards; a (day, number) is the sum of its rows
+    calls = db.Column(db.Integer, nullable=False, default=0)  # Calls initiated
+    finished = db.Column(db.Integer, nullable=False, default=0)  # Calls that reached a final status
+    failed = db.Column(db.Integer, nullable=False, default=0)  # Finished calls that failed
+    failure_reasons = db.Column(db.Text, nullable=False, default='{}')  # JSON reason -> count
+    duration_sketch = db.Column(db.Text, nullable=False, default='{}')  # JSON quantile sketch of durations (seconds)
+    p50 = db.Column(db.Float, nullable=True)  # Duration percentiles of a shard 0 row, set when compacted
+    p90 = db.Column(db.Float, nullable=True)
+    p99 = db.Column(db.Float, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<CallStat {self.day} {self.number or '*'}: {self.calls} calls>"
@@ -0,0 +1,18 @@
+from datetime import datetime
+from livewell_app.extensions import db
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(64), nullable=False, unique=True)  # SHA-256 of caller, method, path and Idempotency-Key
+    fingerprint = db.Column(db.String(64), nullable=False)  # SHA-256 of the request body
+    status = db.Column(db.String(20), nullable=False, default='in_progress')  # in_progress or completed
+    response_status = db.Column(db.Integer, nullable=True)
+    response_headers = db.Column(db.Text, nullable=True)  # JSON [name, value] pairs
+    response_body = db.Column(db.LargeBinary(length=16777215), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)  # Lock deadline while in progress, then end of the TTL
+
+    def __repr__(self):
+        return f"<IdempotencyKey {self.key[:12]} {self.status}>"
@@ -3,6 +3,9 @@ from datetime import datetime
 
 class MedicalRecord(db.Model):
     __tablename__ = 'medical_records'
+    __table_args__ = (
+        db.Index('ix_medical_records_patient_id_recorded_at', 'patient_id', 'recorded_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # References a patient in the User table
     doctor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # References a doctor in the User table
@@ -0,0 +1,44 @@
+import json
+from datetime import datetime
+from livewell_app.extensions import db
+
+class OutboundJob(db.Model):
+    __tablename__ = 'outbound_jobs'
+    __table_args__ = (
+        db.Index('ix_outbound_jobs_status_message_class_run_at', 'status', 'message_class', 'run_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # sms, bulk_sms, voice or ussd
+    message_class = db.Column(db.String(20), nullable=False, default='transactional')  # Scheduling lane (JOB_CLASSES)
+    units = db.Column(db.Integer, nullable=False, default=1)  # Rate-limit cost: messages the job sends
+    payload = db.Column(db.Text, nullable=False)  # JSON arguments for the provider call
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded or failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Earliest time a worker may claim it
+    locked_by = db.Column(db.String(100), nullable=True)  # Worker running it
+    locked_at = db.Column(db.DateTime, nullable=True)
+    result = db.Column(db.Text, nullable=True)  # JSON provider response
+    error = db.Column(db.String(255), nullable=True)  # Last failure
+    created_by = db.Column(db.Integer, nullable=True)  # User id from the token that enqueued it
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True, index=True)  # First claimed by a worker
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'message_class': self.message_class,
+            'status': self.status,
+            'attempts': self.attempts,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'run_at': self.run_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'started_at': self.started_at.strftime('%Y-%m-%d %H:%M:%S') if self.started_at else None,
+            'finished_at': self.finished_at.strftime('%Y-%m-%d %H:%M:%S') if self.finished_at else None
+        }
+
+    def __repr__(self):
+        return f"<OutboundJob {self.id} {self.kind} {self.status}>"
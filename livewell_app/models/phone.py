@@ -3,6 +3,9 @@ from datetime import datetime
 
 class Phone(db.Model):
     __tablename__ = 'phones'
+    __table_args__ = (
+        db.Index('ix_phones_user_id_created_at', 'user_id', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # References the user who owns this phone number
     phone_number = db.Column(db.String(20), nullable=False, unique=True)  # Phone number
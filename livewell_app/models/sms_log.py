@@ -1,20 +1,40 @@
 from datetime import datetime
+from sqlalchemy import insert
 from livewell_app.extensions import db
 
 class SMSLog(db.Model):
     __tablename__ = 'sms_logs'
+    __table_args__ = (
+        db.Index('ix_sms_logs_phone_number_sent_at', 'phone_number', 'sent_at'),
+        db.Index('ix_sms_logs_sent_at', 'sent_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     phone_number = db.Column(db.String(15), nullable=False)
     message = db.Column(db.Text, nullable=False)
     status = db.Column(db.String(50), nullable=False)
     sent_at = db.Column(db.DateTime, default=datetime.utcnow)
+    message_id = db.Column(db.String(100), nullable=True, index=True)  # Provider message id, used to match delivery reports
 
-    def __init__(self, phone_number, message, status, sent_at=None):
+    def __init__(self, phone_number, message, status, sent_at=None, message_id=None):
         self.phone_number = phone_number
         self.message = message
         self.status = status
         self.sent_at = sent_at if sent_at else datetime.utcnow()
+        self.message_id = message_id
+
+    # Insert many rows (dicts of column values) with a single executemany and
+    # add them to the hourly rollups; the caller owns the transaction
+    @classmethod
+    def bulk_insert(cls, rows):
+        if rows:
+            from livewell_app.sms_rollups import sms_rollups
+            # Stamp rows here rather than leave it to the column default, so
+            # the rollups count them under the sent_at that is stored
+            now = datetime.utcnow()
+            rows = [row if 'sent_at' in row else dict(row, sent_at=now) for row in rows]
+            db.session.execute(insert(cls.__table__), rows)
+            sms_rollups.record_inserts(rows)
 
     def to_dict(self):
         return {
@@ -22,5 +42,6 @@ class SMSLog(db.Model):
             'phone_number': self.phone_number,
             'message': self.message,
             'status': self.status,
-            'sent_at': self.sent_at.strftime('%Y-%m-%d %H:%M:%S')
+            'sent_at': self.sent_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'message_id': self.message_id
         }
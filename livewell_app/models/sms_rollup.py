@@ -0,0 +1,16 @@
+from livewell_app.extensions import db
+
+class SMSHourlyStat(db.Model):
+    __tablename__ = 'sms_hourly_stats'
+    __table_args__ = (
+        db.UniqueConstraint('hour', 'prefix', 'status', name='uq_sms_hourly_stats_hour_prefix_status'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    hour = db.Column(db.DateTime, nullable=False)  # Start of the hour the messages were sent in
+    prefix = db.Column(db.String(15), nullable=False)  # Leading characters of the phone number (country + network code)
+    status = db.Column(db.String(50), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<SMSHourlyStat {self.hour} {self.prefix} {self.status}: {self.count}>"
@@ -1,8 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
-from livewell_app.extensions import db, Bcrypt
-
-bcrypt = Bcrypt()
+from datetime import date, datetime
+from livewell_app.extensions import db
+from livewell_app.passwords import password_hasher, PasswordPoolSaturated
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -20,6 +19,8 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, onupdate=datetime.utcnow)
 
+    phones = db.relationship('Phone', order_by='Phone.created_at')
+
     def __init__(self, name, email, password, date_of_birth, contact_number, address, is_doctor=False, specialty=None, medical_history=None):
         self.name = name
         self.email = email
@@ -33,16 +34,22 @@ class User(db.Model):
         self.medical_history = medical_history if not is_doctor else None
 
     def hash_password(self):
-        self.password_hash = bcrypt.generate_password_hash(self.password_hash).decode('utf-8')
+        self.password_hash = password_hasher.hash(self.password_hash)
         # self.password_hash = None  
 
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return password_hasher.check(self.password_hash, password)
 
     @classmethod
     def signup(cls, name, email, password, date_of_birth, contact_number, address, is_doctor=False, specialty=None, medical_history=None):
         if cls.query.filter_by(email=email).first():
             raise ValueError("Email already exists")
+        # JSON bodies carry the date as YYYY-MM-DD; the Date column needs a date
+        if isinstance(date_of_birth, str):
+            try:
+                date_of_birth = date.fromisoformat(date_of_birth)
+            except ValueError:
+                raise ValueError("date_of_birth must be a date (YYYY-MM-DD)")
         
         user = cls(
             name=name,
@@ -65,6 +72,13 @@ class User(db.Model):
     def login(cls, email, password):
         user = cls.query.filter_by(email=email).first()
         if user and user.check_password(password):
+            # Upgrade hashes made with an old work factor while we have the password
+            if password_hasher.needs_rehash(user.password_hash):
+                try:
+                    user.password_hash = password_hasher.hash(password)
+                    db.session.commit()
+                except PasswordPoolSaturated:
+                    pass  # Try again on a later login
             return user
         raise ValueError("Invalid email or password")
 
@@ -3,6 +3,11 @@ from datetime import datetime
 
 class USSDSession(db.Model):
     __tablename__ = 'ussd_sessions'
+    __table_args__ = (
+        db.Index('ix_ussd_sessions_phone_number_created_at', 'phone_number', 'created_at'),
+        db.Index('ix_ussd_sessions_status_created_at', 'status', 'created_at'),
+        db.Index('ix_ussd_sessions_created_at', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.String(100), nullable=False, unique=True)  # Unique identifier for the session
     phone_number = db.Column(db.String(20), nullable=False)  # Phone number of the user
@@ -3,6 +3,11 @@ from datetime import datetime
 
 class VoiceCall(db.Model):
     __tablename__ = 'voice_calls'
+    __table_args__ = (
+        db.Index('ix_voice_calls_caller_number_initiated_at', 'caller_number', 'initiated_at'),
+        db.Index('ix_voice_calls_receiver_number_initiated_at', 'receiver_number', 'initiated_at'),
+        db.Index('ix_voice_calls_initiated_at', 'initiated_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     call_id = db.Column(db.String(100), nullable=False, unique=True)  # Unique identifier for the call
     caller_number = db.Column(db.String(20), nullable=False)  # Phone number of the caller
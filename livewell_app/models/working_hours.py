@@ -0,0 +1,20 @@
+from livewell_app import db
+
+class WorkingHours(db.Model):
+    __tablename__ = 'working_hours'
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), nullable=False, index=True)  # Doctor this template belongs to
+    weekday = db.Column(db.Integer, nullable=False)  # 0 = Monday ... 6 = Sunday
+    start_time = db.Column(db.Time, nullable=False)  # Start of the working window
+    end_time = db.Column(db.Time, nullable=False)  # End of the working window
+    slot_minutes = db.Column(db.Integer, nullable=False, default=30)  # Length of one appointment slot
+
+    def __init__(self, doctor_id, weekday, start_time, end_time, slot_minutes=30):
+        self.doctor_id = doctor_id
+        self.weekday = weekday
+        self.start_time = start_time
+        self.end_time = end_time
+        self.slot_minutes = slot_minutes
+
+    def __repr__(self):
+        return f"<WorkingHours doctor={self.doctor_id} weekday={self.weekday} {self.start_time}-{self.end_time}>"
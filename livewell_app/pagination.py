@@ -0,0 +1,118 @@
+import base64
+import json
+from collections import namedtuple
+from datetime import date, datetime
+
+from flask import current_app, request
+from sqlalchemy import and_, or_
+
+Page = namedtuple('Page', ['items', 'next_cursor'])
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+class PaginationError(ValueError):
+    pass
+
+
+# Encode the position of the last row of a page as an opaque, URL-safe token
+def encode_cursor(*values):
+    payload = []
+    for value in values:
+        if isinstance(value, (datetime, date)):
+            value = value.isoformat()
+        payload.append(value)
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        raise PaginationError('Invalid cursor')
+    if not isinstance(payload, list):
+        raise PaginationError('Invalid cursor')
+    return payload
+
+
+def get_limit():
+    default = current_app.config.get('PAGINATION_DEFAULT_LIMIT', DEFAULT_LIMIT)
+    maximum = current_app.config.get('PAGINATION_MAX_LIMIT', MAX_LIMIT)
+    try:
+        limit = int(request.args.get('limit', default))
+    except ValueError:
+        raise PaginationError('limit must be an integer')
+    if limit < 1:
+        raise PaginationError('limit must be positive')
+    return min(limit, maximum)
+
+
+def _parse_sort_value(sort_column, value):
+    if value is None:
+        return None
+    python_type = getattr(sort_column.type, 'python_type', None)
+    try:
+        if python_type is datetime:
+            return datetime.fromisoformat(value)
+        if python_type is date:
+            return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise PaginationError('Invalid cursor')
+    return value
+
+
+# Rows strictly after (sort_value, last_id) in descending (sort_key, id) order.
+# NULL sort keys come last on MySQL and SQLite when ordering descending;
+# pass nulls=False when the query cannot return them (a NOT NULL column or
+# a range filter on it), since the extra OR branch can stop the optimizer
+# from reading the index in order.
+def keyset_after(sort_column, id_column, sort_value, last_id, nulls=True):
+    if sort_value is None:
+        return and_(sort_column.is_(None), id_column < last_id)
+    # The leading <= gives the optimizer a range bound on the sort column
+    after = and_(sort_column <= sort_value, or_(sort_column < sort_value, id_column < last_id))
+    return or_(after, sort_column.is_(None)) if nulls else after
+
+
+# Keyset pagination over (sort_column, id_column), newest first.
+# Reads `after` and `limit` from the query string and fetches one extra row
+# to know whether another page exists, so the cost of a page does not depend
+# on how deep into the table the client is. `nulls` says whether rows with
+# a NULL sort key can be in the result; it defaults to the column's nullability.
+def paginate(query, id_column, sort_column=None, nulls=None):
+    limit = get_limit()
+    after = request.args.get('after')
+
+    if after:
+        values = decode_cursor(after)
+        try:
+            if sort_column is None:
+                (last_id,) = values
+                query = query.filter(id_column < int(last_id))
+            else:
+                sort_value, last_id = values
+                sort_value = _parse_sort_value(sort_column, sort_value)
+                if nulls is None:
+                    nulls = sort_column.nullable
+                query = query.filter(keyset_after(sort_column, id_column, sort_value, int(last_id), nulls))
+        except (TypeError, ValueError):
+            raise PaginationError('Invalid cursor')
+
+    if sort_column is None:
+        query = query.order_by(id_column.desc())
+    else:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        if sort_column is None:
+            next_cursor = encode_cursor(getattr(last, id_column.key))
+        else:
+            next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+    return Page(rows, next_cursor)
@@ -0,0 +1,88 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+import bcrypt
+
+
+class PasswordPoolSaturated(Exception):
+    pass
+
+
+# These run in the worker processes
+def _hash_password(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check_password(password_hash, password):
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    except ValueError:
+        return False
+
+
+# Runs bcrypt on a bounded process pool so password work never pins the
+# request threads. At most PASSWORD_POOL_MAX_PENDING operations may be queued
+# or running; beyond that callers get PasswordPoolSaturated immediately and
+# the API answers 503 instead of queueing behind the spike.
+class PasswordHasher:
+    def __init__(self, app=None):
+        self.rounds = 12
+        self.workers = os.cpu_count() or 1
+        self.max_pending = self.workers * 4
+        self.timeout = 10
+        self._pool = None
+        self._pool_pid = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.rounds = app.config.get('BCRYPT_LOG_ROUNDS', 12)
+        self.workers = app.config.get('PASSWORD_POOL_WORKERS') or os.cpu_count() or 1
+        self.max_pending = app.config.get('PASSWORD_POOL_MAX_PENDING') or self.workers * 4
+        self.timeout = app.config.get('PASSWORD_POOL_TIMEOUT', 10)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        app.extensions['password_hasher'] = self
+
+    # Created lazily, and again after a fork, so every server worker owns its pool
+    def _get_pool(self):
+        if self._pool is None or self._pool_pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pool_pid != os.getpid():
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                    self._pool_pid = os.getpid()
+        return self._pool
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordPoolSaturated('Password hashing is at capacity')
+        try:
+            future = self._get_pool().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise PasswordPoolSaturated('Password hashing timed out')
+
+    def hash(self, password):
+        return self._run(_hash_password, password, self.rounds)
+
+    def check(self, password_hash, password):
+        if not password_hash:
+            return False
+        return self._run(_check_password, password_hash, password)
+
+    # True when a stored hash was made with a different work factor
+    def needs_rehash(self, password_hash):
+        try:
+            return int(password_hash.split('$')[2]) != self.rounds
+        except (AttributeError, IndexError, ValueError):
+            return False
+
+
+password_hasher = PasswordHasher()
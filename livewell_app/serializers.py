@@ -0,0 +1,177 @@
+from datetime import date, datetime
+from operator import attrgetter, itemgetter
+
+from flask import current_app, request
+
+from livewell_app.models.appointment import Appointment
+from livewell_app.models.doctors import Doctor
+from livewell_app.models.medical_record import MedicalRecord
+from livewell_app.models.phone import Phone
+from livewell_app.models.sms_log import SMSLog
+from livewell_app.models.user import User
+from livewell_app.models.ussd_session import USSDSession
+from livewell_app.models.voice_call_log import VoiceCall
+
+try:
+    import orjson
+except ImportError:  # optional; falls back to the Flask JSON provider
+    orjson = None
+
+
+class FieldsError(ValueError):
+    pass
+
+
+# Same output as strftime('%Y-%m-%d %H:%M:%S') without interpreting a format
+# string for every value
+def format_datetime(value):
+    return value.isoformat(' ', 'seconds')
+
+
+def format_date(value):
+    return value.isoformat()
+
+
+def _converter(column):
+    python_type = getattr(column.type, 'python_type', None)
+    if python_type is datetime:
+        return format_datetime
+    if python_type is date:
+        return format_date
+    return None
+
+
+# Dump function for a fixed field set. `read` turns a field's position and
+# name into its getter: attrgetter for ORM objects, itemgetter for projected
+# rows. Converters are skipped for NULLs.
+def _dumper(fields, read, converters):
+    getters = tuple((name, read(i, name), converters.get(name)) for i, name in enumerate(fields))
+
+    def dump(source):
+        result = {}
+        for name, getter, convert in getters:
+            value = getter(source)
+            result[name] = value if convert is None or value is None else convert(value)
+        return result
+    return dump
+
+
+# Serializer for one model, built at import. `fields` is the full output of a
+# single object, `list_fields` the default for list endpoints. Dump functions
+# are built per field set and cached.
+class Serializer:
+    def __init__(self, model, fields, list_fields=None, sort_column=None):
+        self.model = model
+        self.fields = tuple(fields)
+        self.list_fields = tuple(list_fields or fields)
+        self.columns = {name: getattr(model, name) for name in self.fields}
+        self.converters = {name: _converter(column) for name, column in self.columns.items()}
+        # Always selected so keyset pagination can build its cursor
+        self.required = ('id',) + ((sort_column.key,) if sort_column is not None else ())
+        self._object_dumpers = {}
+        self._row_dumpers = {}
+        self._object_dumper(self.fields)
+        self._row_dumper(self.list_fields)
+
+    def _object_dumper(self, fields):
+        dumper = self._object_dumpers.get(fields)
+        if dumper is None:
+            dumper = _dumper(fields, lambda i, name: attrgetter(name), self.converters)
+            self._object_dumpers[fields] = dumper
+        return dumper
+
+    # Rows are selected as fields + any required column not already in them,
+    # so the first len(fields) positions line up with the output
+    def _row_dumper(self, fields):
+        dumper = self._row_dumpers.get(fields)
+        if dumper is None:
+            dumper = _dumper(fields, lambda i, name: itemgetter(i), self.converters)
+            self._row_dumpers[fields] = dumper
+        return dumper
+
+    def dump(self, obj, fields=None):
+        return self._object_dumper(tuple(fields) if fields else self.fields)(obj)
+
+    # ?fields=a,b,c validated against this model; defaults to list_fields
+    def requested_fields(self):
+        raw = request.args.get('fields')
+        if not raw:
+            return self.list_fields
+        fields = tuple(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+        unknown = [name for name in fields if name not in self.columns]
+        if unknown or not fields:
+            raise FieldsError(f"Unknown fields: {', '.join(unknown) or raw}; "
+                              f"choose from {', '.join(self.fields)}")
+        return fields
+
+    # Core column projection: only the requested (plus cursor) columns are
+    # fetched and rows come back as tuples instead of ORM objects
+    def project(self, query, fields):
+        names = fields + tuple(name for name in self.required if name not in fields)
+        return query.with_entities(*(getattr(self.model, name) for name in names))
+
+    def dump_rows(self, rows, fields):
+        dumper = self._row_dumper(fields)
+        return [dumper(row) for row in rows]
+
+
+def encode_json(payload):
+    if orjson is not None:
+        return orjson.dumps(payload, default=current_app.json.default)
+    return current_app.json.dumps(payload).encode('utf-8')
+
+
+def json_response(payload, status=200):
+    return current_app.response_class(encode_json(payload), status=status, mimetype='application/json')
+
+
+user_serializer = Serializer(
+    User,
+    ('id', 'name', 'email', 'role', 'date_of_birth', 'contact_number', 'address',
+     'is_doctor', 'specialty', 'medical_history', 'created_at'),
+    list_fields=('id', 'name', 'email', 'role', 'created_at'),
+    sort_column=User.created_at
+)
+USER_SUMMARY_FIELDS = ('id', 'name', 'email', 'role')
+
+sms_log_serializer = Serializer(
+    SMSLog,
+    ('id', 'phone_number', 'message', 'status', 'sent_at', 'message_id'),
+    sort_column=SMSLog.sent_at
+)
+
+voice_call_serializer = Serializer(
+    VoiceCall,
+    ('id', 'call_id', 'caller_number', 'receiver_number', 'call_status', 'duration',
+     'recording_url', 'failure_reason', 'initiated_at', 'terminated_at'),
+    sort_column=VoiceCall.initiated_at
+)
+
+ussd_session_serializer = Serializer(
+    USSDSession,
+    ('id', 'session_id', 'phone_number', 'session_data', 'status', 'created_at'),
+    sort_column=USSDSession.created_at
+)
+
+appointment_serializer = Serializer(
+    Appointment,
+    ('id', 'doctor_id', 'patient_id', 'patient_name', 'doctor_name', 'appointment_time', 'status', 'notes'),
+    sort_column=Appointment.appointment_time
+)
+
+medical_record_serializer = Serializer(
+    MedicalRecord,
+    ('id', 'patient_id', 'doctor_id', 'diagnosis', 'treatment', 'notes', 'recorded_at'),
+    sort_column=MedicalRecord.recorded_at
+)
+
+phone_serializer = Serializer(
+    Phone,
+    ('id', 'user_id', 'phone_number', 'type', 'is_primary', 'created_at'),
+    sort_column=Phone.created_at
+)
+
+doctor_serializer = Serializer(
+    Doctor,
+    ('id', 'name', 'email', 'contact_number', 'specialty', 'bio_data')
+)
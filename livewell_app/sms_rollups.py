@@ -0,0 +1,314 @@
+import atexit
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func, inspect, select
+
+from livewell_app.extensions import db
+from livewell_app.models.sms_log import SMSLog
+from livewell_app.models.sms_rollup import SMSHourlyStat
+
+ROLLUP_KEY = ('hour', 'prefix', 'status')
+ROLLUP_SOURCE_COLUMNS = ('sent_at', 'phone_number', 'status')
+# session.info entry holding the deltas of the session's open transaction
+SESSION_DELTAS = 'sms_rollup_deltas'
+
+
+def hour_floor(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def hour_ceil(value):
+    floor = hour_floor(value)
+    return floor if floor == value else floor + timedelta(hours=1)
+
+
+# SQL expression truncating sent_at to the hour, per dialect
+def _hour_expression(dialect, column):
+    if dialect == 'mysql':
+        return func.date_format(column, '%Y-%m-%d %H:00:00')
+    if dialect == 'postgresql':
+        return func.date_trunc('hour', column)
+    return func.strftime('%Y-%m-%d %H:00:00', column)
+
+
+def _keep_history(target, value, oldvalue, initiator):
+    return value
+
+
+def _insert_statement(dialect, table):
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table)
+        return stmt.on_duplicate_key_update(count=table.c.count + stmt.inserted['count'])
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=list(ROLLUP_KEY),
+        set_={'count': table.c.count + stmt.excluded['count']}
+    )
+
+
+# Hourly SMS counts by (hour, phone-number prefix, status), following the
+# writes to sms_logs:
+#   - ORM inserts, updates and deletes of SMSLog, through an after_flush hook
+#   - SMSLog.bulk_insert and the delivery-report flush, which write with Core
+#     and report their changes explicitly
+# Deltas are summed per key for the writer's transaction and, once it
+# commits, added to a per-process buffer (a rollback drops them). A
+# background thread applies the buffer every SMS_ROLLUP_FLUSH_INTERVAL
+# seconds as one upsert executemany in key order, in its own transaction,
+# so SMS writes and delivery-report flushes never queue on a hot rollup row.
+# Deltas still buffered when a process dies are lost; `rebuild` recomputes
+# any range from raw rows. Rows without a sent_at belong to no hour and are
+# never counted, as in `rebuild`.
+class SMSRollups:
+    def __init__(self):
+        self.app = None
+        self.prefix_length = 6
+        self.flush_interval = 1.0
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+        self.prefix_length = app.config.get('SMS_ROLLUP_PREFIX_LENGTH', 6)
+        self.flush_interval = app.config.get('SMS_ROLLUP_FLUSH_INTERVAL', 1.0)
+        with self._lock:
+            self._pending = Counter()
+        if not event.contains(db.session, 'after_flush', self._after_flush):
+            event.listen(db.session, 'after_flush', self._after_flush)
+            event.listen(db.session, 'after_commit', self._after_commit)
+            event.listen(db.session, 'after_rollback', self._after_rollback)
+            # Load the old value when one of these is set on an expired
+            # object, so the flush can tell which rollup row it came from
+            for name in ROLLUP_SOURCE_COLUMNS:
+                event.listen(getattr(SMSLog, name), 'set', _keep_history, active_history=True)
+            atexit.register(self._flush_at_exit)
+        app.extensions['sms_rollups'] = self
+
+    # None for a row without a sent_at
+    def key(self, sent_at, phone_number, status):
+        if sent_at is None:
+            return None
+        return hour_floor(sent_at), (phone_number or '')[:self.prefix_length], status
+
+    def apply(self, deltas, connection=None):
+        deltas = {key: count for key, count in deltas.items() if key is not None and count}
+        rows = [dict(zip(ROLLUP_KEY, key), count=count) for key, count in sorted(deltas.items())]
+        if not rows:
+            return
+        connection = connection or db.session.connection()
+        connection.execute(_insert_statement(connection.dialect.name, SMSHourlyStat.__table__), rows)
+
+    # Add deltas to the session's open transaction
+    def _collect(self, session, deltas):
+        session.info.setdefault(SESSION_DELTAS, Counter()).update(deltas)
+
+    def _after_commit(self, session):
+        deltas = session.info.pop(SESSION_DELTAS, None)
+        if deltas:
+            with self._lock:
+                self._pending.update(deltas)
+            self._ensure_flusher()
+
+    def _after_rollback(self, session):
+        session.info.pop(SESSION_DELTAS, None)
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    # Apply the committed deltas buffered so far; must run inside an app
+    # context. Returns the number of keys written.
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                deltas, self._pending = self._pending, Counter()
+            if not deltas:
+                return 0
+            try:
+                self.apply(deltas)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                with self._lock:
+                    self._pending.update(deltas)
+                raise
+            return len(deltas)
+
+    def _ensure_flusher(self):
+        if self.app is None or (self._thread is not None and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='sms-rollup-flusher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            if not self.pending():
+                continue
+            with self.app.app_context():
+                try:
+                    self.flush()
+                except Exception:
+                    self.app.logger.exception('Failed to apply SMS rollup deltas')
+                finally:
+                    db.session.remove()
+
+    def _flush_at_exit(self):
+        if self.app is not None and self.pending():
+            with self.app.app_context():
+                try:
+                    self.flush()
+                except Exception:
+                    self.app.logger.exception('Failed to apply SMS rollup deltas at exit')
+
+    # Rows are the dicts passed to SMSLog.bulk_insert
+    def record_inserts(self, rows):
+        self._collect(db.session, Counter(self.key(row.get('sent_at'), row['phone_number'], row['status']) for row in rows))
+
+    # Rows are (sent_at, phone_number, old status) read before an UPDATE
+    # sets them all to `status`
+    def record_status_change(self, rows, status):
+        deltas = Counter()
+        for sent_at, phone_number, old_status in rows:
+            if old_status != status:
+                deltas[self.key(sent_at, phone_number, old_status)] -= 1
+                deltas[self.key(sent_at, phone_number, status)] += 1
+        self._collect(db.session, deltas)
+
+    def _previous_key(self, obj):
+        state = inspect(obj)
+        values = []
+        for name in ROLLUP_SOURCE_COLUMNS:
+            history = state.attrs[name].history
+            if history.deleted:
+                values.append(history.deleted[0])
+            elif history.unchanged:
+                values.append(history.unchanged[0])
+            else:
+                values.append(getattr(obj, name))
+        return self.key(*values)
+
+    def _after_flush(self, session, flush_context):
+        deltas = Counter()
+        for obj in session.new:
+            if isinstance(obj, SMSLog):
+                deltas[self.key(obj.sent_at, obj.phone_number, obj.status)] += 1
+        for obj in session.dirty:
+            if isinstance(obj, SMSLog) and session.is_modified(obj):
+                old_key = self._previous_key(obj)
+                new_key = self.key(obj.sent_at, obj.phone_number, obj.status)
+                if old_key != new_key:
+                    deltas[old_key] -= 1
+                    deltas[new_key] += 1
+        for obj in session.deleted:
+            if isinstance(obj, SMSLog):
+                deltas[self._previous_key(obj)] -= 1
+        if deltas:
+            self._collect(session, deltas)
+
+    # Recompute [start, end) from sms_logs, one window per transaction.
+    # Writes landing in a window while it is rebuilt, or still buffered, can
+    # be counted twice or not at all, so point this at ranges that are no
+    # longer receiving logs.
+    def rebuild(self, start, end, window=timedelta(days=1)):
+        start, end = hour_floor(start), hour_ceil(end)
+        table = SMSHourlyStat.__table__
+        logs = SMSLog.__table__
+        hours = 0
+        current = start
+        while current < end:
+            window_end = min(current + window, end)
+            try:
+                connection = db.session.connection()
+                hour = _hour_expression(connection.dialect.name, logs.c.sent_at)
+                prefix = func.substr(logs.c.phone_number, 1, self.prefix_length)
+                grouped = connection.execute(
+                    select(hour, prefix, logs.c.status, func.count())
+                    .where(logs.c.sent_at >= current, logs.c.sent_at < window_end)
+                    .group_by(hour, prefix, logs.c.status)
+                ).all()
+                connection.execute(table.delete().where(table.c.hour >= current, table.c.hour < window_end))
+                rows = [
+                    {'hour': hour_floor(hour_value), 'prefix': prefix_value or '', 'status': status, 'count': count}
+                    for hour_value, prefix_value, status, count in grouped
+                ]
+                if rows:
+                    connection.execute(table.insert(), rows)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            hours += len({row['hour'] for row in rows})
+            current = window_end
+        return hours
+
+
+sms_rollups = SMSRollups()
+
+
+# Carrier for a stored prefix: the longest configured prefix it starts with
+def carrier_for(prefix, carriers):
+    best = None
+    for carrier_prefix, name in carriers.items():
+        if prefix.startswith(carrier_prefix) and (best is None or len(carrier_prefix) > len(best[0])):
+            best = (carrier_prefix, name)
+    return best[1] if best else 'unknown'
+
+
+def _summary(by_status, success_statuses):
+    total = sum(by_status.values())
+    delivered = sum(count for status, count in by_status.items() if status in success_statuses)
+    return {
+        'total': total,
+        'by_status': dict(by_status),
+        'success_rate': round(delivered / total, 4) if total else None
+    }
+
+
+GROUPINGS = ('hour', 'day', 'prefix', 'carrier', 'status')
+
+
+# Totals and per-group counts for [start, end), read from the rollup table only
+def rollup_stats(start, end, group_by, carriers, success_statuses):
+    rows = db.session.execute(
+        select(SMSHourlyStat.hour, SMSHourlyStat.prefix, SMSHourlyStat.status, SMSHourlyStat.count)
+        .where(SMSHourlyStat.hour >= hour_floor(start), SMSHourlyStat.hour < hour_ceil(end))
+    ).all()
+
+    overall = Counter()
+    groups = {}
+    for hour, prefix, status, count in rows:
+        if not count:
+            continue
+        overall[status] += count
+        if group_by == 'hour':
+            group = hour.strftime('%Y-%m-%d %H:00:00')
+        elif group_by == 'day':
+            group = hour.strftime('%Y-%m-%d')
+        elif group_by == 'prefix':
+            group = prefix
+        elif group_by == 'carrier':
+            group = carrier_for(prefix, carriers)
+        else:
+            group = status
+        groups.setdefault(group, Counter())[status] += count
+
+    result = _summary(overall, success_statuses)
+    result['groups'] = [
+        dict(_summary(groups[group], success_statuses), key=group) for group in sorted(groups)
+    ]
+    return result
@@ -0,0 +1,68 @@
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import selectinload
+
+from livewell_app.models.appointment import Appointment
+from livewell_app.models.medical_record import MedicalRecord
+from livewell_app.models.user import User
+from livewell_app.pagination import PaginationError, decode_cursor, encode_cursor
+from livewell_app.serializers import appointment_serializer, medical_record_serializer, format_datetime
+
+# Event sources, by kind: (model, time column, serializer). Each one is read
+# with a single bounded query on its (patient_id, time) index.
+SOURCES = {
+    'appointment': (Appointment, Appointment.appointment_time, appointment_serializer),
+    'medical_record': (MedicalRecord, MedicalRecord.recorded_at, medical_record_serializer),
+}
+
+
+# The user with their phones: two queries however many phones there are
+def load_patient(user_id):
+    return User.query.options(selectinload(User.phones)).filter_by(id=user_id).first()
+
+
+def _parse_cursor(after):
+    values = decode_cursor(after)
+    try:
+        time_value, kind, last_id = values
+        return datetime.fromisoformat(time_value), kind, int(last_id)
+    except (TypeError, ValueError):
+        raise PaginationError('Invalid cursor')
+
+
+# Events of `kind` that come after the cursor in descending (time, kind, id)
+# order
+def _after(kind, time_column, id_column, cursor):
+    cursor_time, cursor_kind, cursor_id = cursor
+    if kind < cursor_kind:
+        return time_column <= cursor_time
+    if kind > cursor_kind:
+        return time_column < cursor_time
+    return or_(time_column < cursor_time, and_(time_column == cursor_time, id_column < cursor_id))
+
+
+# One page of a patient's appointments and medical records, newest first.
+# Every source fetches at most limit + 1 rows past the cursor and the results
+# are merged in memory, so a page costs one query per source regardless of
+# how much history the patient has.
+def timeline_page(user_id, limit, after=None):
+    cursor = _parse_cursor(after) if after else None
+    events = []
+    for kind, (model, time_column, serializer) in SOURCES.items():
+        query = model.query.filter(model.patient_id == user_id)
+        if cursor is not None:
+            query = query.filter(_after(kind, time_column, model.id, cursor))
+        query = serializer.project(query, serializer.fields)
+        rows = query.order_by(time_column.desc(), model.id.desc()).limit(limit + 1).all()
+        for row, data in zip(rows, serializer.dump_rows(rows, serializer.fields)):
+            events.append((getattr(row, time_column.key), kind, row.id, data))
+
+    events.sort(key=lambda event: event[:3], reverse=True)
+    page = events[:limit]
+    next_cursor = None
+    if len(events) > limit:
+        last_time, last_kind, last_id, _ = page[-1]
+        next_cursor = encode_cursor(last_time, last_kind, last_id)
+    return [{'type': kind, 'time': format_datetime(time), 'data': data}
+            for time, kind, _, data in page], next_cursor
@@ -0,0 +1,201 @@
+import json
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+
+from livewell_app.models.appointment import Appointment
+from livewell_app.models.doctors import Doctor
+from livewell_app.models.user import User
+
+# Default menu. Static nodes have `text` and either `options` (key, label,
+# next node) or `end: true`; dynamic nodes name a registered `callback`.
+DEFAULT_MENU = {
+    'start': 'main',
+    'invalid_text': 'Invalid choice.',
+    'nodes': {
+        'main': {
+            'text': 'Welcome to LiveWell',
+            'options': [
+                {'key': '1', 'label': 'My appointments', 'next': 'appointments'},
+                {'key': '2', 'label': 'Find a doctor', 'next': 'specialties'},
+                {'key': '3', 'label': 'Health tips', 'next': 'tips'},
+            ],
+        },
+        'appointments': {'callback': 'list_appointments'},
+        'specialties': {'callback': 'list_specialties'},
+        'tips': {
+            'text': 'Drink clean water, sleep well and keep your appointments. Dial again for more.',
+            'end': True,
+        },
+    },
+}
+
+# Dynamic node callbacks: fn(session, user_input) -> (text, end)
+CALLBACKS = {}
+
+
+class MenuError(ValueError):
+    pass
+
+
+def ussd_callback(name):
+    def decorator(fn):
+        CALLBACKS[name] = fn
+        return fn
+    return decorator
+
+
+def _render(text, end):
+    return ('END ' if end else 'CON ') + text
+
+
+# Compile a menu definition into a transition table keyed by (state, input)
+# and pre-rendered responses for every static node. Unknown targets and
+# unregistered callbacks fail here, at startup, rather than mid-session.
+class CompiledMenu:
+    def __init__(self, definition, callbacks=None):
+        callbacks = CALLBACKS if callbacks is None else callbacks
+        nodes = definition.get('nodes') or {}
+        self.start = definition.get('start')
+        if self.start not in nodes:
+            raise MenuError(f"Start node '{self.start}' is not defined")
+
+        self.transitions = {}
+        self.rendered = {}
+        self.invalid = {}
+        self.callbacks = {}
+        invalid_text = definition.get('invalid_text', 'Invalid choice.')
+
+        for name, node in nodes.items():
+            if 'callback' in node:
+                if node['callback'] not in callbacks:
+                    raise MenuError(f"Node '{name}' uses unregistered callback '{node['callback']}'")
+                self.callbacks[name] = callbacks[node['callback']]
+                continue
+
+            options = node.get('options') or []
+            if not options and not node.get('end'):
+                raise MenuError(f"Node '{name}' needs options or end: true")
+            lines = [node.get('text', '')]
+            for option in options:
+                if option['next'] not in nodes:
+                    raise MenuError(f"Node '{name}' option {option['key']} points to unknown node '{option['next']}'")
+                self.transitions[(name, str(option['key']))] = option['next']
+                lines.append(f"{option['key']}. {option['label']}")
+            body = '\n'.join(line for line in lines if line)
+            self.rendered[name] = _render(body, node.get('end', False))
+            if options:
+                self.invalid[name] = _render(f'{invalid_text}\n{body}', False)
+
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    # Resolve one hop: (state, input) -> next state in a single dict lookup.
+    # A session without a state (new or lost) replays `path`, the full
+    # '*'-joined input the gateway sends, from the start node.
+    def handle(self, session, user_input, path=None):
+        started = time.perf_counter()
+        state = session.get('menu_state')
+
+        if state is None:
+            state = self.start
+            for step in (path.split('*') if path else []):
+                state = self.transitions.get((state, step), state)
+            text = self._render_state(state, session, user_input)
+        else:
+            next_state = self.transitions.get((state, user_input))
+            if next_state is None:
+                text = self.invalid.get(state) or self._render_state(state, session, user_input)
+            else:
+                state = next_state
+                text = self._render_state(state, session, user_input)
+
+        session['menu_state'] = state
+        render_ms = (time.perf_counter() - started) * 1000
+        self._record(state, render_ms)
+        return text, render_ms
+
+    def _render_state(self, state, session, user_input):
+        if state in self.callbacks:
+            text, end = self.callbacks[state](session, user_input)
+            return _render(text, end)
+        return self.rendered[state]
+
+    def _record(self, state, render_ms):
+        with self._stats_lock:
+            stats = self._stats.setdefault(state, {'hops': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            stats['hops'] += 1
+            stats['total_ms'] += render_ms
+            stats['max_ms'] = max(stats['max_ms'], render_ms)
+
+    # Per-node hop count, mean and max render time in milliseconds
+    def stats(self):
+        with self._stats_lock:
+            return {
+                state: {
+                    'hops': s['hops'],
+                    'mean_ms': round(s['total_ms'] / s['hops'], 3),
+                    'max_ms': round(s['max_ms'], 3),
+                }
+                for state, s in self._stats.items()
+            }
+
+
+def load_menu_definition(path):
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise MenuError('PyYAML is required to load YAML USSD menus')
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def init_ussd_menu(app):
+    path = app.config.get('USSD_MENU_PATH')
+    definition = load_menu_definition(path) if path else DEFAULT_MENU
+    menu = CompiledMenu(definition)
+    app.extensions['ussd_menu'] = menu
+    return menu
+
+
+def get_ussd_menu():
+    return current_app.extensions['ussd_menu']
+
+
+@ussd_callback('list_appointments')
+def list_appointments(session, user_input):
+    user = User.query.filter_by(contact_number=session['phone_number']).first()
+    if user is None:
+        return 'We could not find an account for this number.', True
+    appointments = (
+        Appointment.query
+        .filter(Appointment.patient_id == user.id, Appointment.appointment_time >= datetime.utcnow())
+        .order_by(Appointment.appointment_time)
+        .limit(5)
+        .all()
+    )
+    if not appointments:
+        return 'You have no upcoming appointments.', True
+    lines = ['Upcoming appointments:']
+    for appointment in appointments:
+        lines.append(f"{appointment.appointment_time.strftime('%d %b %H:%M')} - {appointment.doctor_name}")
+    return '\n'.join(lines), True
+
+
+@ussd_callback('list_specialties')
+def list_specialties(session, user_input):
+    specialties = [
+        specialty for (specialty,) in
+        Doctor.query.with_entities(Doctor.specialty)
+        .filter(Doctor.specialty.isnot(None))
+        .distinct()
+        .order_by(Doctor.specialty)
+        .limit(8)
+    ]
+    if not specialties:
+        return 'No doctors are listed yet.', True
+    return 'Our doctors cover:\n' + '\n'.join(specialties), True
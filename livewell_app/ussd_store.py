@@ -0,0 +1,241 @@
+import atexit
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+
+from flask import current_app
+
+from livewell_app.extensions import db
+from livewell_app.models.ussd_session import USSDSession
+
+TERMINAL_STATUSES = ('completed', 'terminated', 'timeout', 'failed')
+
+
+def new_session(session_id, phone_number, service_code=None, session_data=None, status='active'):
+    now = datetime.utcnow()
+    return {
+        'session_id': session_id,
+        'phone_number': phone_number,
+        'service_code': service_code,
+        'session_data': session_data,
+        'status': status,
+        'created_at': now,
+        'updated_at': now,
+    }
+
+
+# Write finished sessions to ussd_sessions in one transaction, updating rows
+# that were already persisted (e.g. created through the admin API)
+def persist_sessions(sessions):
+    if not sessions:
+        return
+    existing = {
+        row.session_id: row
+        for row in USSDSession.query.filter(USSDSession.session_id.in_([s['session_id'] for s in sessions]))
+    }
+    for session in sessions:
+        row = existing.get(session['session_id'])
+        if row is None:
+            row = USSDSession(session_id=session['session_id'], phone_number=session['phone_number'])
+            row.created_at = session['created_at']
+            db.session.add(row)
+        row.phone_number = session['phone_number']
+        row.session_data = session['session_data']
+        row.status = session['status']
+        row.service_code = session['service_code']
+        if session['status'] in TERMINAL_STATUSES:
+            row.terminated_at = session.get('terminated_at') or datetime.utcnow()
+    db.session.commit()
+
+
+# Interface for USSD session storage. A shared backend (e.g. Redis with
+# SETEX/EXPIRE per session) implements the same four methods; sessions are
+# plain dicts as built by new_session(), so they serialize as-is.
+class SessionStore(ABC):
+    @abstractmethod
+    def get(self, session_id):
+        pass
+
+    @abstractmethod
+    def put(self, session, ttl=None):
+        pass
+
+    # Remove a session from the store and persist it with a final status
+    @abstractmethod
+    def complete(self, session_id, status='completed'):
+        pass
+
+    # Persist and drop sessions whose TTL has passed
+    @abstractmethod
+    def sweep(self):
+        pass
+
+
+# Default in-process backend: an LRU-ordered dict with a per-session deadline.
+# Expired or evicted sessions get status 'timeout'. get() and put() only move
+# them (a few at a time) to a pending list; the background sweep persists
+# that list and any other expired sessions every sweep_interval seconds, so
+# a hop never waits on the database and dialogs that time out in a quiet
+# process still reach ussd_sessions.
+class MemorySessionStore(SessionStore):
+    def __init__(self, ttl=180, max_sessions=10000, sweep_limit=100, sweep_interval=15, app=None):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.sweep_limit = sweep_limit
+        self.sweep_interval = sweep_interval
+        self.app = app
+        self._sessions = OrderedDict()
+        self._pending = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, session_id):
+        expired = None
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            expires_at, session = entry
+            if expires_at <= time.monotonic():
+                del self._sessions[session_id]
+                expired = session
+            else:
+                self._sessions.move_to_end(session_id)
+        if expired is not None:
+            self._timeout([expired])
+            return None
+        return session
+
+    # Timed-out sessions not yet persisted
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def put(self, session, ttl=None):
+        session['updated_at'] = datetime.utcnow()
+        evicted = []
+        with self._lock:
+            self._sessions[session['session_id']] = (time.monotonic() + (ttl or self.ttl), session)
+            self._sessions.move_to_end(session['session_id'])
+            while len(self._sessions) > self.max_sessions:
+                _, (_, oldest) = self._sessions.popitem(last=False)
+                evicted.append(oldest)
+        evicted.extend(self._pop_expired(self.sweep_limit))
+        self._timeout(evicted)
+        self._ensure_sweeper()
+        return session
+
+    def complete(self, session_id, status='completed'):
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+        if entry is None:
+            return None
+        session = entry[1]
+        session['status'] = status
+        session['terminated_at'] = datetime.utcnow()
+        persist_sessions([session])
+        return session
+
+    # Must run inside an app context; sessions that fail to persist are kept
+    # for the next sweep
+    def sweep(self):
+        self._timeout(self._pop_expired(None))
+        with self._lock:
+            sessions, self._pending = self._pending, []
+        try:
+            persist_sessions(sessions)
+        except Exception:
+            db.session.rollback()
+            with self._lock:
+                self._pending[:0] = sessions
+            raise
+
+    def _ensure_sweeper(self):
+        if self.app is None or self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='ussd-session-sweeper', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            if not self._sessions and not self.pending():
+                continue
+            with self.app.app_context():
+                try:
+                    self.sweep()
+                except Exception:
+                    self.app.logger.exception('Failed to persist expired USSD sessions')
+                finally:
+                    db.session.remove()
+
+    # Persist whatever is still live, e.g. on shutdown, keeping its status
+    def drain(self):
+        with self._lock:
+            sessions = self._pending + [session for _, session in self._sessions.values()]
+            self._pending = []
+            self._sessions.clear()
+        persist_sessions(sessions)
+
+    # Least recently used sessions sit at the front, so expired ones are
+    # found there; stop at the first live one to keep the hot path cheap
+    def _pop_expired(self, limit):
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            while self._sessions and (limit is None or len(expired) < limit):
+                session_id, (expires_at, session) = next(iter(self._sessions.items()))
+                if expires_at > now:
+                    break
+                del self._sessions[session_id]
+                expired.append(session)
+        return expired
+
+    # Mark sessions timed out and queue them for the sweeper
+    def _timeout(self, sessions):
+        if not sessions:
+            return
+        for session in sessions:
+            session['status'] = 'timeout'
+            session['terminated_at'] = datetime.utcnow()
+        with self._lock:
+            self._pending.extend(sessions)
+
+
+SESSION_BACKENDS = {
+    'memory': MemorySessionStore,
+}
+
+
+def init_ussd_store(app):
+    backend = app.config.get('USSD_SESSION_BACKEND', 'memory')
+    if backend not in SESSION_BACKENDS:
+        raise ValueError(f"Unknown USSD_SESSION_BACKEND '{backend}'")
+    store = SESSION_BACKENDS[backend](
+        ttl=app.config.get('USSD_SESSION_TTL', 180),
+        max_sessions=app.config.get('USSD_SESSION_MAX', 10000),
+        sweep_interval=app.config.get('USSD_SESSION_SWEEP_INTERVAL', 15),
+        app=app
+    )
+    app.extensions['ussd_store'] = store
+
+    def drain_at_exit():
+        if hasattr(store, 'drain'):
+            with app.app_context():
+                try:
+                    store.drain()
+                except Exception:
+                    app.logger.exception('Failed to persist USSD sessions at exit')
+    atexit.register(drain_at_exit)
+    return store
+
+
+def get_session_store():
+    return current_app.extensions['ussd_store']
@@ -0,0 +1,96 @@
+"""add appointment duration
+
+Revision ID: 4e9a1c7d3b52
+Revises: d58e1c0f7a92
+Create Date: 2026-10-19 09:12:44.106000
+
+Stores each appointment's slot length so conflict checks compare against
+the length it was booked with, even after the doctor's working hours
+change. Existing rows get the slot length of the working-hours template
+covering their time, in bounded id-range batches committed on their own;
+rows no template covers keep the 30 minute default.
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4e9a1c7d3b52'
+down_revision = 'd58e1c0f7a92'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+appointments = sa.table(
+    'appointments',
+    sa.column('id', sa.Integer),
+    sa.column('doctor_id', sa.Integer),
+    sa.column('appointment_time', sa.DateTime),
+    sa.column('duration_minutes', sa.Integer),
+)
+working_hours = sa.table(
+    'working_hours',
+    sa.column('doctor_id', sa.Integer),
+    sa.column('weekday', sa.Integer),
+    sa.column('start_time', sa.Time),
+    sa.column('end_time', sa.Time),
+    sa.column('slot_minutes', sa.Integer),
+)
+
+
+def upgrade():
+    with op.batch_alter_table('appointments', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('duration_minutes', sa.Integer(), server_default='30', nullable=False))
+
+    _backfill(op.get_bind())
+
+
+def _slot_minutes(templates, doctor_id, when):
+    if isinstance(when, str):
+        when = datetime.fromisoformat(when)
+    for weekday, start_time, end_time, slot_minutes in templates.get(doctor_id, ()):
+        if weekday == when.weekday() and start_time <= when.time() < end_time:
+            return slot_minutes
+    return None
+
+
+def _backfill(bind):
+    templates = {}
+    for doctor_id, *template in bind.execute(sa.select(
+        working_hours.c.doctor_id, working_hours.c.weekday, working_hours.c.start_time,
+        working_hours.c.end_time, working_hours.c.slot_minutes
+    )):
+        templates.setdefault(doctor_id, []).append(tuple(template))
+    if not templates:
+        return
+    min_id, max_id = bind.execute(sa.select(sa.func.min(appointments.c.id), sa.func.max(appointments.c.id))).one()
+    if min_id is None:
+        return
+
+    with op.get_context().autocommit_block():
+        for start in range(min_id, max_id + 1, BATCH_SIZE):
+            rows = bind.execute(
+                sa.select(appointments.c.id, appointments.c.doctor_id, appointments.c.appointment_time)
+                .where(appointments.c.id >= start, appointments.c.id < start + BATCH_SIZE)
+                .where(appointments.c.doctor_id.in_(list(templates)))
+            ).all()
+            durations = {}
+            for row_id, doctor_id, appointment_time in rows:
+                slot_minutes = _slot_minutes(templates, doctor_id, appointment_time)
+                if slot_minutes is not None and slot_minutes != 30:
+                    durations[row_id] = slot_minutes
+            if durations:
+                bind.execute(
+                    appointments.update()
+                    .where(appointments.c.id.in_(sorted(durations)))
+                    .values(duration_minutes=sa.case(durations, value=appointments.c.id))
+                )
+
+
+def downgrade():
+    with op.batch_alter_table('appointments', schema=None) as batch_op:
+        batch_op.drop_column('duration_minutes')
@@ -0,0 +1,38 @@
+"""shard call stats rows
+
+Revision ID: 7c2e5b9d0f14
+Revises: 4e9a1c7d3b52
+Create Date: 2026-10-19 10:05:31.447000
+
+Every voice call write used to lock the day's totals row, so concurrent
+writers queued on it. Rows are now keyed by (day, number, shard); writers
+pick a random shard and readers merge a number's shards. Existing rows
+become shard 0.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2e5b9d0f14'
+down_revision = '4e9a1c7d3b52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('call_stats', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('shard', sa.Integer(), server_default='0', nullable=False))
+        batch_op.drop_constraint('uq_call_stats_day_number', type_='unique')
+        batch_op.create_unique_constraint('uq_call_stats_day_number_shard', ['day', 'number', 'shard'])
+
+
+# Only shard 0 survives; run `flask rebuild-call-analytics` for the affected
+# days afterwards to count the other shards' calls again
+def downgrade():
+    op.execute('DELETE FROM call_stats WHERE shard <> 0')
+    with op.batch_alter_table('call_stats', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_call_stats_day_number_shard', type_='unique')
+        batch_op.create_unique_constraint('uq_call_stats_day_number', ['day', 'number'])
+        batch_op.drop_column('shard')
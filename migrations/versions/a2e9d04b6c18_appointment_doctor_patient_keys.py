@@ -0,0 +1,127 @@
+"""appointment doctor and patient foreign keys
+
+Revision ID: a2e9d04b6c18
+Revises: 8c4f2e61a7d3
+Create Date: 2026-10-18 13:40:02.871000
+
+Adds nullable doctor_id/patient_id columns with (key, appointment_time)
+composite indexes, then backfills them from doctor_name/patient_name in
+bounded id-range batches. Each batch is a single UPDATE committed on its
+own (autocommit block), so no long-running transaction holds row locks on
+appointments while the migration runs. Names that match no row, or more
+than one, are left NULL for manual review.
+
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a2e9d04b6c18'
+down_revision = '8c4f2e61a7d3'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+appointments = sa.table(
+    'appointments',
+    sa.column('id', sa.Integer),
+    sa.column('doctor_name', sa.String),
+    sa.column('patient_name', sa.String),
+    sa.column('doctor_id', sa.Integer),
+    sa.column('patient_id', sa.Integer),
+)
+doctors = sa.table('doctors', sa.column('id', sa.Integer), sa.column('name', sa.String))
+users = sa.table('users', sa.column('id', sa.Integer), sa.column('name', sa.String))
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    with op.batch_alter_table('appointments', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('doctor_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('patient_id', sa.Integer(), nullable=True))
+        batch_op.create_index('ix_appointments_doctor_id_appointment_time', ['doctor_id', 'appointment_time'], unique=False)
+        batch_op.create_index('ix_appointments_patient_id_appointment_time', ['patient_id', 'appointment_time'], unique=False)
+
+    # The new columns are all NULL, so there is nothing to validate; with
+    # checks off MySQL adds the constraints in place instead of copying the table
+    if bind.dialect.name == 'mysql':
+        op.execute('SET foreign_key_checks = 0')
+    with op.batch_alter_table('appointments', schema=None) as batch_op:
+        batch_op.create_foreign_key('fk_appointments_doctor_id_doctors', 'doctors', ['doctor_id'], ['id'])
+        batch_op.create_foreign_key('fk_appointments_patient_id_users', 'users', ['patient_id'], ['id'])
+    if bind.dialect.name == 'mysql':
+        op.execute('SET foreign_key_checks = 1')
+
+    # Availability and conflict checks now go through doctor_id
+    with op.batch_alter_table('appointments', schema=None) as batch_op:
+        batch_op.drop_index('ix_appointments_doctor_name_appointment_time')
+
+    _backfill(bind)
+
+
+# name -> id for names that identify exactly one row
+def _unique_names(bind, table):
+    rows = bind.execute(
+        sa.select(table.c.name, sa.func.min(table.c.id))
+        .group_by(table.c.name)
+        .having(sa.func.count(table.c.id) == 1)
+    )
+    return {name: row_id for name, row_id in rows}
+
+
+def _backfill(bind):
+    doctor_ids = _unique_names(bind, doctors)
+    patient_ids = _unique_names(bind, users)
+    min_id, max_id = bind.execute(sa.select(sa.func.min(appointments.c.id), sa.func.max(appointments.c.id))).one()
+    if min_id is None:
+        return
+
+    unresolved = 0
+    with op.get_context().autocommit_block():
+        for start in range(min_id, max_id + 1, BATCH_SIZE):
+            rows = bind.execute(
+                sa.select(appointments.c.id, appointments.c.doctor_name, appointments.c.patient_name)
+                .where(appointments.c.id >= start, appointments.c.id < start + BATCH_SIZE)
+                .where(sa.or_(appointments.c.doctor_id.is_(None), appointments.c.patient_id.is_(None)))
+            ).all()
+
+            doctor_map = {}
+            patient_map = {}
+            for row_id, doctor_name, patient_name in rows:
+                if doctor_name in doctor_ids:
+                    doctor_map[row_id] = doctor_ids[doctor_name]
+                if patient_name in patient_ids:
+                    patient_map[row_id] = patient_ids[patient_name]
+                if doctor_name not in doctor_ids or patient_name not in patient_ids:
+                    unresolved += 1
+
+            ids = sorted(set(doctor_map) | set(patient_map))
+            if not ids:
+                continue
+            values = {}
+            if doctor_map:
+                values['doctor_id'] = sa.case(doctor_map, value=appointments.c.id, else_=appointments.c.doctor_id)
+            if patient_map:
+                values['patient_id'] = sa.case(patient_map, value=appointments.c.id, else_=appointments.c.patient_id)
+            bind.execute(appointments.update().where(appointments.c.id.in_(ids)).values(**values))
+
+    if unresolved:
+        logger.warning('%d appointments have a doctor or patient name that did not match exactly one row', unresolved)
+
+
+def downgrade():
+    with op.batch_alter_table('appointments', schema=None) as batch_op:
+        batch_op.create_index('ix_appointments_doctor_name_appointment_time', ['doctor_name', 'appointment_time'], unique=False)
+        batch_op.drop_constraint('fk_appointments_patient_id_users', type_='foreignkey')
+        batch_op.drop_constraint('fk_appointments_doctor_id_doctors', type_='foreignkey')
+        batch_op.drop_index('ix_appointments_patient_id_appointment_time')
+        batch_op.drop_index('ix_appointments_doctor_id_appointment_time')
+        batch_op.drop_column('patient_id')
+        batch_op.drop_column('doctor_id')
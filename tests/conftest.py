@@ -0,0 +1,26 @@
+import pytest
+
+from livewell_app import create_app
+from livewell_app.extensions import db
+
+
+# Extra config for the app; override in a test module to change it
+@pytest.fixture
+def app_config():
+    return {}
+
+
+@pytest.fixture
+def app(tmp_path, app_config):
+    app = create_app(dict({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'DB_REPLICA_URIS': [],
+    }, **app_config))
+    # Tables go on the primary only: db keeps a metadata for every bind it
+    # has seen, including another test's replicas
+    with app.app_context():
+        db.create_all(bind_key=None)
+        yield app
+        db.session.remove()
+        db.drop_all(bind_key=None)
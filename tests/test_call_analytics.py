@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+from livewell_app.call_analytics import call_analytics, compact, rebuild, record_call_created
+from livewell_app.extensions import db
+from livewell_app.models.call_stat import CallStat
+from livewell_app.models.voice_call_log import VoiceCall
+
+
+def _record_calls(count):
+    for i in range(count):
+        status = 'failed' if i % 5 == 0 else 'completed'
+        call = VoiceCall(f'call-{i}', '+256310000000', f'+2567000000{i % 3}', status,
+                         duration=10 + i, failure_reason='busy' if status == 'failed' else None)
+        call.initiated_at = datetime.utcnow()
+        db.session.add(call)
+        db.session.flush()
+        record_call_created(call)
+        db.session.commit()
+
+
+def _today():
+    today = datetime.utcnow().date()
+    return today, today + timedelta(days=1)
+
+
+# Writes spread over shards and leave percentiles unset; compaction folds
+# them into one row per number with the same totals and percentiles
+def test_compact_folds_shards_into_one_row(app):
+    _record_calls(40)
+    start, end = _today()
+    before = call_analytics(start, end)
+    assert CallStat.query.filter_by(number='').count() > 1
+    assert all(stat.p50 is None for stat in CallStat.query)
+
+    assert compact(start, end) == 1
+    rows = CallStat.query.filter_by(number='').all()
+    assert [row.shard for row in rows] == [0]
+    assert rows[0].p50 is not None
+    assert call_analytics(start, end) == before
+    assert before['calls'] == 40 and before['failed'] == 8 and before['duration']['samples'] == 40
+
+
+def test_writes_after_compaction_are_merged(app):
+    _record_calls(10)
+    start, end = _today()
+    compact(start, end)
+    late = VoiceCall('call-late', '+256310000000', '+256700000009', 'completed', duration=500)
+    late.initiated_at = datetime.utcnow()
+    db.session.add(late)
+    db.session.flush()
+    record_call_created(late)
+    db.session.commit()
+
+    report = call_analytics(start, end)
+    assert report['calls'] == 11
+    assert report['duration']['samples'] == 11
+    assert report['finished'] == 11
+
+
+def test_rebuild_matches_compacted_rows(app):
+    _record_calls(25)
+    start, end = _today()
+    compact(start, end)
+    compacted = call_analytics(start, end)
+    rebuild(start, end)
+    assert call_analytics(start, end) == compacted
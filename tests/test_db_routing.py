@@ -0,0 +1,83 @@
+import pytest
+
+from livewell_app.doctor_cache import doctor_directory_cache
+from livewell_app.extensions import db
+from livewell_app.models.doctors import Doctor
+
+DOCTORS = '/api/v1/doctors/doctors'
+NEW_DOCTOR = {'name': 'New', 'email': 'new@example.com', 'contact_number': '0700000003', 'bio_data': 'GP'}
+
+
+@pytest.fixture
+def app_config(tmp_path):
+    return {'DB_REPLICA_URIS': [f"sqlite:///{tmp_path / 'replica.db'}"], 'DB_REPLICA_STICKY_SECONDS': 5}
+
+
+# The replica starts out with the same schema but a different directory, so
+# every response shows which database it was read from
+@pytest.fixture
+def replica(app, monkeypatch):
+    engine = db.engines['replica0']
+    db.metadata.create_all(engine)
+    _add_doctor(db.engine, 'Primary', 'primary@example.com')
+    _add_doctor(engine, 'Replica', 'replica@example.com')
+    _forget_cache(monkeypatch)
+    yield engine
+    db.metadata.drop_all(engine)
+
+
+def _add_doctor(engine, name, email):
+    with engine.begin() as connection:
+        connection.execute(Doctor.__table__.insert().values(
+            name=name, email=email, contact_number='0700000000', bio_data='GP'))
+
+
+# The cache outlives the app; start from an empty one that was never bumped
+def _forget_cache(monkeypatch):
+    monkeypatch.setattr(doctor_directory_cache, 'bumped_at', None)
+    doctor_directory_cache._entries.clear()
+
+
+def _names(client):
+    response = client.get(DOCTORS)
+    assert response.status_code == 200
+    return sorted(doctor['name'] for doctor in response.get_json()['doctors'])
+
+
+def _replica_names(engine):
+    with engine.connect() as connection:
+        return [row.name for row in connection.execute(Doctor.__table__.select())]
+
+
+def test_reads_go_to_the_replica(app, replica):
+    assert _names(app.test_client()) == ['Replica']
+
+
+def test_writes_go_to_the_primary(app, replica):
+    response = app.test_client().post(DOCTORS, json=NEW_DOCTOR)
+    assert response.status_code == 201
+    assert 'livewell_primary' in response.headers['Set-Cookie']
+    assert [doctor.name for doctor in Doctor.query.order_by(Doctor.id)] == ['Primary', 'New']
+    assert _replica_names(replica) == ['Replica']
+
+
+# The sticky cookie alone keeps the writer on the primary; without it the
+# same client is back on the replica
+def test_read_after_write_stays_on_the_primary(app, replica, monkeypatch):
+    client = app.test_client()
+    client.post(DOCTORS, json=NEW_DOCTOR)
+    _forget_cache(monkeypatch)
+    assert _names(client) == ['New', 'Primary']
+
+    client.delete_cookie('livewell_primary')
+    _forget_cache(monkeypatch)
+    assert _names(client) == ['Replica']
+
+
+# After a bump the cache is refilled from the primary, even for a client
+# that never wrote, so a lagging replica can't put the old directory back
+def test_doctor_cache_refills_from_the_primary_after_a_bump(app, replica):
+    app.test_client().post(DOCTORS, json=NEW_DOCTOR)
+    reader = app.test_client()
+    assert _names(reader) == ['New', 'Primary']
+    assert _names(reader) == ['New', 'Primary']
@@ -0,0 +1,25 @@
+import pytest
+
+from livewell_app.commands import plan_problems
+from livewell_app.filters import INDEXED_FILTERS, PROBE_CURSOR, filter_combinations, probe_query
+
+COMBINATIONS = [
+    pytest.param(name, values, since, until, id=' '.join([name] + sorted(values) + (['since'] if since else [])))
+    for name, spec in INDEXED_FILTERS.items()
+    for values, since, until in filter_combinations(spec)
+]
+
+
+# Every filter an endpoint accepts, alone and combined, must be an index
+# range scan already in (time, id) order on both the first page and the
+# pages after a keyset cursor; a plan that scans the table or sorts fails
+@pytest.mark.parametrize('after', [None, PROBE_CURSOR], ids=['first-page', 'after-cursor'])
+@pytest.mark.parametrize('name, values, since, until', COMBINATIONS)
+def test_filter_uses_index(app, name, values, since, until, after):
+    query = probe_query(INDEXED_FILTERS[name], values, since, until, after)
+    assert plan_problems(query.statement) == []
+
+
+def test_combinations_cover_multiple_filters():
+    combined = [values for values, _, _ in filter_combinations(INDEXED_FILTERS['voice_calls']) if len(values) > 1]
+    assert combined == [{'caller_number': '0', 'receiver_number': '0'}] * 2
@@ -0,0 +1,79 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from livewell_app import idempotency
+from livewell_app.idempotency import FULL, IN_PROGRESS, NEW, REPLAY, MemoryIdempotencyStore
+from livewell_app.models.idempotency_key import IdempotencyKey
+from livewell_app.models.sms_log import SMSLog
+
+SMS_LOG = {'phone_number': '+256700000001', 'message': 'Hello', 'status': 'Sent'}
+
+
+@pytest.fixture(params=['memory', 'database'])
+def app_config(request):
+    return {'IDEMPOTENCY_BACKEND': request.param, 'IDEMPOTENCY_WAIT_TIMEOUT': 0.2}
+
+
+def _broken(*args, **kwargs):
+    raise OperationalError('UPDATE idempotency_keys', {}, Exception('connection lost'))
+
+
+# A flaky client without a token retrying a create gets the first response
+# back instead of a second row
+def test_anonymous_duplicate_create_is_replayed(app):
+    client = app.test_client()
+    headers = {'Idempotency-Key': 'retry-1'}
+    first = client.post('/api/v1/sms-logs/create', json=SMS_LOG, headers=headers)
+    second = client.post('/api/v1/sms-logs/create', json=SMS_LOG, headers=headers)
+    assert first.status_code == second.status_code == 201
+    assert second.headers['Idempotent-Replayed'] == 'true'
+    assert second.get_json() == first.get_json()
+    assert SMSLog.query.count() == 1
+
+
+def test_anonymous_key_with_another_body_is_rejected(app):
+    client = app.test_client()
+    headers = {'Idempotency-Key': 'retry-2'}
+    client.post('/api/v1/sms-logs/create', json=SMS_LOG, headers=headers)
+    response = client.post('/api/v1/sms-logs/create', json=dict(SMS_LOG, message='Other'), headers=headers)
+    assert response.status_code == 422
+    assert SMSLog.query.count() == 1
+
+
+def test_keys_in_progress_are_never_evicted():
+    store = MemoryIdempotencyStore(max_keys=2, wait_timeout=0, lock_timeout=0)
+    assert store.begin('a', 'f')[0] == NEW
+    assert store.begin('b', 'f')[0] == NEW
+    assert store.begin('c', 'f')[0] == FULL
+    assert store.begin('a', 'f')[0] == IN_PROGRESS
+    store.complete('a', 'f', (201, [], b'{}'))
+    assert store.begin('c', 'f')[0] == NEW
+    assert store.begin('b', 'f')[0] == IN_PROGRESS
+
+
+@pytest.mark.parametrize('app_config', ['database'], indirect=True)
+def test_claim_error_releases_the_key(app, monkeypatch):
+    store = app.extensions['idempotency']
+    monkeypatch.setattr(store, '_claim', _broken)
+    with pytest.raises(OperationalError):
+        store.begin('k' * 64, 'f')
+    monkeypatch.undo()
+    assert store.begin('k' * 64, 'f')[0] == NEW
+
+
+@pytest.mark.parametrize('app_config', ['database'], indirect=True)
+def test_complete_error_releases_the_key(app, monkeypatch):
+    store = app.extensions['idempotency']
+    assert store.begin('k' * 64, 'f')[0] == NEW
+    monkeypatch.setattr(idempotency, 'update', _broken)
+    with pytest.raises(OperationalError):
+        store.complete('k' * 64, 'f', (201, [], b'{}'))
+    assert 'k' * 64 not in store._owned
+    assert len(store) == 0
+    # The row is left to lapse; once it has, the key can be claimed again
+    IdempotencyKey.query.update({'expires_at': IdempotencyKey.created_at})
+    idempotency.db.session.commit()
+    monkeypatch.undo()
+    assert store.begin('k' * 64, 'f')[0] == NEW
+    store.complete('k' * 64, 'f', (201, [], b'{}'))
+    assert store.begin('k' * 64, 'f')[0] == REPLAY
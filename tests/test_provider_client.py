@@ -0,0 +1,182 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from requests.exceptions import ChunkedEncodingError, ConnectionError, ReadTimeout
+
+from livewell_app import africas_talking
+from livewell_app.africas_talking import ProviderError, ProviderUnavailable
+
+THRESHOLD = 3
+RESET = 0.05
+BACKOFF = 0.2
+
+
+@pytest.fixture
+def app_config():
+    return {
+        'PROVIDER_BACKEND': 'fake',
+        'PROVIDER_FAKE_SEED': 1,
+        'PROVIDER_RETRIES': 2,
+        'PROVIDER_BACKOFF': BACKOFF,
+        'PROVIDER_BACKOFF_MAX': 5,
+        'PROVIDER_BREAKER_THRESHOLD': THRESHOLD,
+        'PROVIDER_BREAKER_RESET': RESET,
+    }
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(africas_talking, 'time', SimpleNamespace(sleep=delays.append, monotonic=time.monotonic))
+    return delays
+
+
+# The fake provider answering each request with the next scripted outcome:
+# None for its normal response, a status code for an error response, or an
+# exception (class) to raise
+@pytest.fixture
+def script(app, monkeypatch):
+    fake = app.extensions['provider_client'].fake
+    outcomes = []
+    send = fake.send
+
+    def scripted(request, **kwargs):
+        outcome = outcomes.pop(0) if outcomes else None
+        if outcome is None:
+            return send(request, **kwargs)
+        if isinstance(outcome, int):
+            return fake._response(request, outcome, {'error': 'scripted'})
+        if callable(outcome) and not isinstance(outcome, type):
+            return outcome(request, **kwargs)
+        raise outcome
+    monkeypatch.setattr(fake, 'send', scripted)
+    return outcomes
+
+
+def _client(app):
+    return app.extensions['provider_client']
+
+
+# Counts of one operation since `before` (the client outlives each app)
+def _since(client, before, operation='sms'):
+    stats = client.stats()[operation]
+    return {key: stats[key] - before[key] for key in ('calls', 'retries', 'failures', 'rejected')}
+
+
+def _open_circuit(client, script):
+    script.extend([ConnectionError('refused')] * THRESHOLD)
+    with pytest.raises(ProviderError):
+        client.send_sms('+256700000001', 'Hello')
+    assert client._breakers['sms'].state == 'open'
+
+
+def test_breaker_opens_after_threshold_failures(app, script, sleeps):
+    client = _client(app)
+    script.extend([ConnectionError('refused')] * THRESHOLD)
+    with pytest.raises(ProviderError) as error:
+        client.send_sms('+256700000001', 'Hello')
+    assert error.value.retryable
+    assert client._breakers['sms'].state == 'open'
+    # Open: rejected without calling the provider
+    script.append(AssertionError('provider called'))
+    before = client.stats()['sms']
+    with pytest.raises(ProviderUnavailable):
+        client.send_sms('+256700000001', 'Hello')
+    assert _since(client, before)['rejected'] == 1
+
+
+def test_half_open_lets_one_trial_through(app, script, sleeps):
+    client = _client(app)
+    _open_circuit(client, script)
+    time.sleep(RESET)
+    assert client._breakers['sms'].state == 'half-open'
+
+    calling, release = threading.Event(), threading.Event()
+    results = []
+
+    def slow(request, **kwargs):
+        calling.set()
+        release.wait(5)
+        return client.fake._response(request, 201, {'SMSMessageData': {'Recipients': []}})
+    script.append(slow)
+    trial = threading.Thread(target=lambda: results.append(client.send_sms('+256700000001', 'Hello')))
+    trial.start()
+    assert calling.wait(5)
+    with pytest.raises(ProviderUnavailable):
+        client.send_sms('+256700000002', 'Hello')
+    release.set()
+    trial.join(5)
+    assert results and client._breakers['sms'].state == 'closed'
+
+
+@pytest.mark.parametrize('failure', [ChunkedEncodingError('broken'), KeyError('bug')], ids=['request-error', 'bug'])
+def test_half_open_trial_is_always_released(app, script, sleeps, failure):
+    client = _client(app)
+    breaker = client._breakers['sms']
+    _open_circuit(client, script)
+    time.sleep(RESET)
+    script.append(failure)
+    with pytest.raises((ProviderError, KeyError)):
+        client.send_sms('+256700000001', 'Hello')
+    assert breaker._trial is None
+    assert breaker.state == 'open'
+
+    time.sleep(RESET)
+    assert client.send_sms('+256700000001', 'Hello')['SMSMessageData']['Recipients']
+    assert breaker.state == 'closed'
+
+
+# Failures the provider cannot have acted on are retried with jittered
+# backoff, within the base x 2^attempt cap
+@pytest.mark.parametrize('failure', [ConnectionError('refused'), 503, 429], ids=['refused', '503', '429'])
+def test_retryable_errors_are_retried_with_jitter(app, script, sleeps, failure):
+    client = _client(app)
+    before = client.stats()['sms']
+    script.extend([failure, failure])
+    assert client.send_sms('+256700000001', 'Hello')['SMSMessageData']['Recipients']
+    assert _since(client, before)['retries'] == 2
+    assert len(sleeps) == 2
+    for attempt, delay in enumerate(sleeps):
+        assert 0 <= delay <= BACKOFF * 2 ** attempt
+
+
+def test_retries_stop_after_the_limit(app, script, sleeps):
+    client = _client(app)
+    script.extend([503] * 3)
+    with pytest.raises(ProviderError) as error:
+        client.send_sms('+256700000001', 'Hello')
+    assert error.value.status == 503 and error.value.retryable
+    assert len(sleeps) == 2
+
+
+# An SMS or call the provider may have acted on is never sent twice
+@pytest.mark.parametrize('failure', [ReadTimeout('slow'), ChunkedEncodingError('broken'), 500],
+                         ids=['read-timeout', 'broken-response', '500'])
+def test_non_retryable_errors_are_not_retried(app, script, sleeps, failure):
+    client = _client(app)
+    script.extend([failure, AssertionError('sent twice')])
+    before = client.stats()['sms']
+    with pytest.raises(ProviderError) as error:
+        client.send_sms('+256700000001', 'Hello')
+    assert not error.value.retryable
+    assert sleeps == []
+    assert _since(client, before) == {'calls': 1, 'retries': 0, 'failures': 1, 'rejected': 0}
+
+
+def test_idempotent_calls_retry_read_timeouts(app, script, sleeps):
+    client = _client(app)
+    script.append(ReadTimeout('slow'))
+    assert client._post('ussd', client.urls['ussd'], {'phoneNumber': '+256700000001'}, idempotent=True)
+    assert len(sleeps) == 1
+
+
+def test_rejected_requests_are_not_retried(app, script, sleeps):
+    client = _client(app)
+    script.append(400)
+    with pytest.raises(ProviderError) as error:
+        client.send_sms('+256700000001', 'Hello')
+    assert error.value.status == 400 and not error.value.retryable
+    assert sleeps == []
+    assert client._breakers['sms'].state == 'closed'
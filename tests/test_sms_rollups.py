@@ -0,0 +1,59 @@
+from datetime import datetime
+
+import pytest
+
+from livewell_app.extensions import db
+from livewell_app.models.sms_log import SMSLog
+from livewell_app.models.sms_rollup import SMSHourlyStat
+from livewell_app.sms_rollups import sms_rollups
+
+SENT_AT = datetime(2026, 10, 18, 9, 30)
+
+
+@pytest.fixture
+def app_config():
+    # The test flushes itself
+    return {'SMS_ROLLUP_FLUSH_INTERVAL': 3600}
+
+
+def _counts():
+    return {(row.prefix, row.status): row.count for row in SMSHourlyStat.query if row.count}
+
+
+# Writers only buffer their deltas; one flush applies them all
+def test_committed_writes_are_applied_on_flush(app):
+    db.session.add(SMSLog('+256700000001', 'Hello', 'Sent', sent_at=SENT_AT))
+    SMSLog.bulk_insert([{'phone_number': '+256770000001', 'message': 'Hi', 'status': 'Sent', 'sent_at': SENT_AT}] * 3)
+    db.session.commit()
+    assert _counts() == {}
+
+    assert sms_rollups.flush() == 2
+    assert _counts() == {('+25670', 'Sent'): 1, ('+25677', 'Sent'): 3}
+
+
+def test_status_changes_move_counts(app):
+    log = SMSLog('+256700000001', 'Hello', 'Sent', sent_at=SENT_AT)
+    db.session.add(log)
+    db.session.commit()
+    log.status = 'Success'
+    db.session.commit()
+    sms_rollups.flush()
+    assert _counts() == {('+25670', 'Success'): 1}
+
+
+def test_rolled_back_writes_are_not_counted(app):
+    db.session.add(SMSLog('+256700000001', 'Hello', 'Sent', sent_at=SENT_AT))
+    db.session.flush()
+    db.session.rollback()
+    assert sms_rollups.flush() == 0
+    assert _counts() == {}
+
+
+def test_rebuild_matches_flushed_rollups(app):
+    SMSLog.bulk_insert([{'phone_number': f'+2567{i % 3}0000001', 'message': 'Hi', 'status': 'Sent', 'sent_at': SENT_AT}
+                        for i in range(10)])
+    db.session.commit()
+    sms_rollups.flush()
+    flushed = _counts()
+    sms_rollups.rebuild(SENT_AT, SENT_AT)
+    assert _counts() == flushed
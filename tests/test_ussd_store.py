@@ -0,0 +1,46 @@
+import pytest
+
+from livewell_app import ussd_store
+from livewell_app.models.ussd_session import USSDSession
+from livewell_app.ussd_store import MemorySessionStore, new_session
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = MemorySessionStore(ttl=60, max_sessions=2)
+    # No sweeper thread: the test sweeps itself
+    monkeypatch.setattr(store, '_ensure_sweeper', lambda: None)
+    return store
+
+
+def _no_database(sessions):
+    raise AssertionError('the request path must not persist sessions')
+
+
+# Expired and evicted sessions are only queued on a hop; the sweep writes them
+def test_hops_leave_persistence_to_the_sweeper(app, store, monkeypatch):
+    store.put(new_session('expired', '+256700000001'), ttl=-1)
+    store.put(new_session('evicted', '+256700000002'))
+    monkeypatch.setattr(ussd_store, 'persist_sessions', _no_database)
+    assert store.get('expired') is None
+    store.put(new_session('live-1', '+256700000003'))
+    store.put(new_session('live-2', '+256700000004'))
+    assert store.pending() == 2
+    assert USSDSession.query.count() == 0
+
+    monkeypatch.undo()
+    store.sweep()
+    assert store.pending() == 0
+    rows = {row.session_id: row.status for row in USSDSession.query}
+    assert rows == {'expired': 'timeout', 'evicted': 'timeout'}
+
+
+def test_failed_sweep_keeps_sessions_pending(app, store, monkeypatch):
+    store.put(new_session('expired', '+256700000001'), ttl=-1)
+    monkeypatch.setattr(ussd_store, 'persist_sessions', _no_database)
+    with pytest.raises(AssertionError):
+        store.sweep()
+    assert store.pending() == 1
+    monkeypatch.undo()
+    store.sweep()
+    assert [row.session_id for row in USSDSession.query] == ['expired']